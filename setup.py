@@ -197,8 +197,55 @@ INTEGRATOR_EXT = Extension(
     extra_link_args=EXTRA_LINK_ARGS,
 )
 
+INTERPOLATION_EXT = Extension(
+    "walks.interpolation",
+    [os.path.join("walks", "interpolation.pyx")],
+    include_dirs=[numpy.get_include()],
+    extra_compile_args=EXTRA_COMPILE_ARGS,
+    extra_link_args=EXTRA_LINK_ARGS,
+)
+
+SUMMATION_EXT = Extension(
+    "walks.summation",
+    [os.path.join("walks", "summation.pyx")],
+    include_dirs=[numpy.get_include()],
+    extra_compile_args=EXTRA_COMPILE_ARGS,
+    extra_link_args=EXTRA_LINK_ARGS,
+)
+
+COMPACTION_EXT = Extension(
+    "walks.compaction",
+    [os.path.join("walks", "compaction.pyx")],
+    include_dirs=[numpy.get_include()],
+    extra_compile_args=EXTRA_COMPILE_ARGS,
+    extra_link_args=EXTRA_LINK_ARGS,
+)
+
+MOMENTS_EXT = Extension(
+    "walks.moments",
+    [os.path.join("walks", "moments.pyx")],
+    include_dirs=[numpy.get_include()],
+    extra_compile_args=EXTRA_COMPILE_ARGS,
+    extra_link_args=EXTRA_LINK_ARGS,
+)
+
+BINNING_EXT = Extension(
+    "walks.binning",
+    [os.path.join("walks", "binning.pyx")],
+    include_dirs=[numpy.get_include()],
+    extra_compile_args=EXTRA_COMPILE_ARGS,
+    extra_link_args=EXTRA_LINK_ARGS,
+)
+
 EXT_MODULES += cythonize(
-    [INTEGRATOR_EXT],
+    [
+        INTEGRATOR_EXT,
+        INTERPOLATION_EXT,
+        SUMMATION_EXT,
+        COMPACTION_EXT,
+        MOMENTS_EXT,
+        BINNING_EXT,
+    ],
     # annotate=True
 )
 
@@ -250,10 +297,16 @@ setup(
     include_package_data=True,
     setup_requires=[
         "numpy>=1.14.5",  # numpy imported in setup.py
-        "cython>=0.28.3",
+        "cython>=0.29.31",
         "setuptools>=41.0.1",
     ],
-    install_requires=["numpy>=1.14.5", "scipy>=1.1.0"],
+    install_requires=["numpy>=1.17.0", "scipy>=1.1.0"],
+    extras_require={
+        "netcdf": ["netCDF4"],
+        "hdf5": ["h5py"],
+        "gstools": ["gstools>=1.3,<1.8"],
+        "all": ["netCDF4", "h5py", "gstools>=1.3,<1.8"],
+    },
     packages=find_packages(exclude=["tests*", "docs*"]),
     ext_modules=EXT_MODULES,
     include_dirs=[numpy.get_include()],
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+import unittest
+
+from walks.binning import bin_walkers
+
+
+class TestBinning(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(3)
+        self.pos = rng.uniform(-1.0, 4.0, size=(3, 10000))
+
+    def check(self, pos, lower, upper, shape, nthreads=1):
+        spacing = (np.array(upper) - lower) / shape
+        out = np.zeros(int(np.prod(shape)))
+        counted = bin_walkers(
+            pos, np.array(lower, float), spacing, shape, out, nthreads
+        )
+        edges = [
+            np.linspace(l, u, n + 1) for l, u, n in zip(lower, upper, shape)
+        ]
+        ref, _ = np.histogramdd(pos.T, edges)
+        np.testing.assert_array_equal(out.reshape(shape), ref)
+        self.assertEqual(counted, ref.sum())
+        return out
+
+    def test_dims(self):
+        self.check(self.pos[:1], (0.0,), (3.0,), (7,))
+        self.check(self.pos[:2], (0.0, -0.5), (3.0, 2.0), (6, 4))
+        self.check(self.pos, (0.0, -0.5, 1.0), (3.0, 2.0, 2.0), (6, 4, 3))
+
+    def test_threads(self):
+        grid = ((0.0, 0.0), (3.0, 3.0), (5, 5))
+        ref = self.check(self.pos[:2], *grid)
+        for nthreads in (2, 4):
+            out = self.check(self.pos[:2], *grid, nthreads=nthreads)
+            np.testing.assert_array_equal(out, ref)
+        pos = self.pos[:2].astype(np.float32)
+        self.check(pos, *grid, nthreads=2)
+
+    def test_non_finite(self):
+        pos = np.array([[0.5, np.nan, np.inf, -np.inf, 1e300], [0.5] * 5])
+        out = np.zeros(4)
+        counted = bin_walkers(pos, np.zeros(2), np.ones(2), (2, 2), out)
+        self.assertEqual(counted, 1)
+        np.testing.assert_array_equal(out, (1.0, 0.0, 0.0, 0.0))
+
+    def test_errors(self):
+        out = np.zeros(4)
+        lower = np.zeros(2)
+        spacing = np.ones(2)
+        self.assertRaises(
+            ValueError, bin_walkers, self.pos[:2], lower, spacing, (2, 3), out
+        )
+        self.assertRaises(
+            ValueError, bin_walkers, self.pos, lower, spacing, (2, 2), out
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
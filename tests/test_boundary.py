@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import unittest
+
+from walks import Simulation
+from walks.boundary import Plane, Box
+from walks.output import HDF5, h5py
+
+
+class TestBoundary(unittest.TestCase):
+    def setUp(self):
+        self.old = np.array(((0.0, 0.0, 1.0, 3.0), (0.0, 0.0, 0.0, 0.0)))
+        self.new = np.array(((0.5, 2.0, 3.0, 4.0), (0.0, 4.0, -1.0, 0.0)))
+
+    def uniform(self, pos):
+        vel = np.zeros_like(pos)
+        vel[0] = 1.0
+        return vel
+
+    def test_plane(self):
+        plane = Plane((1.0, 0.0), (2.0, 0.0))
+        frac = plane.crossing(self.old, self.new)
+        np.testing.assert_allclose(frac, (np.inf, 0.5, 0.0, 0.0))
+        np.testing.assert_allclose(plane.distance(self.new), (-0.5, 1, 2, 3))
+
+    def test_box(self):
+        box = Box((-1.0, None), (2.0, 2.0))
+        frac = box.crossing(self.old, self.new)
+        # the walker 1 leaves through y = 2 first, walker 2 through x = 2
+        np.testing.assert_allclose(frac, (np.inf, 0.5, 0.5, 0.0))
+
+    def test_simulation(self):
+        sim = Simulation(2, self.uniform, np.array((0.0, 0.0)), 10.0, 1.0)
+        sim.initial_condition(np.zeros((2, 4)) + [[0.0], [0.0]])
+        # injected at the end of the step from t = 1 to t = 2
+        sim.add_sources(1.5, (0.0, 1.0), 3)
+        sim.add_boundary(Plane((5.5, 0.0), (1.0, 0.0)))
+        sim()
+        self.assertEqual(sim.N, 0)
+        self.assertEqual(len(sim.exits), 7)
+        np.testing.assert_array_equal(np.sort(sim.exits.id), np.arange(7))
+        np.testing.assert_allclose(sim.exits.pos[0], 5.5)
+        np.testing.assert_allclose(sim.exits.travel_time, 5.5)
+        np.testing.assert_allclose(sim.exits.time[sim.exits.id >= 4], 7.5)
+        np.testing.assert_array_equal(sim.exits.boundary, 0)
+        # the output only contains the active walkers
+        self.assertEqual(sim.output.pos.N[-1], 0)
+        self.assertEqual(sim.output.pos.N.max(), 7)
+
+    def test_tracks(self):
+        sim = Simulation(2, self.uniform, np.array((0.0, 0.0)), 3.0, 1.0)
+        sim.initial_condition(((0.0, 2.0, 1.0), (0.0, 0.0, 0.0)))
+        sim.add_boundary(Plane((2.5, 0.0), (1.0, 0.0)))
+        sim()
+        # the output follows every walker by its id after removals
+        time, pos = sim.output.load(padded=True)
+        tracks = pos[:, 0].T
+        np.testing.assert_array_equal(tracks[0, :3], (0.0, 1.0, 2.0))
+        np.testing.assert_array_equal(tracks[1, :1], (2.0,))
+        np.testing.assert_array_equal(tracks[2, :2], (1.0, 2.0))
+        np.testing.assert_array_equal(
+            tracks.mask[:, 1:],
+            ((False, False, True), (True, True, True), (False, True, True)),
+        )
+        frames = list(sim.output.iterate(walkers=[2]))
+        np.testing.assert_array_equal(
+            [f[1].shape[1] for f in frames], (1, 1, 0, 0)
+        )
+        np.testing.assert_array_equal(frames[1][1][:, 0], (2.0, 0.0))
+
+    def test_fused_rng(self):
+        # the fused random numbers follow the walkers, not their indices
+        results = []
+        for boundary in (False, True):
+            sim = Simulation(
+                2,
+                self.uniform,
+                np.array((0.1, 0.1)),
+                3.0,
+                1.0,
+                fused_rng=True,
+            )
+            sim.initial_condition(((0.0, 4.9, -1.0), (0.0, 0.0, 0.0)))
+            if boundary:
+                sim.add_boundary(Plane((5.0, 0.0), (1.0, 0.0)))
+            sim(seed=4)
+            results.append(sim.pos[:, sim.ids != 1])
+        self.assertEqual(results[1].shape, (2, 2))
+        np.testing.assert_array_equal(results[0], results[1])
+
+    @unittest.skipIf(h5py is None, "h5py not installed")
+    def test_walker_major(self):
+        tmp_dir = tempfile.mkdtemp()
+        sim = Simulation(2, self.uniform, np.array((0.0, 0.0)), 100.0, 1.0)
+        sim.output = HDF5(
+            os.path.join(tmp_dir, "walks.h5"),
+            walker_major=True,
+            walker_chunk_time=8,
+            walker_chunk_walkers=4,
+        )
+        sim.initial_condition(np.zeros((2, 10)))
+        sim.add_sources(np.arange(0.5, 100.0), (0.0, 0.0), 10)
+        sim.add_boundary(Plane((2.5, 0.0), (1.0, 0.0)))
+        sim()
+        # the ids reach far past the number of active walkers
+        _, pos = sim.output.load(padded=True)
+        self.assertEqual(pos.shape[2], 1010)
+        self.assertEqual(sim.output.load()[1].N.max(), 30)
+        _, tracks = sim.output.load_walkers(slice(None))
+        np.testing.assert_array_equal(
+            tracks, np.transpose(pos.filled(np.nan), (2, 1, 0))
+        )
+        # only the chunks of the walkers alive in a chunk in time are written
+        bound = 0
+        for t in range(0, pos.shape[0], 8):
+            alive = np.sum(np.any(~pos.mask[t : t + 8, 0], axis=0))
+            bound += -(-alive // 4) + 1
+        dset = sim.output._file["pos_walker"]
+        self.assertLessEqual(dset.id.get_num_chunks(), bound)
+        del sim
+        shutil.rmtree(tmp_dir)
+
+    def test_diffusion(self):
+        D = np.array((0.1, 0.1))
+        sim = Simulation(2, self.uniform, D, 20.0, 0.1, nthreads=2)
+        sim.initial_condition(np.zeros((2, 2000)))
+        sim.add_boundary(Box((-2.0, -1.0), (None, 1.0)))
+        sim.add_boundary(Plane((10.0, 0.0), (1.0, 0.0)))
+        sim(seed=7)
+        self.assertEqual(sim.N + len(sim.exits), 2000)
+        # the remaining walkers are inside, in the order of their ids
+        self.assertTrue(np.all(np.abs(sim.pos[1]) < 1.0))
+        self.assertTrue(np.all(np.diff(sim.ids) > 0))
+        pos = sim.exits.pos
+        boundary = sim.exits.boundary
+        np.testing.assert_allclose(np.abs(pos[1, boundary == 0]), 1.0)
+        np.testing.assert_allclose(pos[0, boundary == 1], 10.0)
+        time = sim.exits.time
+        self.assertTrue(np.all((time > 0.0) & (time <= 20.0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
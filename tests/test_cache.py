@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import unittest
+
+from gstools import SRF, Gaussian
+
+from walks.cache import FieldCache
+
+
+class TestFieldCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.directory = os.path.join(self.tmp, "fields")
+        self.x = np.linspace(0.0, 10.0, 21)
+        self.y = np.linspace(-5.0, 5.0, 11)
+        model = Gaussian(dim=2, var=0.01, len_scale=4.0)
+        self.srf = SRF(model, generator="VectorField", seed=20170519)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_grid_field(self):
+        cache = FieldCache(self.directory)
+        field = cache.grid_field(self.srf, self.x, self.y, seed=1)
+        key = cache.key(self.srf, (self.x, self.y), seed=1)
+        self.assertIn(key, cache)
+        values = self.srf((self.x, self.y), seed=1, mesh_type="structured")
+        np.testing.assert_array_equal(field.values, values)
+        # the field is mapped read-only from the cache file
+        self.assertFalse(field._values.flags.writeable)
+        pos = np.array([[0.3, 5.2, 9.9], [-4.1, 0.0, 3.3]])
+        drift = field(pos).copy()
+        # a new cache on the same directory reuses the file
+        cache = FieldCache(self.directory)
+        field = cache.grid_field(self.srf, self.x, self.y, seed=1)
+        np.testing.assert_array_equal(field(pos), drift)
+        self.assertEqual(len(cache.entries), 1)
+        # different seed, model or grid give different keys
+        keys = {
+            key,
+            cache.key(self.srf, (self.x, self.y), seed=2),
+            cache.key(self.srf, (self.x, self.y[:-1]), seed=1),
+            cache.key(
+                SRF(
+                    Gaussian(dim=2, var=0.02, len_scale=4.0),
+                    generator="VectorField",
+                ),
+                (self.x, self.y),
+                seed=1,
+            ),
+        }
+        self.assertEqual(len(keys), 4)
+
+    def test_eviction(self):
+        nbytes = 2 * len(self.x) * len(self.y) * 8 + 128
+        cache = FieldCache(self.directory, max_bytes=2 * nbytes)
+        keys = [cache.key(self.srf, (self.x, self.y), s) for s in range(3)]
+        for i, seed in enumerate(range(3)):
+            cache.grid_field(self.srf, self.x, self.y, seed=seed)
+            # make the modification times distinguishable
+            os.utime(cache.path(keys[i]), (i, i))
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+        self.assertNotIn(keys[0], cache)
+        self.assertIn(keys[2], cache)
+        # a single entry is never evicted
+        cache.max_bytes = 0
+        cache.store(keys[0], np.zeros((2, 3)))
+        self.assertEqual(cache.entries, [cache.path(keys[0])])
+        self.assertEqual(os.listdir(self.directory), [keys[0] + ".npy"])
+        cache.clear()
+        self.assertEqual(cache.nbytes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+import unittest
+
+from gstools import SRF, Gaussian, Exponential
+
+from walks import Simulation
+from walks.dispersion import jacobian
+from walks.field import GridField, RandMethField, TileField, TransientField
+
+
+def linear_field(pos):
+    """A field, which is reproduced exactly by linear interpolation."""
+    pos = np.asarray(pos)
+    dim = pos.shape[0]
+    return np.array([1.0 + (d + 1) * pos[d] - pos[-1] for d in range(dim)])
+
+
+class TestField(unittest.TestCase):
+    def setUp(self):
+        self.x = np.linspace(0.0, 10.0, 11)
+        self.y = np.linspace(-5.0, 5.0, 21)
+        self.z = np.linspace(0.0, 2.0, 5)
+        rng = np.random.RandomState(20170519)
+        self.pos = rng.uniform(0.0, 1.0, (3, 1000))
+        self.pos[0] *= 10.0
+        self.pos[1] = 10.0 * self.pos[1] - 5.0
+        self.pos[2] *= 2.0
+
+    def test_linear(self):
+        axes = (self.x, self.y, self.z)
+        for dim in (1, 2, 3):
+            field = GridField(*axes[:dim], field=linear_field, nthreads=2)
+            drift = field(self.pos[:dim])
+            np.testing.assert_allclose(drift, linear_field(self.pos[:dim]))
+
+    def test_values(self):
+        values = np.random.RandomState(1).standard_normal((2, 11, 21))
+        field = GridField(self.x, self.y, values=values)
+        # grid nodes are reproduced exactly
+        pos = np.array(((0.0, 3.0, 10.0), (-5.0, 0.5, 5.0)))
+        drift = field(pos)
+        np.testing.assert_allclose(
+            drift, values[:, (0, 3, 10), (0, 11, 20)], rtol=1e-12
+        )
+        # constant extrapolation outside of the grid
+        outside = np.array(((-3.0, 20.0), (-5.0, 0.5)))
+        np.testing.assert_allclose(
+            field(outside), values[:, (0, 10), (0, 11)], rtol=1e-12
+        )
+        # non-finite positions are clamped to the grid
+        outside = np.array(((np.nan, np.inf), (-np.inf, 0.5)))
+        np.testing.assert_allclose(
+            field(outside), values[:, (0, 10), (0, 11)], rtol=1e-12
+        )
+        self.assertRaises(
+            ValueError, GridField, self.x, self.y, values=values[:, :3]
+        )
+
+    def test_threads(self):
+        field_1 = GridField(self.x, self.y, self.z, field=linear_field)
+        field_4 = GridField(
+            self.x, self.y, self.z, field=linear_field, nthreads=4
+        )
+        np.testing.assert_array_equal(field_1(self.pos), field_4(self.pos))
+
+    def test_simulation(self):
+        values = np.zeros((2, 11, 21))
+        values[0] = 1.0
+        field = GridField(self.x, self.y, values=values)
+        sim = Simulation(2, field, np.array((0.0, 0.0)), 3.0, 1.0)
+        sim.initial_condition((1.0, 0.0), 10)
+        sim()
+        np.testing.assert_allclose(sim.pos[0], 4.0)
+        np.testing.assert_allclose(sim.pos[1], 0.0)
+
+    def test_jacobian(self):
+        def bilinear(pos):
+            x, y = pos
+            return np.array((1.0 + 2.0 * x - 3.0 * y + 0.5 * x * y, 4.0 * y))
+
+        def exact(pos):
+            x, y = pos
+            return np.array(
+                (
+                    (2.0 + 0.5 * y, -3.0 + 0.5 * x),
+                    (np.zeros_like(x), np.full_like(x, 4.0)),
+                )
+            )
+
+        pos = self.pos[:2]
+        field = GridField(self.x, self.y, field=bilinear, nthreads=2)
+        vel, jac = jacobian(field, pos)
+        np.testing.assert_allclose(vel, bilinear(pos), atol=1e-12)
+        np.testing.assert_allclose(jac, exact(pos), atol=1e-12)
+        # finite differences for plain callables
+        vel, jac = jacobian(bilinear, pos)
+        np.testing.assert_allclose(vel, bilinear(pos))
+        np.testing.assert_allclose(jac, exact(pos), atol=1e-8)
+        # transient fields interpolate the Jacobian in time
+        field = TransientField(
+            (0.0, 1.0), (field.values, 3.0 * field.values), self.x, self.y
+        )
+        field.set_time(0.5)
+        vel, jac = field.jacobian(pos)
+        np.testing.assert_allclose(vel, 2.0 * bilinear(pos), atol=1e-12)
+        np.testing.assert_allclose(jac, 2.0 * exact(pos), atol=1e-12)
+
+    def test_randmeth(self):
+        model = Gaussian(dim=2, var=0.01, len_scale=10.0)
+        srf = SRF(model, generator="VectorField", seed=5747387)
+        field = RandMethField(srf, nthreads=2)
+        pos = 10.0 * self.pos[:2]
+        np.testing.assert_array_equal(field(pos), srf(pos))
+        model = Exponential(
+            dim=3, var=1.0, len_scale=[5.0, 2.0, 1.0], angles=[0.3, 0.1, 0.0]
+        )
+        srf = SRF(model, generator="VectorField", mean_velocity=0.5, seed=1)
+        field = RandMethField(srf)
+        np.testing.assert_allclose(field(self.pos), srf(self.pos), atol=1e-12)
+        # without variance, GSTools only returns the mean velocity
+        model = Gaussian(dim=2, var=0.0, len_scale=10.0)
+        srf = SRF(model, generator="VectorField", mean_velocity=0.5, seed=2)
+        field = RandMethField(srf)
+        np.testing.assert_array_equal(field(pos), srf(pos))
+        srf = SRF(model, mean=1.0)
+        self.assertRaises(ValueError, RandMethField, srf)
+
+    def test_tiles(self):
+        field = TileField(
+            3, linear_field, (0.5, 0.5, 0.25), tile_size=4, origin=-1.0
+        )
+        np.testing.assert_allclose(field(self.pos), linear_field(self.pos))
+        misses = field.misses
+        self.assertEqual(field.hits, 0)
+        self.assertEqual(misses, len(field._tiles))
+        # second evaluation is served from the cache
+        np.testing.assert_allclose(field(self.pos), linear_field(self.pos))
+        self.assertEqual(field.hits, misses)
+        self.assertEqual(field.misses, misses)
+        self.assertAlmostEqual(field.hit_rate, 0.5)
+        # small memory budget, only two tiles fit
+        field = TileField(
+            3, linear_field, 0.5, tile_size=4, max_bytes=2 * 3 * 125 * 8
+        )
+        np.testing.assert_allclose(field(self.pos), linear_field(self.pos))
+        self.assertEqual(len(field._tiles), 2)
+        self.assertLessEqual(field.nbytes, field.max_bytes)
+        self.assertEqual(field.evictions, field.misses - 2)
+
+    def test_transient(self):
+        grid = GridField(self.x, self.y, field=linear_field)
+        times = [0.0, 1.0, 3.0]
+        loads = []
+
+        def snapshot(k):
+            def load():
+                loads.append(k)
+                return (1.0 + times[k]) * grid.values
+
+            return load
+
+        field = TransientField(
+            times, [snapshot(k) for k in range(3)], self.x, self.y
+        )
+        self.assertEqual(field.bracket, (0, 1))
+        pos = self.pos[:2]
+        for t in (-1.0, 0.0, 0.5, 2.0, 3.0, 5.0):
+            field.set_time(t)
+            scale = 1.0 + min(max(t, 0.0), 3.0)
+            np.testing.assert_allclose(
+                field(pos), scale * linear_field(pos), rtol=1e-12
+            )
+            self.assertEqual(len(field.bracket), 2)
+        # every snapshot is loaded once, while time advances
+        self.assertEqual(loads, [0, 1, 2])
+        # velocity in x-direction increasing with time: x = t + t^2 / 2
+        values = np.zeros((2, 11, 21))
+        values[0] = 1.0
+        field = TransientField(
+            (0.0, 10.0), (values, 11.0 * values), self.x, self.y
+        )
+        sim = Simulation(2, field, np.array((0.0, 0.0)), 2.0, 0.5)
+        sim.initial_condition((0.0, 0.0), 5)
+        sim()
+        np.testing.assert_allclose(sim.pos[0], 2.0 + 0.5 * 1.5 * 2.0)
+        self.assertRaises(
+            ValueError, TransientField, (1.0, 0.0), (values, values), self.x
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
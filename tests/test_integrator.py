@@ -32,6 +32,174 @@ class TestIntegrator(unittest.TestCase):
         diffusion = np.sqrt(2.0 * self.D_2d[0] * self.dt) * self.jumps_2d[0, 1]
         self.assertAlmostEqual(self.pos_2d[0, 1], 2 * diffusion)
 
+    def test_euler_maruyama_threads(self):
+        rng = np.random.RandomState(1234)
+        pos = rng.standard_normal((3, 10001))
+        drift = rng.standard_normal((3, 10001))
+        jumps = rng.standard_normal((3, 10001))
+        D = np.array((0.1, 0.01, 0.001))
+        pos_serial = pos.copy()
+        integrator.euler_maruyama(pos_serial, drift, jumps, D, self.dt)
+        for num_threads in (2, 4, 7):
+            pos_parallel = pos.copy()
+            integrator.euler_maruyama(
+                pos_parallel, drift, jumps, D, self.dt, num_threads
+            )
+            np.testing.assert_array_equal(pos_parallel, pos_serial)
+
+    def test_euler_maruyama_philox(self):
+        rng = np.random.RandomState(1234)
+        pos = rng.standard_normal((3, 10001))
+        drift = rng.standard_normal((3, 10001))
+        D = np.array((0.1, 0.01, 0.001))
+        ids = np.arange(10001, dtype=np.int64)
+        jumps = np.empty_like(pos)
+        integrator.philox_normal(jumps, ids, 17, 42, 3)
+        self.assertAlmostEqual(np.mean(jumps), 0.0, places=1)
+        self.assertAlmostEqual(np.std(jumps), 1.0, places=1)
+        pos_ref = pos.copy()
+        integrator.euler_maruyama(pos_ref, drift, jumps, D, self.dt)
+        for num_threads in (1, 3):
+            pos_fused = pos.copy()
+            integrator.euler_maruyama_philox(
+                pos_fused, drift, ids, D, self.dt, 17, 42, 3, num_threads
+            )
+            np.testing.assert_array_equal(pos_fused, pos_ref)
+        # a different time step has to give different jumps
+        jumps_next = np.empty_like(pos)
+        integrator.philox_normal(jumps_next, ids, 17, 42, 4)
+        self.assertFalse(np.any(jumps_next == jumps))
+        # the jumps follow the walker ids, not the walker indices
+        perm = rng.permutation(10001)
+        jumps_perm = np.empty_like(pos)
+        integrator.philox_normal(jumps_perm, ids[perm], 17, 42, 3)
+        np.testing.assert_array_equal(jumps_perm, jumps[:, perm])
+        self.assertRaises(
+            ValueError, integrator.philox_normal, jumps, ids[1:], 17, 42, 3
+        )
+
+    def test_float32(self):
+        rng = np.random.RandomState(1234)
+        pos = rng.standard_normal((3, 1001))
+        drift = rng.standard_normal((3, 1001))
+        D = np.array((0.1, 0.01, 0.001))
+        pos_32 = pos.astype(np.float32)
+        ids = np.arange(1001, dtype=np.int64)
+        integrator.euler_maruyama_philox(pos, drift, ids, D, self.dt, 1, 2, 3)
+        integrator.euler_maruyama_philox(
+            pos_32, drift.astype(np.float32), ids, D, self.dt, 1, 2, 3, 2
+        )
+        self.assertEqual(pos_32.dtype, np.float32)
+        np.testing.assert_allclose(pos_32, pos, rtol=1e-5, atol=1e-5)
+        # all walker arrays need the same precision
+        self.assertRaises(
+            ValueError,
+            integrator.euler_maruyama_philox,
+            pos_32,
+            drift,
+            ids,
+            D,
+            self.dt,
+            1,
+            2,
+            3,
+        )
+
+    def test_heun(self):
+        rng = np.random.RandomState(1234)
+        pos = rng.standard_normal((2, 1001))
+        drift = rng.standard_normal((2, 1001))
+        jumps = rng.standard_normal((2, 1001))
+        D = np.array((0.1, 0.01))
+        pred = np.empty_like(pos)
+        integrator.heun_predictor(pos, drift, jumps, D, self.dt, pred)
+        pos_ref = pos.copy()
+        integrator.euler_maruyama(pos_ref, drift, jumps, D, self.dt)
+        np.testing.assert_array_equal(pred, pos_ref)
+        # with the same drift, the corrector equals the predictor
+        integrator.heun_corrector(pos, drift, drift, jumps, D, self.dt, 2)
+        np.testing.assert_allclose(pos, pred, rtol=1e-14)
+        # second order convergence for the linear ODE dx/dt = -x
+        x = np.ones((1, 1))
+        dt = 0.1
+        for _ in range(10):
+            pred = np.empty_like(x)
+            integrator.heun_predictor(
+                x, -x, np.zeros_like(x), np.zeros(1), dt, pred
+            )
+            integrator.heun_corrector(
+                x, -x.copy(), -pred, np.zeros_like(x), np.zeros(1), dt
+            )
+        # the Euler method has an error of about 0.02
+        self.assertLess(abs(x[0, 0] - np.exp(-1.0)), 1e-3)
+
+    def test_milstein(self):
+        rng = np.random.RandomState(1234)
+        pos = rng.standard_normal((2, 1001))
+        drift = rng.standard_normal((2, 1001))
+        jumps = rng.standard_normal((2, 1001))
+        D = np.array((0.1, 0.01))
+        # constant diffusion gives the Euler Maruyama method
+        pos_ref = pos.copy()
+        integrator.euler_maruyama(pos_ref, drift, jumps, D, self.dt)
+        pos_mil = pos.copy()
+        D_walker = np.repeat(D[:, np.newaxis], 1001, axis=1)
+        integrator.milstein(
+            pos_mil, drift, jumps, D_walker, np.zeros_like(pos), self.dt
+        )
+        np.testing.assert_allclose(pos_mil, pos_ref, rtol=1e-14)
+        # D = x^2 / 2 in 1D, so sqrt(2 D) = |x| and dD = x
+        x = np.array([[2.0]])
+        z = np.array([[0.5]])
+        integrator.milstein(x, np.zeros((1, 1)), z, x**2 / 2, x, 0.25)
+        expected = 2.0 + 2.0 * 0.25 + 2.0 * 0.5 * 0.5 + 0.25 * (0.25 - 1.0)
+        self.assertAlmostEqual(x[0, 0], expected)
+
+    def test_scheidegger(self):
+        alpha_L, alpha_T, Dm, dt = 0.5, 0.05, 0.01, 0.1
+        # uniform flow in x-direction
+        pos = np.zeros((2, 3))
+        vel = np.array(((2.0, 2.0, 0.0), (0.0, 0.0, 0.0)))
+        jac = np.zeros((2, 2, 3))
+        jumps = np.array(((1.0, -0.5, 1.0), (0.5, 2.0, 1.0)))
+        integrator.scheidegger(
+            pos, vel, jac, jumps, alpha_L, alpha_T, Dm, dt, 2
+        )
+        b_L = np.sqrt(2.0 * (alpha_L * 2.0 + Dm) * dt)
+        b_T = np.sqrt(2.0 * (alpha_T * 2.0 + Dm) * dt)
+        b_0 = np.sqrt(2.0 * Dm * dt)
+        np.testing.assert_allclose(
+            pos, ((0.2 + b_L, 0.2 - 0.5 * b_L, b_0), (0.5 * b_T, 2 * b_T, b_0))
+        )
+
+        # drift correction is the divergence of the dispersion tensor
+        def velocity(x):
+            return np.array((1.0 + 0.1 * x[0] + 0.2 * x[1], 0.3 + 0.05 * x[0]))
+
+        def tensor(x):
+            v = velocity(x)
+            speed = np.sqrt(np.sum(v ** 2))
+            return (alpha_T * speed + Dm) * np.eye(2) + (
+                alpha_L - alpha_T
+            ) * np.outer(v, v) / speed
+
+        x = np.array((0.7, -1.3))
+        h = 1e-5
+        div = np.zeros(2)
+        for d in range(2):
+            e = np.zeros(2)
+            e[d] = h
+            div += (tensor(x + e)[:, d] - tensor(x - e)[:, d]) / (2 * h)
+        pos = x[:, np.newaxis].copy()
+        jac = np.array(((0.1, 0.2), (0.05, 0.0)))[:, :, np.newaxis]
+        vel = velocity(x)[:, np.newaxis]
+        integrator.scheidegger(
+            pos, vel, jac, np.zeros((2, 1)), alpha_L, alpha_T, Dm, dt
+        )
+        np.testing.assert_allclose(
+            (pos[:, 0] - x) / dt - vel[:, 0], div, rtol=1e-6
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+import unittest
+
+from walks.output import Memory
+from walks.kde import linear_binning, bandwidth, kde, iterate_kde
+
+
+class TestKDE(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(13)
+        self.pos = rng.normal(size=(2, 20000)) * ((1.0,), (0.5,))
+
+    def normal(self, x, y):
+        return np.exp(-0.5 * x ** 2 - 2.0 * y ** 2) / np.pi
+
+    def test_linear_binning(self):
+        pos = np.array(((0.25, 1.0, 2.0, 5.0), (0.0, 0.5, 1.0, 0.0)))
+        binned = linear_binning(pos, (0.0, 0.0), (2.0, 1.0), (3, 2))
+        ref = np.array(((0.75, 0.0), (0.25 + 0.5, 0.5), (0.0, 1.0)))
+        np.testing.assert_allclose(binned, ref)
+        binned = linear_binning(
+            self.pos, (-5.0, -3.0), (5.0, 3.0), (41, 31), np.full(20000, 2)
+        )
+        self.assertAlmostEqual(binned.sum(), 40000.0)
+        x = np.linspace(-5.0, 5.0, 41)
+        mean = np.sum(binned.sum(axis=1) * x) / binned.sum()
+        self.assertAlmostEqual(mean, self.pos[0].mean())
+
+    def test_bandwidth(self):
+        h = bandwidth(self.pos)
+        np.testing.assert_allclose(
+            h, np.array((1.0, 0.5)) * 20000 ** (-1 / 6), 0.02
+        )
+        h_s = bandwidth(self.pos, "silverman")
+        np.testing.assert_allclose(h_s, h, 0.02)
+        h_w = bandwidth(self.pos, weights=np.ones(20000))
+        np.testing.assert_allclose(h_w, h, 1e-3)
+        self.assertRaises(ValueError, bandwidth, self.pos, "optimal")
+
+    def test_kde(self):
+        x = np.linspace(-4.0, 4.0, 81)
+        y = np.linspace(-2.0, 2.0, 41)
+        ref = self.normal(*np.meshgrid(x, y, indexing="ij"))
+        for kernel in ("gaussian", "epanechnikov"):
+            density = kde(
+                self.pos, (-4.0, -2.0), (4.0, 2.0), (81, 41), kernel=kernel
+            )
+            self.assertEqual(density.shape, (81, 41))
+            self.assertAlmostEqual(density.sum() * 0.01, 1.0, places=3)
+            np.testing.assert_allclose(density, ref, atol=0.03)
+        # smoother than the binned walkers
+        binned = kde(self.pos, (-4.0, -2.0), (4.0, 2.0), (81, 41), h=0.0)
+        err = np.abs(binned - ref).max()
+        self.assertLess(np.abs(density - ref).max(), 0.5 * err)
+        self.assertRaises(ValueError, kde, self.pos, -4, 4, 81, kernel="box")
+
+    def test_iterate(self):
+        output = Memory("walks")
+        for t in range(3):
+            output.write_timestep(float(t), self.pos[:1] + t)
+        x = np.linspace(-4.0, 6.0, 101)
+        frames = list(iterate_kde(output.iterate(), -4.0, 6.0, 101, h=0.2))
+        self.assertEqual(len(frames), 3)
+        for t, density in frames:
+            ref = np.exp(-0.5 * (x - t) ** 2) / np.sqrt(2.0 * np.pi)
+            np.testing.assert_allclose(density, ref, atol=0.03)
+        loaded = list(iterate_kde(zip(*output.load()), -4.0, 6.0, 101, h=0.2))
+        np.testing.assert_array_equal(loaded[2][1], frames[2][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+import unittest
+
+from walks.moments import moments
+
+
+class TestMoments(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(5)
+        # far from the origin, to check the numerical stability
+        self.pos = rng.gamma(2.0, size=(3, 5000)) + 1e6
+        self.groups = rng.randint(-1, 3, size=5000).astype(np.int64)
+
+    def check(self, pos, count, mean, central, comoment):
+        dev = pos - pos.mean(axis=1)[:, np.newaxis]
+        self.assertEqual(count, pos.shape[1])
+        np.testing.assert_allclose(mean, pos.mean(axis=1), rtol=1e-14)
+        for p in range(3):
+            ref = np.sum(dev ** (p + 2), axis=1)
+            atol = 1e-9 * np.abs(ref).max()
+            np.testing.assert_allclose(central[p], ref, atol=atol)
+        ref = dev @ dev.T
+        atol = 1e-9 * np.abs(ref).max()
+        np.testing.assert_allclose(comoment, ref, atol=atol)
+
+    def test_moments(self):
+        count, mean, central, comoment = moments(self.pos)
+        self.check(self.pos, count[0], mean[0], central[0], comoment[0])
+        for nthreads in (2, 3):
+            res = moments(self.pos, num_threads=nthreads)
+            np.testing.assert_array_equal(res[2], central)
+            np.testing.assert_array_equal(res[3], comoment)
+        count, mean, central, comoment = moments(self.pos[:, :0])
+        self.assertEqual(count[0], 0)
+
+    def test_groups(self):
+        count, mean, central, comoment = moments(self.pos, self.groups, 4)
+        for g in range(4):
+            pos = self.pos[:, self.groups == g]
+            if pos.shape[1] == 0:
+                self.assertEqual(count[g], 0)
+                continue
+            self.check(pos, count[g], mean[g], central[g], comoment[g])
+        self.assertRaises(ValueError, moments, self.pos, self.groups, 2)
+
+    def test_float32(self):
+        pos = self.pos.astype(np.float32) - np.float32(1e6)
+        count, mean, central, comoment = moments(pos)
+        self.check(
+            pos.astype(np.double), count[0], mean[0], central[0], comoment[0]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import unittest
+
+from walks import Simulation
+from walks.boundary import Plane
+from walks.observer import (
+    Breakthrough,
+    Moments,
+    Concentration,
+    Histogram,
+    QuantileSketch,
+)
+
+
+class TestObserver(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(19)
+
+    def uniform(self, pos):
+        vel = np.zeros_like(pos)
+        vel[0] = 1.0
+        return vel
+
+    def test_histogram(self):
+        values = self.rng.normal(size=1000)
+        hist = Histogram(np.linspace(-2.0, 2.0, 9))
+        hist.add(values[:500])
+        other = Histogram(hist.edges)
+        other.add(values[500:])
+        hist.merge(other)
+        ref, _ = np.histogram(values, hist.edges)
+        np.testing.assert_array_equal(hist.counts, ref)
+        self.assertEqual(hist.underflow, np.sum(values < -2.0))
+        self.assertEqual(hist.overflow, np.sum(values > 2.0))
+        self.assertEqual(hist.count, 1000)
+        self.assertAlmostEqual(np.sum(hist.density(ref.sum()) * 0.5), 1.0)
+
+    def test_sketch(self):
+        values = self.rng.lognormal(sigma=2.0, size=10000)
+        values[:100] = 0.0
+        sketch = QuantileSketch(0.01)
+        other = QuantileSketch(0.01)
+        for chunk in np.array_split(values, 7):
+            sketch.add(chunk[::-1])
+        other.add(values)
+        q = np.linspace(0.02, 1.0, 50)
+        ref = np.quantile(values, q, method="lower")
+        np.testing.assert_allclose(sketch.quantile(q), ref, rtol=0.01)
+        np.testing.assert_array_equal(sketch.quantile(q), other.quantile(q))
+        self.assertEqual(sketch.quantile(0.005), 0.0)
+        other.merge(sketch)
+        self.assertEqual(other.count, 20000)
+        np.testing.assert_allclose(other.quantile(q), ref, rtol=0.01)
+        self.assertTrue(np.isnan(QuantileSketch().quantile(0.5)))
+
+    def test_breakthrough(self):
+        sim = Simulation(2, self.uniform, np.array((0.0, 0.0)), 10.0, 1.0)
+        sim.initial_condition(np.zeros((2, 4)))
+        # injected at the end of the step from t = 1 to t = 2
+        sim.add_sources(1.5, (0.0, 1.0), 3)
+        btc = Breakthrough((5.5, 0.0), (1.0, 0.0), np.arange(0.0, 11.0))
+        arrival = Breakthrough(
+            (5.5, 0.0), (1.0, 0.0), (7.0, 8.0), travel_time=False, name="a"
+        )
+        sim.add_observer(btc)
+        sim.add_observer(arrival)
+        sim()
+        # the walkers are not removed
+        self.assertEqual(sim.N, 7)
+        self.assertEqual(btc.count, 7)
+        np.testing.assert_allclose(btc.quantile((0.0, 1.0)), 5.5, rtol=0.01)
+        centers, density = btc.curve()
+        self.assertEqual(density[5], 1.0)
+        self.assertEqual(arrival.histogram.counts[0], 3)
+        self.assertEqual(arrival.histogram.underflow, 4)
+
+    def test_first_passage(self):
+        D = np.array((0.5, 0.5))
+        sim = Simulation(2, self.uniform, D, 20.0, 0.1)
+        sim.initial_condition(np.zeros((2, 2000)))
+        bins = np.linspace(0.0, 20.0, 41)
+        btc = Breakthrough((5.0, 0.0), (1.0, 0.0), bins)
+        crossings = Breakthrough(
+            (5.0, 0.0), (1.0, 0.0), bins, first_passage=False, name="all"
+        )
+        sim.add_observer(btc)
+        sim.add_observer(crossings)
+        sim(seed=3)
+        self.assertEqual(btc.count, np.sum(sim.pool["breakthrough_passed"]))
+        self.assertGreater(crossings.count, btc.count)
+        # the same first passages as an absorbing plane
+        sim.initial_condition(np.zeros((2, 2000)))
+        sim.add_boundary(Plane((5.0, 0.0), (1.0, 0.0)))
+        sim(seed=3)
+        self.assertEqual(btc.count, len(sim.exits))
+        q = np.linspace(0.0, 1.0, 11)
+        ref = np.quantile(sim.exits.travel_time, q, method="lower")
+        np.testing.assert_allclose(btc.quantile(q), ref, rtol=0.01)
+        ref, _ = np.histogram(sim.exits.travel_time, bins)
+        np.testing.assert_array_equal(btc.histogram.counts, ref)
+
+    def test_moments(self):
+        D = np.array((0.5, 0.1))
+        sim = Simulation(2, self.uniform, D, 10.0, 0.1, nsave=1)
+        sim.initial_condition(((0.0, 0.0), (0.0, 5.0)), 1000)
+        mom = Moments(by_origin=True)
+        sim.add_observer(mom)
+        sim(seed=11)
+        time = np.append(0.0, np.arange(1, 101) * 0.1)
+        np.testing.assert_allclose(mom.time, time)
+        np.testing.assert_array_equal(mom.count, 2000)
+        np.testing.assert_allclose(mom.mean[-1], sim.mean_pos)
+        np.testing.assert_allclose(mom.covariance[-1], np.cov(sim.pos, bias=1))
+        np.testing.assert_allclose(
+            mom.variance, mom.covariance[:, (0, 1), (0, 1)]
+        )
+        np.testing.assert_allclose(mom.mean[:, 0], mom.time, atol=0.1)
+        self.assertTrue(np.all(np.abs(mom.skewness[1:]) < 0.3))
+        np.testing.assert_allclose(mom.kurtosis[1:, 0], 3.0, atol=0.5)
+        # the separation of the origins does not grow
+        D_app = mom.apparent_dispersion.mean(axis=0)
+        D_eff = mom.effective_dispersion.mean(axis=0)
+        np.testing.assert_allclose(np.diag(D_app), D, rtol=0.2)
+        np.testing.assert_allclose(np.diag(D_eff), D, rtol=0.2)
+        self.assertAlmostEqual(mom.covariance[0, 1, 1], 6.25)
+        self.assertRaises(ValueError, lambda: Moments().effective_dispersion)
+
+    def test_concentration(self):
+        tmp_dir = tempfile.mkdtemp()
+        D = np.array((0.5, 0.1))
+        conc = Concentration((0.0, -2.0), (10.0, 2.0), (20, 8), mass=0.01)
+        for output in ("memory", "binary"):
+            sim = Simulation(
+                2,
+                self.uniform,
+                D,
+                5.0,
+                0.1,
+                nsave=10,
+                output=output,
+                filename=os.path.join(tmp_dir, "walks"),
+                output_buffers=1,
+            )
+            sim.initial_condition((1.0, 0.0), 1000)
+            sim.add_observer(conc)
+            sim(seed=2)
+            time, field = sim.output.load_field("concentration")
+            time_ref, pos = sim.output.load()
+            # the same time labels as the trajectory
+            np.testing.assert_array_equal(time, time_ref)
+            np.testing.assert_allclose(time, np.arange(6.0))
+            self.assertEqual(field.shape, (len(time), 20, 8))
+            for values, p in zip(field, pos):
+                ref, _ = np.histogramdd(p.T, conc.edges)
+                np.testing.assert_allclose(values * 0.25 / 0.01, ref)
+            sim.output.close()
+        shutil.rmtree(tmp_dir)
+        self.assertRaises(ValueError, Concentration, (0.0,), (1.0,), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
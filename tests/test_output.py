@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import unittest
+
+import threading
+
+from walks.output import Memory, Pickle, Binary, NetCDF, HDF5, AsyncOutput
+from walks.output import netCDF4, h5py
+
+
+class Failing(Memory):
+    def write_timestep(self, time, pos, ids=None):
+        if time > 1.0:
+            raise IOError("disk full")
+        super(Failing, self).write_timestep(time, pos, ids)
+
+
+class Slow(Memory):
+    def __init__(self, filename):
+        super(Slow, self).__init__(filename)
+        self.event = threading.Event()
+
+    def write_timestep(self, time, pos, ids=None):
+        self.event.wait()
+        super(Slow, self).write_timestep(time, pos, ids)
+
+
+class TestOutput(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.time = [0.0, 1.0, 2.0, 3.0]
+        self.pos = [
+            np.empty((2, 0)),
+            np.array(((0.0,), (1.0,))),
+            np.array(((0.0, 1.0, 2.0), (3.0, 4.0, 5.0))),
+            np.array(((6.0, 7.0, 8.0, 9.0), (1.0, 2.0, 3.0, 4.0))),
+        ]
+        self.ids = [(0, 1, 2), (0, 2), (0,)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, output):
+        for t, p in zip(self.time, self.pos):
+            output.write_timestep(t, p)
+
+    def check_trajectory(self, time, pos):
+        np.testing.assert_array_equal(time, self.time)
+        self.assertEqual(len(pos), len(self.time))
+        np.testing.assert_array_equal(pos.N, (0, 1, 3, 4))
+        for i in range(len(self.time)):
+            np.testing.assert_array_equal(pos[i], self.pos[i])
+        np.testing.assert_array_equal(pos[-1], self.pos[-1])
+
+    def check_iterate(self, output):
+        frames = list(output.iterate())
+        self.assertEqual(len(frames), len(self.time))
+        for (t, pos), t_ref, pos_ref in zip(frames, self.time, self.pos):
+            self.assertEqual(t, t_ref)
+            np.testing.assert_array_equal(pos, pos_ref)
+        frames = list(
+            output.iterate(
+                t_range=(1.0, None), walkers=slice(1, 3), chunksize=2
+            )
+        )
+        self.assertEqual([f[0] for f in frames], self.time[1:])
+        for (t, pos), pos_ref in zip(frames, self.pos[1:]):
+            np.testing.assert_array_equal(pos, pos_ref[:, 1:3])
+        frames = list(output.iterate(t_range=(None, 2.0), walkers=[2, 0]))
+        self.assertEqual([f[0] for f in frames], self.time[:3])
+        for (t, pos), pos_ref in zip(frames, self.pos[:3]):
+            np.testing.assert_array_equal(
+                pos, pos_ref[:, [0, 2][: pos.shape[1]]]
+            )
+
+    def write_removed(self, output):
+        # the walker with id 1 is removed after the first time step
+        for t, p, ids in zip(
+            self.time[:3], ((0.0, 2.0, 1.0), (1.0, 2.0), (2.0,)), self.ids
+        ):
+            output.write_timestep(t, np.array((p,)), np.array(ids))
+
+    def check_removed(self, output):
+        time, pos = output.load()
+        np.testing.assert_array_equal(pos[1], ((1.0, 2.0),))
+        np.testing.assert_array_equal(pos.walker_ids(1), (0, 2))
+        time, pos = output.load(padded=True)
+        self.assertEqual(pos.shape, (3, 1, 3))
+        tracks = pos[:, 0].T
+        np.testing.assert_array_equal(tracks[0], (0.0, 1.0, 2.0))
+        np.testing.assert_array_equal(tracks[1].mask, (False, True, True))
+        self.assertEqual(tracks[1, 0], 2.0)
+        np.testing.assert_array_equal(tracks[2].mask, (False, False, True))
+        np.testing.assert_array_equal(tracks[2, :2], (1.0, 2.0))
+        frames = list(output.iterate(walkers=[2]))
+        self.assertEqual([f[1].shape[1] for f in frames], [1, 1, 0])
+        self.assertEqual([f[1][0, 0] for f in frames[:2]], [1.0, 2.0])
+        frames = list(output.iterate(walkers=slice(1, 3), chunksize=2))
+        np.testing.assert_array_equal(frames[0][1], ((2.0, 1.0),))
+        np.testing.assert_array_equal(frames[1][1], ((2.0,),))
+
+    def write_field(self, output):
+        self.field = np.arange(24.0).reshape(2, 3, 4, 1) * self.time[1:]
+        for i, t in enumerate(self.time[1:]):
+            output.write_field("conc", t, self.field[..., i])
+
+    def check_field(self, output):
+        time, values = output.load_field("conc")
+        np.testing.assert_array_equal(time, self.time[1:])
+        np.testing.assert_array_equal(values, np.moveaxis(self.field, -1, 0))
+
+    def check_padded(self, time, pos):
+        self.assertEqual(pos.shape, (4, 2, 4))
+        self.assertTrue(np.all(pos.mask[0]))
+        self.assertTrue(np.all(pos.mask[2, :, 3]))
+        np.testing.assert_array_equal(pos[3], self.pos[3])
+        np.testing.assert_array_equal(pos[2, :, :3], self.pos[2])
+
+    def test_memory(self):
+        output = Memory("walks")
+        self.write(output)
+        self.write_field(output)
+        self.check_field(output)
+        time, pos = output.load()
+        self.check_trajectory(time, pos)
+        # per time step views without copying
+        self.assertFalse(np.shares_memory(pos[2], pos[3]))
+        self.assertTrue(np.shares_memory(pos[2], pos.data))
+        self.check_padded(*output.load(padded=True))
+        self.check_iterate(output)
+        output = Memory("walks")
+        self.write_removed(output)
+        self.check_removed(output)
+
+    def test_pickle(self):
+        output = Pickle(os.path.join(self.tmp_dir, "walks.p"))
+        self.write_field(output)
+        self.write(output)
+        time, pos = output.load()
+        self.check_trajectory(time, pos)
+        self.check_padded(*output.load(padded=True))
+        self.check_iterate(output)
+        self.check_field(output)
+        # loading does not close the file for writing
+        output.write_timestep(4.0, self.pos[3])
+        output.flush()
+        time, pos = output.load()
+        np.testing.assert_array_equal(time, self.time + [4.0])
+        output = AsyncOutput(Pickle(os.path.join(self.tmp_dir, "async.p")))
+        self.write(output)
+        self.check_trajectory(*output.load())
+        output.write_timestep(4.0, self.pos[3])
+        self.assertEqual(len(output.load()[0]), 5)
+        output.close()
+        output = Pickle(os.path.join(self.tmp_dir, "removed.p"))
+        self.write_removed(output)
+        self.check_removed(output)
+
+    def test_binary(self):
+        filename = os.path.join(self.tmp_dir, "walks.bin")
+        output = Binary(filename)
+        self.write(output)
+        self.write_field(output)
+        time, pos = output.load()
+        self.check_trajectory(time, pos)
+        self.assertIsInstance(pos.data, np.memmap)
+        self.check_padded(*output.load(padded=True))
+        self.check_iterate(output)
+        del output
+        # reopen the existing file without touching it
+        output = Binary(filename, mode="r")
+        time, pos = output.load()
+        self.check_trajectory(time, pos)
+        self.check_field(output)
+        self.assertEqual(
+            os.path.getsize(filename), 8 * 2 * np.sum(pos.N, dtype=int)
+        )
+        output = Binary(os.path.join(self.tmp_dir, "removed.bin"))
+        self.write_removed(output)
+        self.check_removed(output)
+
+    @unittest.skipIf(netCDF4 is None, "netCDF4 not installed")
+    def test_netcdf(self):
+        filename = os.path.join(self.tmp_dir, "walks.nc")
+        output = NetCDF(filename, chunk_walkers=2, zlib=True)
+        self.write(output)
+        self.write_field(output)
+        time, pos = output.load()
+        self.check_trajectory(time, pos)
+        self.check_padded(*output.load(padded=True))
+        self.check_iterate(output)
+        del output
+        output = NetCDF(filename, mode="r")
+        self.check_field(output)
+        time, pos = output.load(time=slice(2, None), walkers=slice(1, 3))
+        np.testing.assert_array_equal(time, self.time[2:])
+        np.testing.assert_array_equal(pos[0], self.pos[2][:, 1:3])
+        np.testing.assert_array_equal(pos[1], self.pos[3][:, 1:3])
+        time, pos = output.load(time=[1, 3], walkers=[0, 3])
+        np.testing.assert_array_equal(time, (1.0, 3.0))
+        np.testing.assert_array_equal(pos[0], self.pos[1])
+        np.testing.assert_array_equal(pos[1], self.pos[3][:, [0, 3]])
+        output = NetCDF(os.path.join(self.tmp_dir, "removed.nc"))
+        self.write_removed(output)
+        self.check_removed(output)
+        time, pos = output.load(walkers=[2])
+        np.testing.assert_array_equal(pos.walker_ids(1), (2,))
+
+    def test_async(self):
+        output = AsyncOutput(Binary(os.path.join(self.tmp_dir, "walks.bin")))
+        for t, p in zip(self.time, self.pos):
+            # the snapshot is copied, so the caller may modify its array
+            p = p.copy()
+            output.write_timestep(t, p)
+            p[...] = -1.0
+        self.write_field(output)
+        self.check_trajectory(*output.load())
+        self.check_field(output)
+        self.check_iterate(output)
+        output.close()
+        self.assertRaises(ValueError, output.write_timestep, 0.0, self.pos[0])
+        output = AsyncOutput(Memory("walks"))
+        self.write_removed(output)
+        self.check_removed(output)
+        output.close()
+
+    def test_async_backpressure(self):
+        output = AsyncOutput(Slow("walks"), buffers=2)
+        writer = threading.Thread(target=self.write, args=(output,))
+        writer.start()
+        writer.join(0.2)
+        # blocked, since the slow output holds both buffers
+        self.assertTrue(writer.is_alive())
+        output.output.event.set()
+        writer.join()
+        output.flush()
+        self.check_trajectory(*output.load())
+        self.assertEqual(output.N, [0, 1, 3, 4])
+
+    def test_async_error(self):
+        output = AsyncOutput(Failing("walks"))
+        with self.assertRaises(IOError):
+            self.write(output)
+            output.flush()
+
+    @unittest.skipIf(h5py is None, "h5py not installed")
+    def test_hdf5(self):
+        filename = os.path.join(self.tmp_dir, "walks.h5")
+        output = HDF5(
+            filename,
+            chunk_walkers=2,
+            walker_major=True,
+            walker_chunk_time=3,
+            walker_chunk_walkers=2,
+        )
+        output.write_metadata(dt=0.5, D=np.array((0.1, 0.2)), seed=2 ** 100)
+        self.write(output)
+        self.write_field(output)
+        time, pos = output.load()
+        self.check_trajectory(time, pos)
+        self.check_padded(*output.load(padded=True))
+        self.check_iterate(output)
+        del output
+        output = HDF5(filename, mode="r")
+        self.check_field(output)
+        self.assertEqual(output._file.attrs["dt"], 0.5)
+        self.assertEqual(output._file.attrs["seed"], str(2 ** 100))
+        time, pos = output.load(time=slice(2, None), walkers=slice(1, 3))
+        np.testing.assert_array_equal(time, self.time[2:])
+        np.testing.assert_array_equal(pos[1], self.pos[3][:, 1:3])
+        time, pos = output.load_walkers([1, 3])
+        self.assertEqual(pos.shape, (2, 2, 4))
+        np.testing.assert_array_equal(pos[0, :, 2], self.pos[2][:, 1])
+        np.testing.assert_array_equal(pos[1, :, 3], self.pos[3][:, 3])
+        self.assertTrue(np.all(np.isnan(pos[1, :, :3])))
+        # a small buffer writes the walker-major chunks in parts
+        filename = os.path.join(self.tmp_dir, "walks_small.h5")
+        small = HDF5(
+            filename,
+            walker_major=True,
+            walker_chunk_time=3,
+            walker_buffer_size=1,
+        )
+        for time, pos in zip(self.time, self.pos):
+            small.write_timestep(time, pos)
+            self.assertEqual(small._buffer_bytes, 0)
+        np.testing.assert_array_equal(
+            small._file["pos_walker"][...], output._file["pos_walker"][...]
+        )
+        for walker_major in (True, False):
+            filename = os.path.join(self.tmp_dir, "removed.h5")
+            output = HDF5(filename, walker_major=walker_major)
+            self.write_removed(output)
+            self.check_removed(output)
+            time, pos = output.load_walkers([0, 2])
+            np.testing.assert_array_equal(pos[0, 0], (0.0, 1.0, 2.0))
+            np.testing.assert_array_equal(pos[1, 0, :2], (1.0, 2.0))
+            self.assertTrue(np.isnan(pos[1, 0, 2]))
+            del output
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import unittest
+
+try:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as pt
+    from walks import plot
+except ImportError:
+    plot = None
+
+from walks import Simulation
+
+
+@unittest.skipIf(plot is None, "matplotlib or seaborn not installed")
+class TestPlot(unittest.TestCase):
+    def setUp(self):
+        self.x = np.linspace(0.0, 10.0, 11)
+        self.y = np.linspace(-2.0, 2.0, 5)
+
+    def tearDown(self):
+        pt.close("all")
+
+    def run_sim(self, dim):
+        def field(pos):
+            vel = np.zeros_like(pos)
+            vel[0] = 1.0
+            return vel
+
+        sim = Simulation(dim, field, np.full(dim, 0.1), 2.0, 0.5)
+        sim.initial_condition(np.zeros((dim, 3)))
+        # a source, so the number of walkers changes
+        sim.add_sources(0.7, np.zeros(dim), 2)
+        sim(seed=1)
+        return sim.output.load()
+
+    def test_walks(self):
+        t, pos = self.run_sim(1)
+        plot.walks_1d(t, pos)
+        plot.walks_1d(t, pos.padded())
+        t, pos = self.run_sim(2)
+        ax = plot.walks_2d(self.x, self.y, pos)
+        self.assertEqual(len(ax.lines), (len(t) - 2) * max(pos.N))
+
+    @unittest.skipIf(
+        plot is None or not plot.animation.writers.is_available("ffmpeg"),
+        "ffmpeg not installed",
+    )
+    def test_video(self):
+        tmp_dir = tempfile.mkdtemp()
+        t, pos = self.run_sim(2)
+        filename = os.path.join(tmp_dir, "walks.mp4")
+        plot.video(self.x, self.y, pos, filename=filename)
+        self.assertTrue(os.path.exists(filename))
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
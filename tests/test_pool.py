@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+import unittest
+
+from walks.pool import WalkerPool
+
+
+class TestPool(unittest.TestCase):
+    def setUp(self):
+        self.dim = 2
+        self.pos = np.array(((0.0, 1.0, 2.0), (3.0, 4.0, 5.0)))
+
+    def test_append(self):
+        pool = WalkerPool(self.dim)
+        self.assertEqual(pool.N, 0)
+        self.assertEqual(pool.pos.shape, (self.dim, 0))
+        pool.append(self.pos)
+        self.assertEqual(pool.N, 3)
+        np.testing.assert_array_equal(pool.pos, self.pos)
+        capacities = []
+        for i in range(100):
+            pool.append(self.pos[:, :1] + i)
+            capacities.append(pool.capacity)
+        self.assertEqual(pool.N, 103)
+        # amortized growth: only a few reallocations
+        self.assertLessEqual(len(set(capacities)), 7)
+        np.testing.assert_array_equal(pool.pos[:, :3], self.pos)
+        np.testing.assert_array_equal(pool.pos[:, -1], self.pos[:, 0] + 99)
+
+    def test_preallocated(self):
+        pool = WalkerPool(self.dim, capacity=1000)
+        pool.add_array("jumps", (self.dim,))
+        pool.add_array("id", dtype=np.int64)
+        buf = pool.pos.base
+        for i in range(100):
+            pool.extend(10)[...] = i
+        self.assertIs(pool.pos.base, buf)
+        self.assertEqual(pool.capacity, 1000)
+        self.assertEqual(pool["jumps"].shape, (self.dim, 1000))
+        self.assertEqual(pool["id"].shape, (1000,))
+        # views share memory with the pool
+        pool.pos[0, 0] = -1.0
+        self.assertEqual(pool.pos[0, 0], -1.0)
+        pool.clear()
+        self.assertEqual(pool.N, 0)
+        self.assertEqual(pool.capacity, 1000)
+
+    def test_fill(self):
+        pool = WalkerPool(self.dim)
+        pool.add_array("vel", (self.dim,), fill=np.nan)
+        pool.add_array("level", dtype=np.int64, fill=0)
+        pool.append(self.pos)
+        pool["level"][...] = 3
+        pool.append(self.pos[:, :1])
+        np.testing.assert_array_equal(pool["level"], (3, 3, 3, 0))
+        self.assertTrue(np.all(np.isnan(pool["vel"])))
+
+    def test_compact(self):
+        pool = WalkerPool(self.dim, capacity=10)
+        pool.add_array("id", dtype=np.int64)
+        pool.add_array("flag", dtype=bool)
+        pool.add_array("jumps", (self.dim,), scratch=True)
+        pool.append(np.arange(10.0).reshape(2, 5))
+        pool["id"][...] = np.arange(5)
+        pool["flag"][...] = (True, False, True, False, True)
+        buf = pool.pos.base
+        pool.compact(np.array((False, True, True, False, True)))
+        self.assertEqual(pool.N, 3)
+        self.assertIs(pool.pos.base, buf)
+        np.testing.assert_array_equal(pool.pos, ((1, 2, 4), (6, 7, 9)))
+        np.testing.assert_array_equal(pool["id"], (1, 2, 4))
+        np.testing.assert_array_equal(pool["flag"], (False, True, True))
+        self.assertRaises(ValueError, pool.compact, np.ones(5, dtype=bool))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+import unittest
+
+from walks.random import MasterRNG
+
+
+class TestRandom(unittest.TestCase):
+    def setUp(self):
+        self.seed = 19031977
+        self.dim = 3
+        self.block_size = 100
+        self.N = 1050
+
+    def test_master_rng(self):
+        rng = MasterRNG(self.seed)
+        seeds = [rng() for _ in range(1000)]
+        self.assertEqual(len(set(seeds)), len(seeds))
+        self.assertEqual(rng.seed, self.seed)
+        self.assertEqual(MasterRNG(self.seed)(), seeds[0])
+        # streams only depend on their key
+        gen_1 = MasterRNG(self.seed).generator(0, 5)
+        gen_2 = MasterRNG(self.seed).generator(0, 5)
+        self.assertEqual(gen_1.random(), gen_2.random())
+        spawned = np.random.SeedSequence(self.seed).spawn(3)[2]
+        self.assertEqual(
+            rng.seed_sequence(2).generate_state(4).tolist(),
+            spawned.generate_state(4).tolist(),
+        )
+        # the seeds do not reuse the states of the stream families
+        families = {
+            int(rng.seed_sequence(k).generate_state(1, np.uint32)[0])
+            for k in range(4)
+        }
+        self.assertFalse(families & set(seeds))
+
+    def test_walker_streams_threads(self):
+        jumps = []
+        for nthreads in (1, 2, 8):
+            streams = MasterRNG(self.seed).walker_streams(
+                self.dim, self.block_size
+            )
+            out = np.empty((self.dim, self.N))
+            streams.standard_normal(out, nthreads)
+            streams.standard_normal(out, nthreads)
+            streams.close()
+            jumps.append(out)
+        np.testing.assert_array_equal(jumps[0], jumps[1])
+        np.testing.assert_array_equal(jumps[0], jumps[2])
+
+    def test_walker_streams_split(self):
+        master = MasterRNG(self.seed)
+        full = np.empty((self.dim, 10 * self.block_size))
+        master.walker_streams(self.dim, self.block_size).standard_normal(full)
+        # two processes handling 4 and 6 blocks
+        part_1 = np.empty((self.dim, 4 * self.block_size))
+        part_2 = np.empty((self.dim, 6 * self.block_size))
+        master.walker_streams(self.dim, self.block_size).standard_normal(
+            part_1
+        )
+        master.walker_streams(
+            self.dim, self.block_size, first_block=4
+        ).standard_normal(part_2)
+        np.testing.assert_array_equal(np.hstack((part_1, part_2)), full)
+        # a walker's jumps do not depend on the total number of walkers
+        short = np.empty((self.dim, 250))
+        master.walker_streams(self.dim, self.block_size).standard_normal(
+            short
+        )
+        np.testing.assert_array_equal(short, full[:, :250])
+
+    def test_walker_streams_dtype(self):
+        streams = MasterRNG(self.seed).walker_streams(self.dim)
+        out = np.empty((self.dim, self.N), dtype=np.float32)
+        streams.standard_normal(out)
+        self.assertAlmostEqual(np.std(out), 1.0, places=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,12 +3,17 @@
 
 from __future__ import division, absolute_import, print_function
 
+import os
+import shutil
+import tempfile
+import threading
 import numpy as np
 import unittest
 
 from gstools import SRF, Gaussian
 
-from walks import Simulation
+from walks import Simulation, GridField
+from walks.output import netCDF4, h5py
 
 
 class TestSimulation(unittest.TestCase):
@@ -16,6 +21,9 @@ class TestSimulation(unittest.TestCase):
         """SRF emulation"""
         return self.drift_2d
 
+    def zero_field(self, pos):
+        return np.zeros_like(pos)
+
     def setUp(self):
         self.D_2d = np.atleast_1d(np.array((0.01, 0.01)))
         self.T = 10.0
@@ -33,8 +41,8 @@ class TestSimulation(unittest.TestCase):
     def test_0_walkers(self):
         sim = Simulation(2, self.srf, self.D_2d, self.T, self.dt)
         sim()
-        self.assertEqual(sim.output.pos[0][0], None)
-        self.assertEqual(sim.output.pos[0][1], None)
+        self.assertEqual(sim.output.N[0], 0)
+        self.assertEqual(sim.output.pos[0].shape, (2, 0))
 
     def test_drift(self):
         D0 = np.array((0.0, 0.0))
@@ -68,6 +76,323 @@ class TestSimulation(unittest.TestCase):
         for d in range(dim):
             self.assertAlmostEqual(sim.mean_pos[d], 0.0, places=0)
 
+    def test_fused_rng(self):
+        T = 100
+        dim = 2
+        pos = np.zeros((dim, 10000))
+        self.drift_2d = np.zeros_like(pos)
+        sim = Simulation(
+            dim, self.srf, self.D_2d, T, self.dt, nthreads=2, fused_rng=True
+        )
+        sim.initial_condition(pos)
+        sim(seed=123)
+        for d in range(dim):
+            self.assertAlmostEqual(sim.mean_pos[d], 0.0, places=1)
+            self.assertAlmostEqual(
+                np.var(sim.pos[d]), 2.0 * self.D_2d[d] * T, places=0
+            )
+        pos_1 = sim.pos.copy()
+        sim = Simulation(
+            dim, self.srf, self.D_2d, T, self.dt, nthreads=1, fused_rng=True
+        )
+        sim.initial_condition(pos)
+        sim(seed=123)
+        np.testing.assert_array_equal(sim.pos, pos_1)
+
+    def test_integrators(self):
+        T = 10
+        pos = np.zeros((2, 1000))
+        results = {}
+        for integrator in ("euler", "heun", "milstein"):
+            for fused_rng in (False, True):
+                sim = Simulation(
+                    2,
+                    self.zero_field,
+                    self.D_2d,
+                    T,
+                    self.dt,
+                    fused_rng=fused_rng,
+                    integrator=integrator,
+                )
+                sim.initial_condition(pos)
+                sim(seed=42)
+                results[integrator, fused_rng] = sim.pos.copy()
+        # without drift, all integrators are identical
+        for (integrator, fused_rng), pos_end in results.items():
+            np.testing.assert_allclose(
+                pos_end, results["euler", fused_rng], rtol=1e-12
+            )
+
+        def diffusion(pos):
+            # D = 0.01 + 0.001 x, in both dimensions
+            D = 0.01 + 0.001 * np.abs(pos[0])
+            dD = np.zeros_like(pos)
+            dD[0] = 0.001 * np.sign(pos[0])
+            return np.array((D, D)), dD
+
+        sim = Simulation(
+            2, self.zero_field, diffusion, T, self.dt, integrator="milstein"
+        )
+        sim.initial_condition(pos)
+        sim(seed=42)
+        self.assertTrue(np.all(np.isfinite(sim.pos)))
+        self.assertRaises(
+            ValueError, Simulation, 2, self.zero_field, diffusion, T, self.dt
+        )
+        self.assertRaises(
+            ValueError,
+            Simulation,
+            2,
+            self.zero_field,
+            self.D_2d,
+            T,
+            self.dt,
+            integrator="srk",
+        )
+
+    def test_adaptive(self):
+        def channel(pos):
+            # fast channel at y = 0 within slow flow
+            vel = np.zeros_like(pos)
+            vel[0] = np.where(np.abs(pos[1]) < 0.5, 2.0, 0.1)
+            return vel
+
+        pos = np.zeros((2, 100))
+        pos[1, 50:] = 2.0
+        D = np.array((0.0, 0.0))
+        sim = Simulation(
+            2, channel, D, 4.0, 1.0, adaptive=True, length_scale=1.0
+        )
+        sim.initial_condition(pos)
+        sim(seed=1)
+        # speed 2 with Courant number 0.5 and length scale 1 needs dt / 4
+        np.testing.assert_array_equal(sim.step_classes, (50, 0, 50, 0, 0))
+        np.testing.assert_allclose(sim.pos[0, :50], 8.0)
+        np.testing.assert_allclose(sim.pos[0, 50:], 0.4)
+        self.assertEqual(sim.output.pos.N.tolist(), [100] * 5)
+        # without refinement, the adaptive scheme is the Euler scheme
+        results = []
+        for adaptive in (False, True):
+            sim = Simulation(
+                2,
+                self.zero_field,
+                self.D_2d,
+                self.T,
+                self.dt,
+                adaptive=adaptive,
+                length_scale=10.0,
+            )
+            sim.initial_condition(pos)
+            sim(seed=2)
+            results.append(sim.pos.copy())
+        self.assertEqual(sim.step_classes[0], 100)
+        np.testing.assert_array_equal(results[0], results[1])
+        # refined walkers without drift sum up to the jump of the step
+        results = []
+        for adaptive in (False, True):
+            sim = Simulation(
+                2,
+                self.zero_field,
+                np.array((0.5, 0.5)),
+                self.T,
+                self.dt,
+                adaptive=adaptive,
+                length_scale=0.1,
+            )
+            sim.initial_condition(pos)
+            sim(seed=3)
+            results.append(sim.pos.copy())
+        self.assertEqual(sim.step_classes[-1], 100)
+        np.testing.assert_allclose(results[0], results[1], atol=1e-10)
+        self.assertRaises(
+            ValueError,
+            Simulation,
+            2,
+            channel,
+            D,
+            4.0,
+            1.0,
+            adaptive=True,
+        )
+
+    def test_dispersivity(self):
+        def uniform(pos):
+            vel = np.zeros_like(pos)
+            vel[0] = 1.0
+            return vel
+
+        T = 20
+        sim = Simulation(
+            2, uniform, 0.001, T, self.dt, dispersivity=(0.1, 0.01)
+        )
+        sim.initial_condition(np.zeros((2, 10000)))
+        sim(seed=3)
+        self.assertAlmostEqual(sim.mean_pos[0], T, places=1)
+        var = np.var(sim.pos, axis=1)
+        np.testing.assert_allclose(
+            var, (2.0 * 0.101 * T, 2.0 * 0.011 * T), rtol=0.05
+        )
+        self.assertRaises(
+            ValueError,
+            Simulation,
+            2,
+            uniform,
+            self.D_2d,
+            T,
+            self.dt,
+            integrator="heun",
+            dispersivity=(0.1, 0.01),
+        )
+
+    def test_seed_threads(self):
+        T = 5
+        dim = 2
+        pos = np.zeros((dim, 20000))
+        self.drift_2d = np.zeros_like(pos)
+        results = []
+        for nthreads in (1, 4):
+            sim = Simulation(
+                dim, self.srf, self.D_2d, T, self.dt, nthreads=nthreads
+            )
+            sim.initial_condition(pos)
+            sim(seed=123)
+            results.append(sim.pos.copy())
+        np.testing.assert_array_equal(results[0], results[1])
+
+    def test_sources(self):
+        D0 = np.array((0.0, 0.0))
+        sim = Simulation(2, self.zero_field, D0, 3.0, self.dt)
+        # two sources within the same time step, given out of order
+        sim.add_sources((1.5, 0.2, 0.7), ((1.0, 2.0, 3.0), (0.0, 0.0, 0.0)))
+        sim.add_sources(0.9, (4.0, 0.0), distribution=5)
+        np.testing.assert_array_equal(sim.sources.t, (0.2, 0.7, 0.9, 1.5))
+        sim()
+        self.assertEqual(sim.output.N, [0, 7, 8, 8])
+        np.testing.assert_array_equal(
+            sim.output.pos[1][0], (2.0, 3.0, 4.0, 4.0, 4.0, 4.0, 4.0)
+        )
+        np.testing.assert_array_equal(sim.pos[0], (2, 3, 4, 4, 4, 4, 4, 1))
+
+    def test_source_geometry(self):
+        D0 = np.array((0.0, 0.0))
+        sim = Simulation(2, self.zero_field, D0, 2.0, self.dt)
+        line = ((0.0, 2.0),)
+        area = ((1.0, 0.0), (0.0, 1.0))
+        sim.add_sources(0.0, (1.0, 1.0), 1000, span=line)
+        sim.add_sources(1.0, (5.0, 5.0), 1000, span=area)
+        sim(seed=42)
+        line_pos = sim.pos[:, :1000]
+        area_pos = sim.pos[:, 1000:]
+        np.testing.assert_array_equal(line_pos[0], 1.0)
+        self.assertTrue(np.all((line_pos[1] >= 1.0) & (line_pos[1] < 3.0)))
+        self.assertAlmostEqual(np.mean(line_pos[1]), 2.0, places=1)
+        self.assertTrue(np.all((area_pos >= 5.0) & (area_pos < 6.0)))
+        self.assertAlmostEqual(np.mean(area_pos), 5.5, places=1)
+
+    def test_async_output(self):
+        T = 5
+        pos = np.zeros((2, 100))
+        self.drift_2d = np.ones_like(pos)
+        results = []
+        for output_buffers in (0, 2):
+            sim = Simulation(
+                2, self.srf, self.D_2d, T, 1.0, output_buffers=output_buffers
+            )
+            sim.initial_condition(pos)
+            sim(seed=1)
+            results.append(sim.output.load())
+        np.testing.assert_array_equal(results[0][0], results[1][0])
+        for frame_sync, frame_async in zip(results[0][1], results[1][1]):
+            np.testing.assert_array_equal(frame_sync, frame_async)
+
+    def test_async_threads(self):
+        threads = threading.active_count()
+        for _ in range(5):
+            sim = Simulation(
+                2, self.zero_field, self.D_2d, 3, 1.0, output_buffers=2
+            )
+            sim.initial_condition(np.zeros((2, 10)))
+            sim(seed=1)
+        # no writer threads are left and the output stays usable
+        self.assertEqual(threading.active_count(), threads)
+        sim(seed=2)
+        self.assertEqual(threading.active_count(), threads)
+        self.assertEqual(len(sim.output.load()[0]), 8)
+
+    def check_float32(self, output):
+        x = np.linspace(-10.0, 30.0, 41)
+        values = np.zeros((2, 41, 41))
+        values[0] = 1.0
+        field = GridField(x, x, values=values)
+        pos = np.zeros((2, 1000))
+        tmp = tempfile.mkdtemp()
+        try:
+            for i, kwargs in enumerate(
+                ({}, {"fused_rng": True}, {"integrator": "heun"})
+            ):
+                sim = Simulation(
+                    2,
+                    field,
+                    self.D_2d,
+                    self.T,
+                    self.dt,
+                    output=output,
+                    filename=os.path.join(tmp, output + str(i)),
+                    dtype=np.float32,
+                    **kwargs
+                )
+                sim.initial_condition(pos)
+                sim(seed=4)
+                self.assertEqual(sim.pos.dtype, np.float32)
+                self.assertAlmostEqual(sim.mean_pos[0], self.T, places=1)
+                self.assertAlmostEqual(
+                    np.var(sim.pos[0]), 2.0 * 0.01 * self.T, places=1
+                )
+                _, traj = sim.output.load()
+                self.assertEqual(traj.data.dtype, np.float32)
+                np.testing.assert_array_equal(traj[-1], sim.pos)
+        finally:
+            shutil.rmtree(tmp)
+
+    @unittest.skipIf(netCDF4 is None, "netCDF4 not installed")
+    def test_float32_netcdf(self):
+        self.check_float32("NetCDF")
+
+    @unittest.skipIf(h5py is None, "h5py not installed")
+    def test_float32_hdf5(self):
+        self.check_float32("HDF5")
+
+    def test_float32(self):
+        self.check_float32("memory")
+        self.check_float32("binary")
+        pos = np.zeros((2, 1000))
+        # the fused RNG draws the same jumps as in double precision
+        results = []
+        for dtype in (np.double, np.float32):
+            sim = Simulation(
+                2,
+                self.zero_field,
+                self.D_2d,
+                self.T,
+                self.dt,
+                fused_rng=True,
+                dtype=dtype,
+            )
+            sim.initial_condition(pos)
+            sim(seed=5)
+            results.append(sim.pos.copy())
+        np.testing.assert_allclose(results[1], results[0], atol=1e-5)
+        self.assertRaises(
+            ValueError,
+            Simulation,
+            2,
+            self.zero_field,
+            self.D_2d,
+            self.T,
+            self.dt,
+            dtype=np.int64,
+        )
+
     def test_initial_condition(self):
         sim = Simulation(2, self.srf, self.D_2d, self.T, self.dt)
         sim.initial_condition(self.pos_2d, self.distribution_2d)
@@ -13,10 +13,22 @@ Subpackages
 
 .. autosummary::
     simulation
+    field
+    cache
+    dispersion
+    boundary
+    observer
+    kde
     output
+    pool
     plot
     random
     integrator
+    interpolation
+    summation
+    compaction
+    moments
+    binning
 
 
 Classes
@@ -42,6 +54,74 @@ Class for random number generation.
 
 .. autosummary::
    MasterRNG
+   WalkerStreams
+
+
+GridField
+^^^^^^^^^
+
+Classes for velocity fields with compiled evaluation.
+
+.. currentmodule:: walks.field
+
+.. autosummary::
+   Field
+   GridField
+   RandMethField
+   TileField
+   TransientField
+
+
+FieldCache
+^^^^^^^^^^
+
+Class for caching gridded fields on disk.
+
+.. currentmodule:: walks.cache
+
+.. autosummary::
+   FieldCache
+
+
+Boundary
+^^^^^^^^
+
+Classes for boundaries removing walkers.
+
+.. currentmodule:: walks.boundary
+
+.. autosummary::
+   Boundary
+   Plane
+   Box
+   Exits
+
+
+Observer
+^^^^^^^^
+
+Classes for evaluating the walkers during the simulation.
+
+.. currentmodule:: walks.observer
+
+.. autosummary::
+   Observer
+   Breakthrough
+   Moments
+   Concentration
+   Histogram
+   QuantileSketch
+
+
+WalkerPool
+^^^^^^^^^^
+
+Class for storing the walkers.
+
+.. currentmodule:: walks.pool
+
+.. autosummary::
+   WalkerPool
 
 
 Output
@@ -54,12 +134,31 @@ Class for righting the results from the  simulations to file.
 .. autosummary::
    Memory
    Pickle
+   Binary
+   NetCDF
+   HDF5
    Output
+   AsyncOutput
+   Trajectory
 
 
 Functions
 =========
 
+kde
+^^^
+
+Methods for the kernel density estimation of the walker positions.
+
+.. currentmodule:: walks.kde
+
+.. autosummary::
+   linear_binning
+   bandwidth
+   kde
+   iterate_kde
+
+
 plot
 ^^^^
 
@@ -81,16 +180,102 @@ Methods for integrating the equations of motion.
 
 .. autosummary::
    euler_maruyama
+   euler_maruyama_philox
+   philox_normal
+   heun_predictor
+   heun_corrector
+   milstein
+   scheidegger
+
+
+interpolation
+^^^^^^^^^^^^^
+
+Methods for interpolating gridded fields.
+
+.. currentmodule:: walks.interpolation
+
+.. autosummary::
+   interpolate
+   interpolate_time
+   interpolate_jacobian
+
+
+summation
+^^^^^^^^^
+
+Methods for summing the modes of randomization method fields.
+
+.. currentmodule:: walks.summation
+
+.. autosummary::
+   summate_incompr
+
+
+compaction
+^^^^^^^^^^
+
+Methods for removing walkers in place.
+
+.. currentmodule:: walks.compaction
+
+.. autosummary::
+   compact
+
+
+moments
+^^^^^^^
+
+Methods for the moments of the walker positions.
+
+.. currentmodule:: walks.moments
+
+.. autosummary::
+   moments
+
+
+binning
+^^^^^^^
+
+Methods for binning the walkers on grids.
+
+.. currentmodule:: walks.binning
+
+.. autosummary::
+   bin_walkers
 """
 from __future__ import absolute_import
 
 from walks._version import __version__
 from walks.random import MasterRNG
 from walks.integrator import euler_maruyama
+from walks.pool import WalkerPool
+from walks.field import (
+    Field,
+    GridField,
+    RandMethField,
+    TileField,
+    TransientField,
+)
+from walks.cache import FieldCache
+from walks.boundary import Plane, Box
+from walks.observer import Breakthrough, Moments, Concentration
 from walks.simulation import Simulation
-from walks.output import Memory, Pickle
+from walks.output import (
+    Memory,
+    Pickle,
+    Binary,
+    NetCDF,
+    HDF5,
+    AsyncOutput,
+    Trajectory,
+)
 
 # from walks import plot
 
 __all__ = ["__version__"]
-__all__ += ["Simulation", "output", "MasterRNG"]
+__all__ += ["Simulation", "output", "MasterRNG", "WalkerPool"]
+__all__ += ["Field", "GridField", "RandMethField", "TileField"]
+__all__ += ["TransientField"]
+__all__ += ["FieldCache", "Plane", "Box"]
+__all__ += ["Breakthrough", "Moments", "Concentration"]
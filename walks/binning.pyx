@@ -0,0 +1,126 @@
+#!python
+#cython: language_level=2
+# distutils: language = c++
+# -*- coding: utf-8 -*-
+"""
+Binning of the walkers on regular grids in Cython.
+
+The positions are a fused type, so single (``float32``) and double
+precision walkers are binned without a copy. The bins are always double.
+"""
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+cimport cython
+from cython cimport floating
+from cython.parallel import prange, threadid
+from libc.math cimport floor
+cimport numpy as np
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline Py_ssize_t _cell(
+    floating[:,:] pos,
+    Py_ssize_t i,
+    const double[:] lower,
+    const double[:] spacing,
+    const Py_ssize_t[:] shape,
+) noexcept nogil:
+    # flat C-order index of the cell of walker i, -1 outside of the grid
+    cdef int d
+    cdef Py_ssize_t cell, j
+    cdef double x
+    cell = 0
+    for d in range(pos.shape[0]):
+        x = (pos[d,i] - lower[d]) / spacing[d]
+        # NaN and inf are outside too, casting them to an integer is undefined
+        if not (x >= 0. and x < shape[d]):
+            return -1
+        j = <Py_ssize_t>floor(x)
+        cell = cell * shape[d] + j
+    return cell
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def bin_walkers(
+    floating[:,:] pos,
+    const double[:] lower,
+    const double[:] spacing,
+    shape,
+    double[:] out,
+    int num_threads=1
+    ):
+    """Count the walkers in the cells of a regular grid.
+
+    Every OpenMP thread adds its walkers to its own copy of the bins, so no
+    atomic operations are needed, and the copies are summed afterwards.
+    This needs ``num_threads`` times the memory of the grid. The cells
+    contain their lower and not their upper edges, walkers outside of the
+    grid are not counted. The counts are exact, so the result does not
+    depend on the number of threads.
+
+    Parameters
+    ----------
+    pos : :class:`np.ndarray`
+        the positions of the walkers with shape (dim, N)
+    lower : :class:`np.ndarray`
+        the lower corner of the grid
+    spacing : :class:`np.ndarray`
+        the edge lengths of the cells
+    shape : :class:`tuple`
+        the number of cells in every dimension
+    out : :class:`np.ndarray`
+        the flat C-ordered bins, the counts are added to its values
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
+
+    Returns
+    -------
+    :class:`int`
+        the number of counted walkers
+    """
+    cdef Py_ssize_t i, c, t, N, cells, cell, counted
+    cdef int dim
+
+    dim = pos.shape[0]
+    N = pos.shape[1]
+    shape_arr = np.array(shape, dtype=np.intp).reshape(-1)
+    cdef const Py_ssize_t[:] grid_shape = shape_arr
+
+    if not 1 <= dim <= 3:
+        raise ValueError("bin_walkers: dim has to be 1, 2 or 3")
+    if (
+        lower.shape[0] != dim
+        or spacing.shape[0] != dim
+        or grid_shape.shape[0] != dim
+    ):
+        raise ValueError("bin_walkers: grid has the wrong dimension")
+    cells = int(np.prod(shape_arr))
+    if out.shape[0] != cells:
+        raise ValueError("bin_walkers: out has the wrong size")
+    if num_threads < 1:
+        raise ValueError("bin_walkers: num_threads has to be >= 1")
+
+    local_arr = np.zeros((num_threads, cells))
+    cdef double[:,:] local = local_arr
+
+    for i in prange(
+        N, nogil=True, schedule='static', num_threads=num_threads
+    ):
+        cell = _cell(pos, i, lower, spacing, grid_shape)
+        if cell >= 0:
+            local[threadid(), cell] += 1.
+
+    counted = 0
+    for c in prange(
+        cells, nogil=True, schedule='static', num_threads=num_threads
+    ):
+        for t in range(local.shape[0]):
+            out[c] += local[t,c]
+            counted += <Py_ssize_t>local[t,c]
+    return counted
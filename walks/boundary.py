@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Boundaries removing walkers from the simulation.
+
+.. currentmodule:: walks.boundary
+
+Walkers crossing a boundary within a time step are removed from the
+simulation and their first passage is recorded. The crossing time and the
+exit position are linearly interpolated within the time step.
+
+The following classes are provided
+
+.. autosummary::
+   Boundary
+   Plane
+   Box
+   Exits
+"""
+# pylint: disable=C0103
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+__all__ = ["Boundary", "Plane", "Box", "Exits"]
+
+
+class Boundary(object):
+    """Base class of boundaries.
+
+    Subclasses implement :any:`Boundary.crossing`.
+    """
+
+    def crossing(self, old, new):
+        """Return the time step fraction, when walkers crossed the boundary.
+
+        Parameters
+        ----------
+        old : :any:`numpy.ndarray`
+            the positions at the start of the time step, shape (dim, N)
+        new : :any:`numpy.ndarray`
+            the positions at the end of the time step, shape (dim, N)
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the fraction of the time step in [0, 1], when the walkers
+            crossed the boundary, ``inf`` for walkers inside
+        """
+        raise NotImplementedError
+
+
+class Plane(Boundary):
+    """Plane removing walkers, which cross it in direction of its normal.
+
+    Used as an outflow boundary or as a control plane for travel times.
+
+    Parameters
+    ----------
+    point : :any:`numpy.ndarray`
+        a point on the plane
+    normal : :any:`numpy.ndarray`
+        the normal vector of the plane, pointing out of the domain
+    """
+
+    def __init__(self, point, normal):
+        self.point = np.asarray(point, dtype=np.double)
+        normal = np.asarray(normal, dtype=np.double)
+        self.normal = normal / np.linalg.norm(normal)
+
+    def distance(self, pos):
+        """Return the signed distance of positions to the plane.
+
+        Parameters
+        ----------
+        pos : :any:`numpy.ndarray`
+            the positions with shape (dim, N)
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the distance, positive outside of the domain
+        """
+        return np.dot(self.normal, pos) - np.dot(self.normal, self.point)
+
+    def crossing(self, old, new):
+        """Return the time step fraction, when walkers crossed the plane.
+
+        Parameters
+        ----------
+        old : :any:`numpy.ndarray`
+            the positions at the start of the time step, shape (dim, N)
+        new : :any:`numpy.ndarray`
+            the positions at the end of the time step, shape (dim, N)
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the fraction of the time step in [0, 1], when the walkers
+            crossed the plane, ``inf`` for walkers inside
+        """
+        s_old = self.distance(old)
+        s_new = self.distance(new)
+        frac = np.full(len(s_new), np.inf)
+        out = s_new >= 0.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frac[out] = s_old[out] / (s_old[out] - s_new[out])
+        # walkers, which already started outside (e.g. new walkers)
+        frac[out & (s_old >= 0.0)] = 0.0
+        return frac
+
+
+class Box(Boundary):
+    """Absorbing box, removing walkers leaving it through any face.
+
+    Parameters
+    ----------
+    lower : :any:`numpy.ndarray`
+        the lower bounds in all dimensions, ``None`` or ``-inf`` for open
+        faces
+    upper : :any:`numpy.ndarray`
+        the upper bounds in all dimensions, ``None`` or ``inf`` for open
+        faces
+    """
+
+    def __init__(self, lower, upper):
+        lower = [-np.inf if l is None else l for l in lower]
+        upper = [np.inf if u is None else u for u in upper]
+        self.lower = np.asarray(lower, dtype=np.double)
+        self.upper = np.asarray(upper, dtype=np.double)
+        self.faces = []
+        for d, (l, u) in enumerate(zip(self.lower, self.upper)):
+            normal = np.zeros(len(self.lower))
+            if np.isfinite(l):
+                normal[d] = -1.0
+                self.faces.append(Plane(normal * -l, normal))
+            normal = np.zeros(len(self.lower))
+            if np.isfinite(u):
+                normal[d] = 1.0
+                self.faces.append(Plane(normal * u, normal))
+
+    def crossing(self, old, new):
+        """Return the time step fraction, when walkers left the box.
+
+        Parameters
+        ----------
+        old : :any:`numpy.ndarray`
+            the positions at the start of the time step, shape (dim, N)
+        new : :any:`numpy.ndarray`
+            the positions at the end of the time step, shape (dim, N)
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the fraction of the time step in [0, 1], when the walkers
+            crossed the first face, ``inf`` for walkers inside
+        """
+        frac = np.full(new.shape[1], np.inf)
+        for face in self.faces:
+            np.minimum(frac, face.crossing(old, new), out=frac)
+        return frac
+
+
+class Exits(object):
+    """Record of the walkers removed by boundaries.
+
+    Parameters
+    ----------
+    dim : :class:`int`
+        spatial dimension
+    """
+
+    def __init__(self, dim):
+        self.dim = dim
+        self._chunks = []
+
+    def append(self, ids, start, time, pos, boundary):
+        """Record removed walkers.
+
+        Parameters
+        ----------
+        ids : :any:`numpy.ndarray`
+            the ids of the walkers
+        start : :any:`numpy.ndarray`
+            the start times of the walkers
+        time : :any:`numpy.ndarray`
+            the first passage times
+        pos : :any:`numpy.ndarray`
+            the exit positions with shape (dim, n)
+        boundary : :any:`numpy.ndarray`
+            the indices of the crossed boundaries
+        """
+        self._chunks.append(
+            (
+                np.array(ids, dtype=np.int64),
+                np.array(start, dtype=np.double),
+                np.array(time, dtype=np.double),
+                np.array(pos, dtype=np.double).reshape(self.dim, -1),
+                np.array(boundary, dtype=np.int64),
+            )
+        )
+        # merge the chunks from time to time
+        if len(self._chunks) > 64:
+            self._merge()
+
+    def _merge(self):
+        if len(self._chunks) > 1:
+            self._chunks = [
+                tuple(
+                    np.concatenate(parts, axis=-1)
+                    for parts in zip(*self._chunks)
+                )
+            ]
+
+    def _field(self, i):
+        self._merge()
+        if self._chunks:
+            return self._chunks[0][i]
+        return np.empty((self.dim, 0)) if i == 3 else np.empty(0)
+
+    @property
+    def id(self):
+        """:any:`numpy.ndarray`: ids of the removed walkers."""
+        return self._field(0)
+
+    @property
+    def start(self):
+        """:any:`numpy.ndarray`: start times of the removed walkers."""
+        return self._field(1)
+
+    @property
+    def time(self):
+        """:any:`numpy.ndarray`: first passage times of the walkers."""
+        return self._field(2)
+
+    @property
+    def travel_time(self):
+        """:any:`numpy.ndarray`: times from start to first passage."""
+        return self.time - self.start
+
+    @property
+    def pos(self):
+        """:any:`numpy.ndarray`: exit positions with shape (dim, n)."""
+        return self._field(3)
+
+    @property
+    def boundary(self):
+        """:any:`numpy.ndarray`: indices of the crossed boundaries."""
+        return self._field(4)
+
+    def __len__(self):
+        return sum(len(chunk[0]) for chunk in self._chunks)
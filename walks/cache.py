@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of gridded velocity fields.
+
+.. currentmodule:: walks.cache
+
+Gridded fields are stored as ``.npy`` files in a cache directory and are
+mapped read-only into memory, so repeated runs and several worker
+processes share one realization instead of regenerating it.
+
+The following classes are provided
+
+.. autosummary::
+   FieldCache
+"""
+# pylint: disable=C0103
+from __future__ import division, absolute_import, print_function
+
+import os
+import json
+import hashlib
+import tempfile
+
+import numpy as np
+
+from walks.field import GridField
+
+__all__ = ["FieldCache"]
+
+
+def _model_key(model):
+    """Return the parameters identifying a covariance model."""
+    return {
+        "name": model.name,
+        "dim": model.dim,
+        "var": model.var,
+        "len_scale": model.len_scale,
+        "nugget": model.nugget,
+        "anis": np.asarray(model.anis).tolist(),
+        "angles": np.asarray(model.angles).tolist(),
+        "opt_arg": {arg: getattr(model, arg) for arg in model.opt_arg},
+    }
+
+
+def _generator_key(generator):
+    """Return the parameters identifying a field generator."""
+    key = {"name": generator.name}
+    for attr in ("mode_no", "sampling", "mean_u"):
+        if hasattr(generator, attr):
+            key[attr] = getattr(generator, attr)
+    return key
+
+
+class FieldCache(object):
+    """Size bounded on-disk cache of gridded velocity fields.
+
+    Every entry is a ``.npy`` file named by a hash of the covariance model,
+    the generator, the seed and the grid. Entries are written to a
+    temporary file first and then atomically moved into place, so
+    concurrent processes never see partial files. If the total size of the
+    cache exceeds ``max_bytes``, the least recently used entries are
+    deleted. Processes still mapping a deleted entry keep a valid mapping.
+
+    Parameters
+    ----------
+    directory : :class:`str`
+        the cache directory, created if it does not exist
+    max_bytes : :class:`int`, optional
+        the maximal size of the cache in bytes. Default: 2 ** 32
+    """
+
+    def __init__(self, directory, max_bytes=2 ** 32):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, srf, axes, seed=None):
+        """Return the cache key of a field realization on a grid.
+
+        Parameters
+        ----------
+        srf : :any:`gstools.SRF`
+            the spatial random field
+        axes : :class:`list`
+            the equidistant grid axes
+        seed : :class:`int`, optional
+            the seed of the realization, if ``None`` the current seed of
+            the generator is used. Default: ``None``
+
+        Returns
+        -------
+        :class:`str`
+            the hexadecimal hash of the field parameters
+        """
+        if seed is None:
+            seed = srf.generator.seed
+        grid = [
+            [float(a[0]), float(a[-1]), len(a)]
+            for a in (np.asarray(a, dtype=np.double) for a in axes)
+        ]
+        params = {
+            "model": _model_key(srf.model),
+            "generator": _generator_key(srf.generator),
+            "mean": repr(srf.mean),
+            "normalizer": repr(srf.normalizer),
+            "trend": repr(srf.trend),
+            "seed": seed,
+            "grid": grid,
+        }
+        text = json.dumps(params, sort_keys=True, default=repr)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        """Return the file name of a cache entry.
+
+        Parameters
+        ----------
+        key : :class:`str`
+            the cache key
+
+        Returns
+        -------
+        :class:`str`
+            the path of the ``.npy`` file
+        """
+        return os.path.join(self.directory, key + ".npy")
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def load(self, key):
+        """Map a cache entry read-only into memory.
+
+        Parameters
+        ----------
+        key : :class:`str`
+            the cache key
+
+        Returns
+        -------
+        :any:`numpy.memmap` or :any:`None`
+            the cached values or ``None`` if there is no such entry
+        """
+        path = self.path(key)
+        try:
+            values = np.load(path, mmap_mode="r")
+            # the modification time marks recently used entries
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        return values
+
+    def store(self, key, values):
+        """Write an entry to the cache and evict old entries if needed.
+
+        Parameters
+        ----------
+        key : :class:`str`
+            the cache key
+        values : :any:`numpy.ndarray`
+            the gridded field
+
+        Returns
+        -------
+        :any:`numpy.memmap`
+            the stored values, mapped read-only into memory
+        """
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as fobj:
+                np.save(fobj, np.ascontiguousarray(values, dtype=np.double))
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict(keep=key)
+        return np.load(self.path(key), mmap_mode="r")
+
+    @property
+    def entries(self):
+        """:class:`list`: paths of all entries, least recently used first."""
+        paths = [
+            os.path.join(self.directory, f)
+            for f in os.listdir(self.directory)
+            if f.endswith(".npy")
+        ]
+        stats = []
+        for p in paths:
+            try:
+                stats.append((os.path.getmtime(p), p))
+            except OSError:
+                continue
+        return [p for _, p in sorted(stats)]
+
+    @property
+    def nbytes(self):
+        """:class:`int`: total size of all entries in bytes."""
+        return sum(self._size(p) for p in self.entries)
+
+    @staticmethod
+    def _size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def evict(self, keep=None):
+        """Delete least recently used entries exceeding the size limit.
+
+        Parameters
+        ----------
+        keep : :class:`str`, optional
+            key of an entry, which is never deleted. Default: ``None``
+        """
+        entries = self.entries
+        total = sum(self._size(p) for p in entries)
+        keep = None if keep is None else self.path(keep)
+        for path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            size = self._size(path)
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        """Delete all entries of the cache."""
+        for path in self.entries:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def grid_field(self, srf, x, y=None, z=None, seed=None, nthreads=1):
+        """Return a gridded realization of a vector field from the cache.
+
+        If the realization is not cached yet, it is generated on the grid
+        and stored. The returned field reads the values from the
+        read-only memory map.
+
+        Parameters
+        ----------
+        srf : :any:`gstools.SRF`
+            the spatial random field, created with
+            ``generator="VectorField"``
+        x : :any:`numpy.ndarray`
+            the equidistant grid axis in x-direction
+        y : :any:`numpy.ndarray`, optional
+            the equidistant grid axis in y-direction. Default: ``None``
+        z : :any:`numpy.ndarray`, optional
+            the equidistant grid axis in z-direction. Default: ``None``
+        seed : :class:`int`, optional
+            the seed of the realization, if ``None`` the current seed of
+            the generator is used. Default: ``None``
+        nthreads : :class:`int`, optional
+            number of threads used by the interpolation. Default: 1
+
+        Returns
+        -------
+        :class:`walks.GridField`
+            the gridded field
+        """
+        axes = [a for a in (x, y, z) if a is not None]
+        key = self.key(srf, axes, seed)
+        values = self.load(key)
+        if values is None:
+            values = srf(
+                axes,
+                seed=np.nan if seed is None else seed,
+                mesh_type="structured",
+                store=False,
+            )
+            values = self.store(key, values)
+        return GridField(x, y, z, values=values, nthreads=nthreads)
+
+    def __repr__(self):
+        """Return String representation."""
+        return "FieldCache(directory={!r}, max_bytes={})".format(
+            self.directory, self.max_bytes
+        )
@@ -0,0 +1,62 @@
+#!python
+#cython: language_level=2
+# distutils: language = c++
+# -*- coding: utf-8 -*-
+"""
+In-place compaction of walker arrays, implemented in Cython.
+"""
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+cimport cython
+cimport numpy as np
+
+
+ctypedef fused walker_t:
+    float
+    double
+    np.int32_t
+    np.int64_t
+    np.uint8_t
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def compact(walker_t[:,:] arr, const np.uint8_t[:] keep):
+    """Stable in-place partition of a walker array.
+
+    The kept walkers are moved to the front of the array in their original
+    order, without allocating any memory. The entries behind the kept
+    walkers are left undefined.
+
+    Parameters
+    ----------
+    arr : :class:`np.ndarray`
+        the walker array with shape (rows, capacity), the walkers along
+        the last axis
+    keep : :class:`np.ndarray`
+        mask of the active walkers, which are kept (``uint8`` view of a
+        boolean array), the walkers behind ``len(keep)`` are inactive
+
+    Returns
+    -------
+    :class:`int`
+        the number of kept walkers
+    """
+    cdef Py_ssize_t i, j, r, N
+
+    N = keep.shape[0]
+
+    if arr.shape[1] < N:
+        raise ValueError("compact: keep is longer than the array")
+
+    j = 0
+    with nogil:
+        for i in range(N):
+            if keep[i]:
+                if j < i:
+                    for r in range(arr.shape[0]):
+                        arr[r,j] = arr[r,i]
+                j += 1
+    return j
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Velocity dependent dispersion.
+
+.. currentmodule:: walks.dispersion
+
+The Scheidegger dispersion tensor is built from the local velocity by the
+compiled :any:`walks.integrator.scheidegger` kernel, which also needs the
+velocity Jacobian for the drift correction.
+
+The following functions are provided
+
+.. autosummary::
+   jacobian
+"""
+# pylint: disable=C0103
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+__all__ = ["jacobian"]
+
+
+def jacobian(field, pos, step=None, **field_kwargs):
+    """Evaluate a velocity field and its Jacobian at the given positions.
+
+    Fields with a ``jacobian`` method, like :class:`walks.GridField`,
+    provide the exact Jacobian of their interpolant. For all other fields,
+    the Jacobian is approximated by central differences with ``2 dim``
+    additional field evaluations.
+
+    Parameters
+    ----------
+    field : callable
+        the velocity field
+    pos : :any:`numpy.ndarray`
+        the positions with shape (dim, N)
+    step : :class:`float`, optional
+        the step of the finite differences. Default: the cube root of the
+        machine epsilon, relative to the coordinates, at least absolute
+    **field_kwargs
+        keyword arguments passed to the field
+
+    Returns
+    -------
+    vel : :any:`numpy.ndarray`
+        the velocity with shape (dim, N)
+    jac : :any:`numpy.ndarray`
+        the Jacobian with shape (dim, dim, N), where ``jac[k, d]`` is the
+        derivative of component ``k`` in direction ``d``
+    """
+    if hasattr(field, "jacobian"):
+        return field.jacobian(pos)
+    dim, N = pos.shape
+    vel = np.array(field(pos, **field_kwargs), dtype=np.double)
+    jac = np.empty((dim, dim, N))
+    shifted = np.array(pos, dtype=np.double)
+    for d in range(dim):
+        if step is None:
+            h = np.cbrt(np.finfo(np.double).eps) * np.maximum(
+                1.0, np.abs(pos[d])
+            )
+        else:
+            h = np.full(N, step)
+        shifted[d] = pos[d] + h
+        vel_p = np.array(field(shifted, **field_kwargs), dtype=np.double)
+        shifted[d] = pos[d] - h
+        vel_m = np.asarray(field(shifted, **field_kwargs), dtype=np.double)
+        jac[:, d] = (vel_p - vel_m) / (2.0 * h)
+        shifted[d] = pos[d]
+    # differences in double precision, returned in the walker precision
+    dtype = pos.dtype
+    return vel.astype(dtype, copy=False), jac.astype(dtype, copy=False)
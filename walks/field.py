@@ -0,0 +1,659 @@
+# -*- coding: utf-8 -*-
+"""
+Velocity fields with compiled evaluation.
+
+.. currentmodule:: walks.field
+
+The following classes are provided
+
+.. autosummary::
+   Field
+   GridField
+   RandMethField
+   TileField
+   TransientField
+"""
+# pylint: disable=C0103
+from __future__ import division, absolute_import, print_function
+
+from collections import OrderedDict
+
+import numpy as np
+
+from walks.interpolation import (
+    interpolate,
+    interpolate_time,
+    interpolate_jacobian,
+)
+from walks.summation import summate_incompr
+
+__all__ = [
+    "Field",
+    "GridField",
+    "RandMethField",
+    "TileField",
+    "TransientField",
+]
+
+
+class Field(object):
+    """Base class of velocity fields evaluated by compiled kernels.
+
+    Instances are callables taking the walker positions and returning the
+    drift, like any other field passed to :class:`walks.Simulation`.
+    The returned drift is a view of an internal buffer, which is reused by
+    the next call, and has the data type of the positions (single or
+    double precision).
+
+    Parameters
+    ----------
+    dim : :class:`int`
+        spatial dimension
+    nthreads : :class:`int`, optional
+        number of threads used by the kernels. Default: 1
+    """
+
+    def __init__(self, dim, nthreads=1):
+        self.dim = dim
+        self.nthreads = nthreads
+        self._drift = np.empty((dim, 0))
+        self._jac = np.empty((dim, dim, 0))
+
+    def _drift_buffer(self, N, dtype=np.double):
+        """Return a (dim, N) view of the drift buffer."""
+        if N > self._drift.shape[1] or self._drift.dtype != dtype:
+            capacity = max(N, 2 * self._drift.shape[1])
+            self._drift = np.empty((self.dim, capacity), dtype)
+        return self._drift[:, :N]
+
+    def _jacobian_buffer(self, N, dtype=np.double):
+        """Return a (dim, dim, N) view of the Jacobian buffer."""
+        if N > self._jac.shape[2] or self._jac.dtype != dtype:
+            capacity = max(N, 2 * self._jac.shape[2])
+            self._jac = np.empty((self.dim, self.dim, capacity), dtype)
+        return self._jac[:, :, :N]
+
+    def set_time(self, t):
+        """Set the time of the following evaluations.
+
+        :class:`walks.Simulation` calls this at the start of every time
+        step. Stationary fields ignore it.
+
+        Parameters
+        ----------
+        t : :class:`float`
+            the simulation time
+        """
+
+    def __call__(self, pos):
+        """Evaluate the field at the given positions.
+
+        Parameters
+        ----------
+        pos : :any:`numpy.ndarray`
+            the positions with shape (dim, N)
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the velocity with shape (dim, N)
+        """
+        raise NotImplementedError
+
+
+class GridField(Field):
+    """Velocity field on a structured, equidistant grid.
+
+    The field is either given by its values on the grid or by a callable,
+    which is evaluated once on all grid nodes. Afterwards, the drift at
+    the walker positions is calculated by a compiled, multithreaded
+    multilinear (bi- or trilinear) interpolation. Walkers outside of the
+    grid get the velocity of the nearest boundary.
+
+    Parameters
+    ----------
+    x : :any:`numpy.ndarray`
+        the equidistant grid axis in x-direction
+    y : :any:`numpy.ndarray`, optional
+        the equidistant grid axis in y-direction. Default: ``None``
+    z : :any:`numpy.ndarray`, optional
+        the equidistant grid axis in z-direction. Default: ``None``
+    field : callable, optional
+        the velocity field, taking positions with shape (dim, n) and
+        returning the velocity with shape (dim, n)
+    values : :any:`numpy.ndarray`, optional
+        the velocity on the grid with shape (dim, nx[, ny[, nz]]),
+        used if no field is given
+    nthreads : :class:`int`, optional
+        number of threads used by the interpolation. Default: 1
+    **field_kwargs
+        keyword arguments passed to the field
+    """
+
+    def __init__(
+        self,
+        x,
+        y=None,
+        z=None,
+        field=None,
+        values=None,
+        nthreads=1,
+        **field_kwargs
+    ):
+        axes = [
+            np.asarray(a, dtype=np.double) for a in (x, y, z) if a is not None
+        ]
+        super(GridField, self).__init__(len(axes), nthreads)
+        self.axes = axes
+        self.origin = np.array([a[0] for a in axes])
+        self.spacing = np.array(
+            [a[1] - a[0] if len(a) > 1 else 1.0 for a in axes]
+        )
+        self.shape = np.array([len(a) for a in axes], dtype=np.int64)
+        for a, h in zip(axes, self.spacing):
+            if len(a) > 1 and not np.allclose(np.diff(a), h):
+                raise ValueError("GridField: the grid has to be equidistant")
+        if field is not None:
+            values = self.evaluate(field, **field_kwargs)
+        if values is None:
+            raise ValueError("GridField: either field or values are needed")
+        self.values = values
+
+    @property
+    def grid_points(self):
+        """:any:`numpy.ndarray`: all grid nodes with shape (dim, nodes)."""
+        mesh = np.meshgrid(*self.axes, indexing="ij")
+        return np.array([m.ravel() for m in mesh])
+
+    def evaluate(self, field, **field_kwargs):
+        """Evaluate a velocity field on the grid nodes.
+
+        Parameters
+        ----------
+        field : callable
+            the velocity field
+        **field_kwargs
+            keyword arguments passed to the field
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the velocity with shape (dim, nx[, ny[, nz]])
+        """
+        values = np.asarray(field(self.grid_points, **field_kwargs))
+        return values.reshape((self.dim,) + tuple(self.shape))
+
+    @property
+    def values(self):
+        """:any:`numpy.ndarray`: the velocity on the grid nodes."""
+        return self._values.reshape((self.dim,) + tuple(self.shape))
+
+    @values.setter
+    def values(self, values):
+        values = np.asarray(values, dtype=np.double)
+        if values.shape != (self.dim,) + tuple(self.shape):
+            raise ValueError("GridField: values have the wrong shape")
+        self._values = np.ascontiguousarray(values.reshape(self.dim, -1))
+
+    def __call__(self, pos):
+        """Interpolate the velocity at the given positions.
+
+        Parameters
+        ----------
+        pos : :any:`numpy.ndarray`
+            the positions with shape (dim, N)
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the velocity with shape (dim, N)
+        """
+        drift = self._drift_buffer(pos.shape[1], pos.dtype)
+        interpolate(
+            pos,
+            self._values,
+            self.origin,
+            self.spacing,
+            self.shape,
+            drift,
+            self.nthreads,
+        )
+        return drift
+
+    def jacobian(self, pos):
+        """Interpolate the velocity and its Jacobian at the given positions.
+
+        Parameters
+        ----------
+        pos : :any:`numpy.ndarray`
+            the positions with shape (dim, N)
+
+        Returns
+        -------
+        drift : :any:`numpy.ndarray`
+            the velocity with shape (dim, N)
+        jac : :any:`numpy.ndarray`
+            the Jacobian with shape (dim, dim, N), where ``jac[k, d]`` is
+            the derivative of component ``k`` in direction ``d``
+        """
+        drift = self._drift_buffer(pos.shape[1], pos.dtype)
+        jac = self._jacobian_buffer(pos.shape[1], pos.dtype)
+        interpolate_jacobian(
+            pos,
+            self._values,
+            self.origin,
+            self.spacing,
+            self.shape,
+            drift,
+            jac,
+            self.nthreads,
+        )
+        return drift, jac
+
+
+def _modes(generator, name):
+    """Read the random modes of a GSTools generator as double array.
+
+    The public properties are preferred, GSTools up to version 1.7 only
+    stores the modes in private attributes.
+    """
+    if hasattr(type(generator), name):
+        value = getattr(generator, name)
+    else:
+        value = getattr(generator, "_" + name)
+    return np.array(value, dtype=np.double)
+
+
+class RandMethField(Field):
+    """Incompressible randomization method vector field of GSTools.
+
+    The random modes and phases are taken once from the
+    ``IncomprRandMeth`` generator of a GSTools ``SRF`` (created with
+    ``generator="VectorField"``) and the Fourier modes are then summed by
+    a compiled, cache blocked and multithreaded kernel. Rotation and
+    anisotropy of the covariance model are folded into the wave vectors,
+    so there is no gridding error. For isotropic models, the values are
+    identical to the ones of the ``SRF``.
+
+    Parameters
+    ----------
+    srf : :any:`gstools.SRF`
+        the spatial random field with an ``IncomprRandMeth`` generator
+    nthreads : :class:`int`, optional
+        number of threads used by the summation. Default: 1
+    """
+
+    def __init__(self, srf, nthreads=1):
+        generator = srf.generator
+        model = srf.model
+        if getattr(generator, "name", None) != "IncomprRandMeth":
+            raise ValueError("RandMethField: needs an IncomprRandMeth SRF")
+        if model.latlon or model.nugget > 0.0:
+            raise ValueError("RandMethField: no latlon or nugget supported")
+        if (
+            np.any(np.asarray(srf.mean) != 0.0)
+            or srf.trend is not None
+            or type(srf.normalizer).__name__ != "Normalizer"
+        ):
+            raise ValueError("RandMethField: no mean, trend or normalizer")
+        super(RandMethField, self).__init__(model.dim, nthreads)
+        # make sure, that the modes are up to date
+        generator.update(model)
+        self.mean_u = generator.mean_u
+        # like GSTools, only the mean velocity is left without variance
+        self.zero_var = bool(generator.zero_var)
+        if self.zero_var:
+            k = np.zeros((self.dim, 0))
+            self.z_1 = self.z_2 = np.zeros(0)
+        else:
+            k = _modes(generator, "cov_sample")
+            self.z_1 = _modes(generator, "z_1")
+            self.z_2 = _modes(generator, "z_2")
+        e1 = np.zeros((self.dim, 1))
+        e1[0] = 1.0
+        self.proj = e1 - k * k[0] / np.sum(k ** 2, axis=0)
+        iso = np.dot(model.isometrize(np.eye(self.dim)).T, k)
+        self.k = np.ascontiguousarray(iso)
+        self.scale = generator.mean_u * np.sqrt(model.var / generator.mode_no)
+
+    def __call__(self, pos):
+        """Evaluate the vector field at the given positions.
+
+        Parameters
+        ----------
+        pos : :any:`numpy.ndarray`
+            the positions with shape (dim, N)
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the velocity with shape (dim, N)
+        """
+        drift = self._drift_buffer(pos.shape[1], pos.dtype)
+        if self.zero_var:
+            drift[...] = 0.0
+        else:
+            summate_incompr(
+                pos,
+                self.k,
+                self.proj,
+                self.z_1,
+                self.z_2,
+                drift,
+                self.nthreads,
+            )
+            drift *= self.scale
+        drift[0] += self.mean_u
+        return drift
+
+
+class TileField(Field):
+    """Velocity field, lazily gridded on cached tiles around the walkers.
+
+    The domain is divided into tiles of ``tile_size`` grid cells per
+    dimension. The field is only evaluated on the grid nodes of tiles,
+    which contain walkers, and the drift is interpolated within the tiles
+    like in :class:`GridField`. Evaluated tiles are kept in a least
+    recently used cache, which evicts cold tiles if the memory budget is
+    exceeded. Since plumes only slowly move through the domain, most tiles
+    are reused for many time steps.
+
+    Parameters
+    ----------
+    dim : :class:`int`
+        spatial dimension
+    field : callable
+        the velocity field, taking positions with shape (dim, n) and
+        returning the velocity with shape (dim, n)
+    spacing : :class:`float` or :any:`numpy.ndarray`
+        the grid spacing in all dimensions
+    tile_size : :class:`int`, optional
+        number of grid cells per tile in every dimension. Default: 16
+    max_bytes : :class:`int`, optional
+        memory budget of the cached tiles in bytes. Default: 2 ** 28
+    origin : :any:`numpy.ndarray`, optional
+        a grid node, where the tiling starts. Default: 0
+    nthreads : :class:`int`, optional
+        number of threads used by the interpolation. Default: 1
+    **field_kwargs
+        keyword arguments passed to the field
+    """
+
+    def __init__(
+        self,
+        dim,
+        field,
+        spacing,
+        tile_size=16,
+        max_bytes=2 ** 28,
+        origin=0.0,
+        nthreads=1,
+        **field_kwargs
+    ):
+        super(TileField, self).__init__(dim, nthreads)
+        self.field = field
+        self.field_kwargs = field_kwargs
+        self.spacing = np.broadcast_to(
+            np.asarray(spacing, dtype=np.double), (dim,)
+        ).copy()
+        self.origin = np.broadcast_to(
+            np.asarray(origin, dtype=np.double), (dim,)
+        ).copy()
+        self.tile_size = int(tile_size)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tiles = OrderedDict()
+        self._shape = np.full(dim, self.tile_size + 1, dtype=np.int64)
+        self._nodes = np.array(
+            [
+                m.ravel()
+                for m in np.meshgrid(
+                    *[np.arange(self.tile_size + 1)] * dim, indexing="ij"
+                )
+            ],
+            dtype=np.double,
+        )
+
+    @property
+    def tile_bytes(self):
+        """:class:`int`: memory needed by a single tile in bytes."""
+        return 8 * self._nodes.size
+
+    @property
+    def nbytes(self):
+        """:class:`int`: memory used by the cached tiles in bytes."""
+        return len(self._tiles) * self.tile_bytes
+
+    @property
+    def hit_rate(self):
+        """:class:`float`: fraction of tile lookups served by the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def _tile_origin(self, tile):
+        return self.origin + np.array(tile) * self.tile_size * self.spacing
+
+    def _tile(self, tile):
+        """Return the cached values of a tile, evaluating it if needed."""
+        values = self._tiles.get(tile)
+        if values is not None:
+            self.hits += 1
+            self._tiles.move_to_end(tile)
+            return values
+        self.misses += 1
+        points = self._tile_origin(tile)[:, np.newaxis] + (
+            self._nodes * self.spacing[:, np.newaxis]
+        )
+        values = np.asarray(
+            self.field(points, **self.field_kwargs), dtype=np.double
+        )
+        values = np.ascontiguousarray(values.reshape(self.dim, -1))
+        # evict cold tiles, but always keep the new one
+        while self._tiles and self.nbytes + self.tile_bytes > self.max_bytes:
+            self._tiles.popitem(last=False)
+            self.evictions += 1
+        self._tiles[tile] = values
+        return values
+
+    def clear(self):
+        """Remove all tiles from the cache and reset the counters."""
+        self._tiles.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def __call__(self, pos):
+        """Interpolate the velocity at the given positions.
+
+        Parameters
+        ----------
+        pos : :any:`numpy.ndarray`
+            the positions with shape (dim, N)
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the velocity with shape (dim, N)
+        """
+        N = pos.shape[1]
+        drift = self._drift_buffer(N, pos.dtype)
+        if N == 0:
+            return drift
+        width = self.tile_size * self.spacing[:, np.newaxis]
+        tile_idx = np.floor((pos - self.origin[:, np.newaxis]) / width)
+        tiles, inverse = np.unique(
+            tile_idx.astype(np.int64), axis=1, return_inverse=True
+        )
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(tiles.shape[1] + 1))
+        for t in range(tiles.shape[1]):
+            tile = tuple(int(i) for i in tiles[:, t])
+            idx = order[bounds[t] : bounds[t + 1]]
+            sub_pos = pos[:, idx]
+            sub_drift = np.empty_like(sub_pos)
+            interpolate(
+                sub_pos,
+                self._tile(tile),
+                self._tile_origin(tile),
+                self.spacing,
+                self._shape,
+                sub_drift,
+                self.nthreads,
+            )
+            drift[:, idx] = sub_drift
+        return drift
+
+
+class TransientField(GridField):
+    """Time-dependent velocity field from gridded snapshots.
+
+    The snapshots are loaded lazily and only the two snapshots bracketing
+    the current time are kept in memory. The drift is interpolated
+    multilinearly in space and linearly in time by a compiled kernel.
+    Before the first and after the last snapshot, the field is constant.
+
+    Parameters
+    ----------
+    times : :any:`numpy.ndarray`
+        the strictly increasing times of the snapshots
+    snapshots : :class:`list`
+        the snapshots, each either the velocity on the grid with shape
+        (dim, nx[, ny[, nz]]), the name of a ``.npy`` file containing it
+        or a callable without arguments returning it
+    x : :any:`numpy.ndarray`
+        the equidistant grid axis in x-direction
+    y : :any:`numpy.ndarray`, optional
+        the equidistant grid axis in y-direction. Default: ``None``
+    z : :any:`numpy.ndarray`, optional
+        the equidistant grid axis in z-direction. Default: ``None``
+    nthreads : :class:`int`, optional
+        number of threads used by the interpolation. Default: 1
+    """
+
+    def __init__(self, times, snapshots, x, y=None, z=None, nthreads=1):
+        self.times = np.asarray(times, dtype=np.double).ravel()
+        self.snapshots = snapshots
+        if len(self.times) == 0 or len(self.times) != len(snapshots):
+            raise ValueError(
+                "TransientField: need one time for every snapshot"
+            )
+        if np.any(np.diff(self.times) <= 0.0):
+            raise ValueError(
+                "TransientField: times have to be strictly increasing"
+            )
+        super(TransientField, self).__init__(
+            x, y, z, values=self._read(0), nthreads=nthreads
+        )
+        self._loaded = {0: self._values}
+        self.time = None
+        self.set_time(self.times[0])
+
+    def _read(self, i):
+        snapshot = self.snapshots[i]
+        if callable(snapshot):
+            return snapshot()
+        if isinstance(snapshot, str):
+            return np.load(snapshot)
+        return snapshot
+
+    def _snapshot(self, i):
+        """Return the flattened snapshot ``i``, loading it if needed."""
+        if i not in self._loaded:
+            # the values setter checks the shape and flattens the snapshot
+            self.values = self._read(i)
+            self._loaded[i] = self._values
+        return self._loaded[i]
+
+    def set_time(self, t):
+        """Set the time of the following evaluations.
+
+        Loads the bracketing snapshots and releases all others.
+
+        Parameters
+        ----------
+        t : :class:`float`
+            the simulation time
+        """
+        n = len(self.times)
+        i = int(np.searchsorted(self.times, t, side="right")) - 1
+        i = min(max(i, 0), max(n - 2, 0))
+        j = min(i + 1, n - 1)
+        if j > i:
+            tw = (t - self.times[i]) / (self.times[j] - self.times[i])
+            self._weight = min(max(tw, 0.0), 1.0)
+        else:
+            self._weight = 0.0
+        for k in list(self._loaded):
+            if k not in (i, j):
+                del self._loaded[k]
+        self._bracket = (self._snapshot(i), self._snapshot(j))
+        self._values = self._bracket[0]
+        self.time = t
+
+    @property
+    def bracket(self):
+        """:class:`tuple`: indices of the two loaded snapshots."""
+        return tuple(sorted(self._loaded))
+
+    def __call__(self, pos):
+        """Interpolate the velocity at the given positions.
+
+        Parameters
+        ----------
+        pos : :any:`numpy.ndarray`
+            the positions with shape (dim, N)
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the velocity with shape (dim, N)
+        """
+        drift = self._drift_buffer(pos.shape[1], pos.dtype)
+        interpolate_time(
+            pos,
+            self._bracket[0],
+            self._bracket[1],
+            self._weight,
+            self.origin,
+            self.spacing,
+            self.shape,
+            drift,
+            self.nthreads,
+        )
+        return drift
+
+    def jacobian(self, pos):
+        """Interpolate the velocity and its Jacobian at the given positions.
+
+        Parameters
+        ----------
+        pos : :any:`numpy.ndarray`
+            the positions with shape (dim, N)
+
+        Returns
+        -------
+        drift : :any:`numpy.ndarray`
+            the velocity with shape (dim, N)
+        jac : :any:`numpy.ndarray`
+            the Jacobian with shape (dim, dim, N)
+        """
+        drift, jac = super(TransientField, self).jacobian(pos)
+        if self._weight > 0.0:
+            drift *= 1.0 - self._weight
+            jac *= 1.0 - self._weight
+            drift_1 = np.empty_like(drift)
+            jac_1 = np.empty_like(jac)
+            interpolate_jacobian(
+                pos,
+                self._bracket[1],
+                self.origin,
+                self.spacing,
+                self.shape,
+                drift_1,
+                jac_1,
+                self.nthreads,
+            )
+            drift += self._weight * drift_1
+            jac += self._weight * jac_1
+        return drift, jac
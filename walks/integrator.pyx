@@ -4,26 +4,96 @@
 # -*- coding: utf-8 -*-
 """
 The random walk integrators, implemented in Cython.
+
+The walker arrays (positions, drift, jumps and results) are fused types,
+so all kernels run in single (``float32``) or double precision. All walker
+arrays of one call need the same precision.
 """
 from __future__ import division, absolute_import, print_function
 
 import numpy as np
 
 cimport cython
+from cython cimport floating
 from cython.parallel import prange
-from libc.math cimport sqrt
+from libc.math cimport sqrt, log, cos, sin, M_PI
+from libc.stdint cimport uint32_t, uint64_t
 cimport numpy as np
 
 
-#cdef extern from '<random>' namespace 'std':
-#    cdef cppclass default_random_engine:
-#        default_random_engine()
-#        default_random_engine(unsigned int seed)
-#
-#    cdef cppclass normal_distribution[T]:
-#        normal_distribution()
-#        normal_distribution(T mean, T stddev)
-#        T operator()(default_random_engine rng)
+cdef extern from *:
+    """
+    #ifdef _OPENMP
+    #define WALKS_OPENMP 1
+    #else
+    #define WALKS_OPENMP 0
+    #endif
+    """
+    bint WALKS_OPENMP
+
+
+OPENMP = bool(WALKS_OPENMP)
+"""bool: Whether the integrators were compiled with OpenMP support."""
+
+
+# counter based random number generation ####################################
+# Philox4x32-10 from Salmon et al. "Parallel random numbers: as easy as
+# 1, 2, 3" (SC '11). The random numbers of a walker only depend on the key,
+# the walker id, the dimension and the time step, therefore they are
+# independent of the number of threads and the order of evaluation.
+
+cdef struct normal_pair:
+    double z0
+    double z1
+
+
+cdef inline void _mulhilo32(
+    uint32_t a, uint32_t b, uint32_t* hi, uint32_t* lo
+) noexcept nogil:
+    cdef uint64_t prod = <uint64_t>a * <uint64_t>b
+    hi[0] = <uint32_t>(prod >> 32)
+    lo[0] = <uint32_t>prod
+
+
+cdef inline void _philox4x32_10(
+    uint32_t* ctr, uint32_t k0, uint32_t k1
+) noexcept nogil:
+    cdef uint32_t hi0, lo0, hi1, lo1
+    cdef int r
+    for r in range(10):
+        _mulhilo32(0xD2511F53U, ctr[0], &hi0, &lo0)
+        _mulhilo32(0xCD9E8D57U, ctr[2], &hi1, &lo1)
+        ctr[0] = hi1 ^ ctr[1] ^ k0
+        ctr[1] = lo1
+        ctr[2] = hi0 ^ ctr[3] ^ k1
+        ctr[3] = lo0
+        k0 = k0 + 0x9E3779B9U
+        k1 = k1 + 0xBB67AE85U
+
+
+cdef inline double _uniform(uint32_t a, uint32_t b) noexcept nogil:
+    # 53 random bits mapped to the open interval (0, 1)
+    cdef uint64_t x = ((<uint64_t>a << 32) | b) >> 11
+    return (x + 0.5) * (1.0 / 9007199254740992.0)
+
+
+cdef inline normal_pair _philox_normal_pair(
+    uint64_t i, uint32_t pair, uint64_t step, uint32_t k0, uint32_t k1
+) noexcept nogil:
+    cdef uint32_t ctr[4]
+    cdef double r, phi
+    cdef normal_pair z
+    ctr[0] = <uint32_t>i
+    ctr[1] = (<uint32_t>(i >> 32) << 8) | (pair & 0xFF)
+    ctr[2] = <uint32_t>step
+    ctr[3] = <uint32_t>(step >> 32)
+    _philox4x32_10(ctr, k0, k1)
+    # Box-Muller transform
+    r = sqrt(-2.0 * log(_uniform(ctr[0], ctr[1])))
+    phi = 2.0 * M_PI * _uniform(ctr[2], ctr[3])
+    z.z0 = r * cos(phi)
+    z.z1 = r * sin(phi)
+    return z
 
 
 DTYPE = np.double
@@ -37,32 +107,468 @@ ctypedef np.double_t DTYPE_t
 @cython.wraparound(False)
 @cython.cdivision(True)
 def euler_maruyama(
-    double[:,:] pos,
-    double[:,:] drift,
-    double[:,:] jumps,
+    floating[:,:] pos,
+    floating[:,:] drift,
+    floating[:,:] jumps,
     double[:] D,
-    double dt
+    double dt,
+    int num_threads=1
     ):
     """Integrate the walks with the Euler Maruyama method.
 
+    The walkers are integrated independently of each other without holding
+    the GIL and, if the module was compiled with OpenMP, in parallel.
+    The result does not depend on the number of threads.
+
+    Parameters
+    ----------
+    pos : :class:`np.ndarray`
+        the positions in all dimensions
+    drift : :class:`np.ndarray`
+        the drift coefficients for all walkers
+    jumps : :class:`np.ndarray`
+        the (random) jump coefficients for all walkers
+    D : :class:`np.ndarray`
+        the diffusion coefficients for all walkers
+    dt : :class:`float`
+        Time step
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
+    """
+    cdef Py_ssize_t i, N
+    cdef int d, dim
+    cdef double[:] amp
+
+    dim = pos.shape[0]
+    N = pos.shape[1]
+
+    if num_threads < 1:
+        raise ValueError("euler_maruyama: num_threads has to be >= 1")
+
+    amp = np.empty(dim, dtype=DTYPE)
+    for d in range(dim):
+        amp[d] = sqrt(2.*D[d] * dt)
+
+    for i in prange(N, nogil=True, schedule='static', num_threads=num_threads):
+        for d in range(dim):
+            pos[d,i] = pos[d,i] + drift[d,i] * dt + amp[d] * jumps[d,i]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def philox_normal(
+    floating[:,:] out,
+    const np.int64_t[:] ids,
+    uint32_t key0,
+    uint32_t key1,
+    uint64_t step,
+    int num_threads=1
+    ):
+    """Draw the standard normal jumps of the fused Philox integrator.
+
+    This fills ``out`` with exactly the random numbers which
+    :any:`euler_maruyama_philox` draws internally for the same key and
+    time step.
+
+    Parameters
+    ----------
+    out : :class:`np.ndarray`
+        the array to be filled, shape (dim, N)
+    ids : :class:`np.ndarray`
+        the ``int64`` ids of the walkers, used as part of the Philox
+        counter, shape (N,)
+    key0 : :class:`int`
+        first 32 bits of the Philox key
+    key1 : :class:`int`
+        second 32 bits of the Philox key
+    step : :class:`int`
+        the time step, used as part of the Philox counter
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
+    """
+    cdef Py_ssize_t i, N
+    cdef int d, dim
+    cdef normal_pair z
+
+    dim = out.shape[0]
+    N = out.shape[1]
+
+    if ids.shape[0] != N:
+        raise ValueError("philox_normal: ids has the wrong length")
+    if num_threads < 1:
+        raise ValueError("philox_normal: num_threads has to be >= 1")
+
+    for i in prange(N, nogil=True, schedule='static', num_threads=num_threads):
+        for d in range(0, dim, 2):
+            z = _philox_normal_pair(ids[i], d // 2, step, key0, key1)
+            out[d,i] = z.z0
+            if d + 1 < dim:
+                out[d+1,i] = z.z1
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def euler_maruyama_philox(
+    floating[:,:] pos,
+    floating[:,:] drift,
+    const np.int64_t[:] ids,
+    double[:] D,
+    double dt,
+    uint32_t key0,
+    uint32_t key1,
+    uint64_t step,
+    int num_threads=1
+    ):
+    """Integrate the walks with the Euler Maruyama method and fused RNG.
+
+    Instead of reading precomputed jumps, the standard normal increments
+    are drawn inside the loop from a counter based Philox4x32-10 stream,
+    keyed by ``(key0, key1)`` and counted by walker id, dimension and
+    time step. This avoids allocating and copying a jumps array. The result
+    is identical to :any:`euler_maruyama` with jumps from
+    :any:`philox_normal` and does not depend on the number of threads.
+
     Parameters
     ----------
     pos : :class:`np.ndarray`
         the positions in all dimensions
     drift : :class:`np.ndarray`
         the drift coefficients for all walkers
+    ids : :class:`np.ndarray`
+        the ``int64`` ids of the walkers, used as part of the Philox
+        counter, so every walker keeps its stream when others are added or
+        removed
+    D : :class:`np.ndarray`
+        the diffusion coefficients for all walkers
+    dt : :class:`float`
+        Time step
+    key0 : :class:`int`
+        first 32 bits of the Philox key
+    key1 : :class:`int`
+        second 32 bits of the Philox key
+    step : :class:`int`
+        the time step, used as part of the Philox counter
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
+    """
+    cdef Py_ssize_t i, N
+    cdef int d, dim
+    cdef double[:] amp
+    cdef normal_pair z
+
+    dim = pos.shape[0]
+    N = pos.shape[1]
+
+    if ids.shape[0] != N:
+        raise ValueError("euler_maruyama_philox: ids has the wrong length")
+    if num_threads < 1:
+        raise ValueError("euler_maruyama_philox: num_threads has to be >= 1")
+
+    amp = np.empty(dim, dtype=DTYPE)
+    for d in range(dim):
+        amp[d] = sqrt(2.*D[d] * dt)
+
+    for i in prange(N, nogil=True, schedule='static', num_threads=num_threads):
+        for d in range(0, dim, 2):
+            z = _philox_normal_pair(ids[i], d // 2, step, key0, key1)
+            pos[d,i] = pos[d,i] + drift[d,i] * dt + amp[d] * z.z0
+            if d + 1 < dim:
+                pos[d+1,i] = pos[d+1,i] + drift[d+1,i] * dt + amp[d+1] * z.z1
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def heun_predictor(
+    floating[:,:] pos,
+    floating[:,:] drift,
+    floating[:,:] jumps,
+    double[:] D,
+    double dt,
+    floating[:,:] pred,
+    int num_threads=1
+    ):
+    """Predictor step of the stochastic Heun method.
+
+    Writes the Euler Maruyama estimate of the new positions to ``pred``
+    without changing ``pos``.
+
+    Parameters
+    ----------
+    pos : :class:`np.ndarray`
+        the positions in all dimensions
+    drift : :class:`np.ndarray`
+        the drift coefficients at the positions
     jumps : :class:`np.ndarray`
         the (random) jump coefficients for all walkers
     D : :class:`np.ndarray`
         the diffusion coefficients for all walkers
     dt : :class:`float`
         Time step
+    pred : :class:`np.ndarray`
+        the predicted positions, shape (dim, N)
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
     """
-    cdef int i, d, dim, N
+    cdef Py_ssize_t i, N
+    cdef int d, dim
+    cdef double[:] amp
 
     dim = pos.shape[0]
     N = pos.shape[1]
 
+    if num_threads < 1:
+        raise ValueError("heun_predictor: num_threads has to be >= 1")
+
+    amp = np.empty(dim, dtype=DTYPE)
+    for d in range(dim):
+        amp[d] = sqrt(2.*D[d] * dt)
+
+    for i in prange(N, nogil=True, schedule='static', num_threads=num_threads):
+        for d in range(dim):
+            pred[d,i] = pos[d,i] + drift[d,i] * dt + amp[d] * jumps[d,i]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def heun_corrector(
+    floating[:,:] pos,
+    floating[:,:] drift,
+    floating[:,:] drift_pred,
+    floating[:,:] jumps,
+    double[:] D,
+    double dt,
+    int num_threads=1
+    ):
+    """Corrector step of the stochastic Heun method.
+
+    Integrates the walks with the mean of the drift at the old and at the
+    predicted positions and the same jumps as the predictor. For constant
+    diffusion, this is of weak order 2 in the drift.
+
+    Parameters
+    ----------
+    pos : :class:`np.ndarray`
+        the positions in all dimensions
+    drift : :class:`np.ndarray`
+        the drift coefficients at the old positions
+    drift_pred : :class:`np.ndarray`
+        the drift coefficients at the predicted positions
+    jumps : :class:`np.ndarray`
+        the (random) jump coefficients used by the predictor
+    D : :class:`np.ndarray`
+        the diffusion coefficients for all walkers
+    dt : :class:`float`
+        Time step
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
+    """
+    cdef Py_ssize_t i, N
+    cdef int d, dim
+    cdef double[:] amp
+
+    dim = pos.shape[0]
+    N = pos.shape[1]
+
+    if num_threads < 1:
+        raise ValueError("heun_corrector: num_threads has to be >= 1")
+
+    amp = np.empty(dim, dtype=DTYPE)
+    for d in range(dim):
+        amp[d] = sqrt(2.*D[d] * dt)
+
+    for i in prange(N, nogil=True, schedule='static', num_threads=num_threads):
+        for d in range(dim):
+            pos[d,i] = (
+                pos[d,i]
+                + 0.5 * (drift[d,i] + drift_pred[d,i]) * dt
+                + amp[d] * jumps[d,i]
+            )
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def milstein(
+    floating[:,:] pos,
+    floating[:,:] drift,
+    floating[:,:] jumps,
+    const floating[:,:] D,
+    const floating[:,:] dD,
+    double dt,
+    int num_threads=1
+    ):
+    """Integrate the walks with the Milstein method for varying diffusion.
+
+    The diffusion coefficients ``D`` and their derivatives ``dD`` along
+    the respective dimension are given per walker. The derivative is added
+    to the drift, so the walker density solves the advection dispersion
+    equation, and the Milstein term ``dD dt (z^2 - 1) / 2`` corrects the
+    noise for the varying amplitude ``sqrt(2 D)``. For constant ``D`` this
+    is the Euler Maruyama method.
+
+    Parameters
+    ----------
+    pos : :class:`np.ndarray`
+        the positions in all dimensions
+    drift : :class:`np.ndarray`
+        the drift coefficients for all walkers
+    jumps : :class:`np.ndarray`
+        the (random) jump coefficients for all walkers
+    D : :class:`np.ndarray`
+        the non-negative diffusion coefficients, shape (dim, N)
+    dD : :class:`np.ndarray`
+        the derivatives of ``D[d]`` in direction ``d``, shape (dim, N)
+    dt : :class:`float`
+        Time step
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
+    """
+    cdef Py_ssize_t i, N
+    cdef int d, dim
+    cdef double z
+
+    dim = pos.shape[0]
+    N = pos.shape[1]
+
+    if num_threads < 1:
+        raise ValueError("milstein: num_threads has to be >= 1")
+    if D.shape[1] < N or dD.shape[1] < N:
+        raise ValueError("milstein: D and dD need values for all walkers")
+
+    for i in prange(N, nogil=True, schedule='static', num_threads=num_threads):
+        for d in range(dim):
+            z = jumps[d,i]
+            pos[d,i] = (
+                pos[d,i]
+                + (drift[d,i] + dD[d,i]) * dt
+                + sqrt(2. * D[d,i] * dt) * z
+                + 0.5 * dD[d,i] * dt * (z * z - 1.)
+            )
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline void _scheidegger_walker(
+    floating[:,:] pos,
+    floating[:,:] vel,
+    floating[:,:,:] jac,
+    floating[:,:] jumps,
+    Py_ssize_t i,
+    double alpha_L,
+    double alpha_T,
+    double Dm,
+    double dt,
+) noexcept nogil:
+    cdef int d, j, dim
+    cdef double speed, div, vg, jv, vz, b_L, b_T
+    cdef double g[3]
+    cdef double corr[3]
+    dim = pos.shape[0]
+    speed = 0.
+    for d in range(dim):
+        speed = speed + vel[d,i] * vel[d,i]
+    speed = sqrt(speed)
+    if speed <= 0.:
+        b_T = sqrt(2. * Dm * dt)
+        for d in range(dim):
+            pos[d,i] = pos[d,i] + b_T * jumps[d,i]
+        return
+    # gradient of the speed and divergence of the velocity
+    div = 0.
+    vg = 0.
+    for d in range(dim):
+        g[d] = 0.
+        for j in range(dim):
+            g[d] = g[d] + vel[j,i] * jac[j,d,i]
+        g[d] = g[d] / speed
+        div = div + jac[d,d,i]
+        vg = vg + vel[d,i] * g[d]
+    # drift correction: divergence of the dispersion tensor
+    for d in range(dim):
+        jv = 0.
+        for j in range(dim):
+            jv = jv + jac[d,j,i] * vel[j,i]
+        corr[d] = alpha_T * g[d] + (alpha_L - alpha_T) / speed * (
+            jv + vel[d,i] * div - vel[d,i] * vg / speed
+        )
+    # square root of the dispersion tensor applied to the jumps
+    b_L = sqrt(2. * (alpha_L * speed + Dm) * dt)
+    b_T = sqrt(2. * (alpha_T * speed + Dm) * dt)
+    vz = 0.
+    for d in range(dim):
+        vz = vz + vel[d,i] * jumps[d,i]
+    vz = vz / speed
     for d in range(dim):
-        for i in range(N):
-            pos[d,i] = pos[d,i] + drift[d,i] * dt + sqrt(2.*D[d] * dt) * jumps[d,i]
+        pos[d,i] = (
+            pos[d,i]
+            + (vel[d,i] + corr[d]) * dt
+            + b_L * vel[d,i] / speed * vz
+            + b_T * (jumps[d,i] - vel[d,i] / speed * vz)
+        )
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def scheidegger(
+    floating[:,:] pos,
+    floating[:,:] vel,
+    floating[:,:,:] jac,
+    floating[:,:] jumps,
+    double alpha_L,
+    double alpha_T,
+    double Dm,
+    double dt,
+    int num_threads=1
+    ):
+    """Integrate the walks with velocity dependent Scheidegger dispersion.
+
+    The dispersion tensor
+    ``D = (alpha_T |v| + Dm) I + (alpha_L - alpha_T) v v^T / |v|``
+    is built per walker from its velocity. Its divergence, calculated with
+    the velocity Jacobian, is added to the drift, and the jumps are scaled
+    with the square root of the tensor
+    ``sqrt(2 (alpha_L |v| + Dm)) P + sqrt(2 (alpha_T |v| + Dm)) (I - P)``,
+    where ``P`` is the projection on the flow direction, all in one loop
+    over the walkers with the Euler Maruyama method.
+
+    Parameters
+    ----------
+    pos : :class:`np.ndarray`
+        the positions in all dimensions
+    vel : :class:`np.ndarray`
+        the velocity of all walkers, shape (dim, N)
+    jac : :class:`np.ndarray`
+        the velocity Jacobian with shape (dim, dim, N), where ``jac[k, d]``
+        is the derivative of component ``k`` in direction ``d``
+    jumps : :class:`np.ndarray`
+        the (random) jump coefficients for all walkers
+    alpha_L : :class:`float`
+        the longitudinal dispersivity
+    alpha_T : :class:`float`
+        the transverse dispersivity
+    Dm : :class:`float`
+        the molecular diffusion coefficient
+    dt : :class:`float`
+        Time step
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
+    """
+    cdef Py_ssize_t i, N
+
+    N = pos.shape[1]
+
+    if not 1 <= pos.shape[0] <= 3:
+        raise ValueError("scheidegger: dim has to be 1, 2 or 3")
+    if num_threads < 1:
+        raise ValueError("scheidegger: num_threads has to be >= 1")
+
+    for i in prange(N, nogil=True, schedule='static', num_threads=num_threads):
+        _scheidegger_walker(
+            pos, vel, jac, jumps, i, alpha_L, alpha_T, Dm, dt
+        )
@@ -0,0 +1,369 @@
+#!python
+#cython: language_level=2
+# distutils: language = c++
+# -*- coding: utf-8 -*-
+"""
+Interpolation of gridded fields, implemented in Cython.
+
+The walker arrays (positions, drift, jumps and results) are fused types,
+so all kernels run in single (``float32``) or double precision. All walker
+arrays of one call need the same precision.
+"""
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+cimport cython
+from cython cimport floating
+from cython.parallel import prange
+cimport numpy as np
+
+
+DTYPE = np.double
+ctypedef np.double_t DTYPE_t
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline void _cell(
+    floating[:,:] pos,
+    Py_ssize_t i,
+    double[:] origin,
+    double[:] spacing,
+    np.int64_t[:] shape,
+    np.int64_t* idx,
+    double* w,
+) noexcept nogil:
+    # cell index and local coordinate of a walker, clamped to the grid
+    cdef int d
+    cdef double x
+    for d in range(pos.shape[0]):
+        x = (pos[d,i] - origin[d]) / spacing[d]
+        # NaN is clamped too, casting it to an integer is undefined
+        if shape[d] < 2 or not x > 0.:
+            idx[d] = 0
+            w[d] = 0.
+        elif x >= shape[d] - 1:
+            idx[d] = shape[d] - 2
+            w[d] = 1.
+        else:
+            idx[d] = <np.int64_t>x
+            w[d] = x - idx[d]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline void _interpolate_walker(
+    floating[:,:] pos,
+    Py_ssize_t i,
+    const double[:,:] values,
+    double[:] origin,
+    double[:] spacing,
+    np.int64_t[:] shape,
+    floating[:,:] out,
+) noexcept nogil:
+    cdef int d, c, k, dim, corners
+    cdef np.int64_t idx[3]
+    cdef np.int64_t node, stride
+    cdef double w[3]
+    cdef double weight
+    dim = pos.shape[0]
+    corners = 1 << dim
+    _cell(pos, i, origin, spacing, shape, idx, w)
+    for k in range(values.shape[0]):
+        out[k,i] = 0.
+    for c in range(corners):
+        weight = 1.
+        node = 0
+        stride = 1
+        for d in range(dim - 1, -1, -1):
+            if (c >> d) & 1:
+                weight = weight * w[d]
+                if shape[d] > 1:
+                    node = node + (idx[d] + 1) * stride
+            else:
+                weight = weight * (1. - w[d])
+                node = node + idx[d] * stride
+            stride = stride * shape[d]
+        if weight == 0.:
+            continue
+        for k in range(values.shape[0]):
+            out[k,i] = out[k,i] + weight * values[k,node]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def interpolate(
+    floating[:,:] pos,
+    const double[:,:] values,
+    double[:] origin,
+    double[:] spacing,
+    np.int64_t[:] shape,
+    floating[:,:] out,
+    int num_threads=1
+    ):
+    """Multilinear interpolation of a field on an equidistant grid.
+
+    Depending on the dimension, this is a linear, bilinear or trilinear
+    interpolation. Positions outside of the grid get the values of the
+    nearest boundary.
+
+    Parameters
+    ----------
+    pos : :class:`np.ndarray`
+        the positions of the walkers with shape (dim, N)
+    values : :class:`np.ndarray`
+        the field components on the grid nodes with shape (ncomp, nodes),
+        where the nodes are flattened in C order. May be read-only, like
+        a memory-mapped file
+    origin : :class:`np.ndarray`
+        the first grid node in all dimensions
+    spacing : :class:`np.ndarray`
+        the grid spacing in all dimensions
+    shape : :class:`np.ndarray`
+        the number of grid nodes in all dimensions
+    out : :class:`np.ndarray`
+        the interpolated field components with shape (ncomp, N)
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
+    """
+    cdef Py_ssize_t i, N
+
+    N = pos.shape[1]
+
+    if not 1 <= pos.shape[0] <= 3:
+        raise ValueError("interpolate: dim has to be 1, 2 or 3")
+    if out.shape[0] != values.shape[0] or out.shape[1] < N:
+        raise ValueError("interpolate: out has the wrong shape")
+    if num_threads < 1:
+        raise ValueError("interpolate: num_threads has to be >= 1")
+
+    for i in prange(N, nogil=True, schedule='static', num_threads=num_threads):
+        _interpolate_walker(pos, i, values, origin, spacing, shape, out)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline void _interpolate_walker_time(
+    floating[:,:] pos,
+    Py_ssize_t i,
+    const double[:,:] values0,
+    const double[:,:] values1,
+    double tw,
+    double[:] origin,
+    double[:] spacing,
+    np.int64_t[:] shape,
+    floating[:,:] out,
+) noexcept nogil:
+    cdef int d, c, k, dim, corners
+    cdef np.int64_t idx[3]
+    cdef np.int64_t node, stride
+    cdef double w[3]
+    cdef double weight
+    dim = pos.shape[0]
+    corners = 1 << dim
+    _cell(pos, i, origin, spacing, shape, idx, w)
+    for k in range(values0.shape[0]):
+        out[k,i] = 0.
+    for c in range(corners):
+        weight = 1.
+        node = 0
+        stride = 1
+        for d in range(dim - 1, -1, -1):
+            if (c >> d) & 1:
+                weight = weight * w[d]
+                if shape[d] > 1:
+                    node = node + (idx[d] + 1) * stride
+            else:
+                weight = weight * (1. - w[d])
+                node = node + idx[d] * stride
+            stride = stride * shape[d]
+        if weight == 0.:
+            continue
+        for k in range(values0.shape[0]):
+            out[k,i] = out[k,i] + weight * (
+                (1. - tw) * values0[k,node] + tw * values1[k,node]
+            )
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def interpolate_time(
+    floating[:,:] pos,
+    const double[:,:] values0,
+    const double[:,:] values1,
+    double tw,
+    double[:] origin,
+    double[:] spacing,
+    np.int64_t[:] shape,
+    floating[:,:] out,
+    int num_threads=1
+    ):
+    """Multilinear interpolation between two snapshots of a gridded field.
+
+    The field is interpolated in space like in :any:`interpolate` and
+    linearly in time between the two snapshots, in a single pass over the
+    walkers.
+
+    Parameters
+    ----------
+    pos : :class:`np.ndarray`
+        the positions of the walkers with shape (dim, N)
+    values0 : :class:`np.ndarray`
+        the earlier snapshot on the grid nodes with shape (ncomp, nodes)
+    values1 : :class:`np.ndarray`
+        the later snapshot on the grid nodes with shape (ncomp, nodes)
+    tw : :class:`float`
+        the time weight of the later snapshot, between 0 and 1
+    origin : :class:`np.ndarray`
+        the first grid node in all dimensions
+    spacing : :class:`np.ndarray`
+        the grid spacing in all dimensions
+    shape : :class:`np.ndarray`
+        the number of grid nodes in all dimensions
+    out : :class:`np.ndarray`
+        the interpolated field components with shape (ncomp, N)
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
+    """
+    cdef Py_ssize_t i, N
+
+    N = pos.shape[1]
+
+    if not 1 <= pos.shape[0] <= 3:
+        raise ValueError("interpolate_time: dim has to be 1, 2 or 3")
+    if (
+        values1.shape[0] != values0.shape[0]
+        or values1.shape[1] != values0.shape[1]
+    ):
+        raise ValueError("interpolate_time: snapshots differ in shape")
+    if out.shape[0] != values0.shape[0] or out.shape[1] < N:
+        raise ValueError("interpolate_time: out has the wrong shape")
+    if num_threads < 1:
+        raise ValueError("interpolate_time: num_threads has to be >= 1")
+
+    for i in prange(N, nogil=True, schedule='static', num_threads=num_threads):
+        _interpolate_walker_time(
+            pos, i, values0, values1, tw, origin, spacing, shape, out
+        )
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline void _jacobian_walker(
+    floating[:,:] pos,
+    Py_ssize_t i,
+    const double[:,:] values,
+    double[:] origin,
+    double[:] spacing,
+    np.int64_t[:] shape,
+    floating[:,:] out,
+    floating[:,:,:] jac,
+) noexcept nogil:
+    cdef int d, e, c, k, dim, corners
+    cdef np.int64_t idx[3]
+    cdef np.int64_t node, stride
+    cdef double w[3]
+    cdef double f[3]
+    cdef double df[3]
+    cdef double weight, dweight, v
+    dim = pos.shape[0]
+    corners = 1 << dim
+    _cell(pos, i, origin, spacing, shape, idx, w)
+    for k in range(values.shape[0]):
+        out[k,i] = 0.
+        for d in range(dim):
+            jac[k,d,i] = 0.
+    for c in range(corners):
+        node = 0
+        stride = 1
+        for d in range(dim - 1, -1, -1):
+            if shape[d] < 2:
+                f[d] = 1. if (c >> d) & 1 == 0 else 0.
+                df[d] = 0.
+            elif (c >> d) & 1:
+                f[d] = w[d]
+                df[d] = 1. / spacing[d]
+                node = node + (idx[d] + 1) * stride
+            else:
+                f[d] = 1. - w[d]
+                df[d] = -1. / spacing[d]
+                node = node + idx[d] * stride
+            stride = stride * shape[d]
+        weight = 1.
+        for d in range(dim):
+            weight = weight * f[d]
+        for k in range(values.shape[0]):
+            v = values[k,node]
+            out[k,i] = out[k,i] + weight * v
+            for d in range(dim):
+                dweight = df[d]
+                for e in range(dim):
+                    if e != d:
+                        dweight = dweight * f[e]
+                jac[k,d,i] = jac[k,d,i] + dweight * v
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def interpolate_jacobian(
+    floating[:,:] pos,
+    const double[:,:] values,
+    double[:] origin,
+    double[:] spacing,
+    np.int64_t[:] shape,
+    floating[:,:] out,
+    floating[:,:,:] jac,
+    int num_threads=1
+    ):
+    """Multilinear interpolation of a gridded field and its Jacobian.
+
+    Besides the values like :any:`interpolate`, this calculates the
+    derivatives of the interpolant in the same pass over the walkers.
+    Outside of the grid, the derivatives of the nearest boundary cell are
+    used.
+
+    Parameters
+    ----------
+    pos : :class:`np.ndarray`
+        the positions of the walkers with shape (dim, N)
+    values : :class:`np.ndarray`
+        the field components on the grid nodes with shape (ncomp, nodes),
+        where the nodes are flattened in C order
+    origin : :class:`np.ndarray`
+        the first grid node in all dimensions
+    spacing : :class:`np.ndarray`
+        the grid spacing in all dimensions
+    shape : :class:`np.ndarray`
+        the number of grid nodes in all dimensions
+    out : :class:`np.ndarray`
+        the interpolated field components with shape (ncomp, N)
+    jac : :class:`np.ndarray`
+        the derivatives with shape (ncomp, dim, N), where ``jac[k, d]`` is
+        the derivative of component ``k`` in direction ``d``
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
+    """
+    cdef Py_ssize_t i, N
+
+    N = pos.shape[1]
+
+    if not 1 <= pos.shape[0] <= 3:
+        raise ValueError("interpolate_jacobian: dim has to be 1, 2 or 3")
+    if out.shape[0] != values.shape[0] or out.shape[1] < N:
+        raise ValueError("interpolate_jacobian: out has the wrong shape")
+    if (
+        jac.shape[0] != values.shape[0]
+        or jac.shape[1] != pos.shape[0]
+        or jac.shape[2] < N
+    ):
+        raise ValueError("interpolate_jacobian: jac has the wrong shape")
+    if num_threads < 1:
+        raise ValueError("interpolate_jacobian: num_threads has to be >= 1")
+
+    for i in prange(N, nogil=True, schedule='static', num_threads=num_threads):
+        _jacobian_walker(pos, i, values, origin, spacing, shape, out, jac)
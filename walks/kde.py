@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Kernel density estimation of the walker positions.
+
+.. currentmodule:: walks.kde
+
+The walkers are distributed on the nodes of a regular grid by linear
+binning and the binned counts are convolved with the kernel by FFT, so the
+costs only depend on the number of walkers linearly and on the grid size
+with ``O(n log n)``. The grid is given by its first and last node and the
+number of nodes in every dimension, like the axes of
+:class:`walks.GridField`.
+
+The following functions are provided
+
+.. autosummary::
+   linear_binning
+   bandwidth
+   kde
+   iterate_kde
+"""
+# pylint: disable=C0103
+from __future__ import division, absolute_import, print_function
+
+import itertools
+import numpy as np
+
+__all__ = ["linear_binning", "bandwidth", "kde", "iterate_kde"]
+
+KERNELS = ("gaussian", "epanechnikov")
+BANDWIDTHS = ("scott", "silverman")
+
+# kernel support in standard deviations
+_SUPPORT = {"gaussian": 4.0, "epanechnikov": np.sqrt(5.0)}
+
+
+def _grid(lower, upper, shape):
+    lower = np.array(lower, dtype=np.double, ndmin=1)
+    upper = np.array(upper, dtype=np.double, ndmin=1)
+    shape = tuple(np.array(shape, dtype=int, ndmin=1))
+    if not len(lower) == len(upper) == len(shape):
+        raise ValueError("kde: grid dimensions differ")
+    if np.any(upper <= lower) or min(shape) < 2:
+        raise ValueError("kde: the grid needs at least two nodes")
+    spacing = (upper - lower) / (np.array(shape) - 1)
+    return lower, spacing, shape
+
+
+def linear_binning(pos, lower, upper, shape, weights=None):
+    """Distribute the walkers linearly onto the nodes of a grid.
+
+    Every walker is split onto the ``2^dim`` corners of its cell with the
+    weights of a multilinear interpolation, so the mean position is kept.
+    Walkers outside of the grid are skipped.
+
+    Parameters
+    ----------
+    pos : :any:`numpy.ndarray`
+        the positions of the walkers with shape (dim, N)
+    lower : :any:`numpy.ndarray`
+        the first grid node
+    upper : :any:`numpy.ndarray`
+        the last grid node
+    shape : :class:`tuple`
+        the number of nodes in every dimension
+    weights : :any:`numpy.ndarray`, optional
+        the weights of the walkers. Default: 1 for all walkers
+
+    Returns
+    -------
+    :any:`numpy.ndarray`
+        the binned weights with the given shape
+    """
+    lower, spacing, shape = _grid(lower, upper, shape)
+    pos = np.asarray(pos, dtype=np.double).reshape(len(shape), -1)
+    if weights is None:
+        weights = np.ones(pos.shape[1])
+    x = (pos - lower[:, np.newaxis]) / spacing[:, np.newaxis]
+    last = np.array(shape)[:, np.newaxis] - 1
+    inside = np.all((x >= 0.0) & (x <= last), axis=0)
+    x = x[:, inside]
+    weights = np.asarray(weights, dtype=np.double)[inside]
+    # walkers on the last node use the last cell
+    idx = np.minimum(np.floor(x).astype(np.intp), last - 1)
+    frac = x - idx
+    binned = np.zeros(int(np.prod(shape)))
+    for corner in itertools.product((0, 1), repeat=len(shape)):
+        w = weights.copy()
+        for d, c in enumerate(corner):
+            w *= frac[d] if c else 1.0 - frac[d]
+        flat = np.ravel_multi_index(
+            tuple(idx + np.array(corner)[:, np.newaxis]), shape
+        )
+        binned += np.bincount(flat, w, minlength=len(binned))
+    return binned.reshape(shape)
+
+
+def bandwidth(pos, method="scott", weights=None):
+    """Rule of thumb bandwidths of a Gaussian kernel in every dimension.
+
+    Scott's rule ``n^(-1/(d+4)) s`` and Silverman's rule
+    ``(4/(d+2))^(1/(d+4)) n^(-1/(d+4)) s`` are optimal for normally
+    distributed walkers. For Silverman's rule, the spread ``s`` is the
+    minimum of the standard deviation and the interquartile range divided
+    by 1.349, which is more robust for skewed plumes.
+
+    Parameters
+    ----------
+    pos : :any:`numpy.ndarray`
+        the positions of the walkers with shape (dim, N)
+    method : :class:`str`, optional
+        ``"scott"`` or ``"silverman"``. Default: ``"scott"``
+    weights : :any:`numpy.ndarray`, optional
+        the weights of the walkers, the effective number of walkers is
+        used for ``n``. Default: 1 for all walkers
+
+    Returns
+    -------
+    :any:`numpy.ndarray`
+        the bandwidth, the standard deviation of the kernel, in every
+        dimension
+    """
+    if method not in BANDWIDTHS:
+        raise ValueError("bandwidth: method has to be in " + str(BANDWIDTHS))
+    pos = np.asarray(pos, dtype=np.double)
+    dim = pos.shape[0]
+    if weights is None:
+        n = pos.shape[1]
+        std = np.std(pos, axis=1, ddof=1)
+    else:
+        weights = np.asarray(weights, dtype=np.double)
+        n = weights.sum() ** 2 / np.sum(weights ** 2)
+        mean = np.average(pos, axis=1, weights=weights)
+        std = np.sqrt(np.average((pos.T - mean) ** 2, axis=0, weights=weights))
+    factor = n ** (-1.0 / (dim + 4))
+    if method == "scott":
+        return factor * std
+    iqr = np.subtract(*np.percentile(pos, (75, 25), axis=1)) / 1.349
+    spread = np.where(iqr > 0.0, np.minimum(std, iqr), std)
+    return (4.0 / (dim + 2)) ** (1.0 / (dim + 4)) * factor * spread
+
+
+def _kernel_weights(kernel, h, spacing):
+    """Normalized 1D kernel on the grid offsets."""
+    # no smoothing for a vanishing (or undefined) bandwidth
+    if not h > 0.0:
+        return np.ones(1)
+    L = int(np.ceil(_SUPPORT[kernel] * h / spacing))
+    u = np.arange(-L, L + 1) * spacing / h
+    if kernel == "gaussian":
+        w = np.exp(-0.5 * u ** 2)
+    else:
+        # scaled to unit variance, support [-sqrt(5), sqrt(5)]
+        w = np.maximum(1.0 - u ** 2 / 5.0, 0.0)
+    if w.sum() == 0.0:
+        return np.ones(1)
+    return w / w.sum()
+
+
+def kde(
+    pos,
+    lower,
+    upper,
+    shape,
+    h="scott",
+    kernel="gaussian",
+    weights=None,
+    mass=None,
+):
+    """Kernel density estimate of the walkers on a grid.
+
+    The walkers are binned with :any:`linear_binning` and convolved with a
+    product kernel by FFT. The grid is padded by the kernel support, so the
+    mass does not wrap around the domain and mass smoothed out of the grid
+    is lost. The kernel is normalized on the grid, so the estimate keeps
+    the binned mass even for bandwidths close to the grid spacing.
+
+    Parameters
+    ----------
+    pos : :any:`numpy.ndarray`
+        the positions of the walkers with shape (dim, N)
+    lower : :any:`numpy.ndarray`
+        the first grid node
+    upper : :any:`numpy.ndarray`
+        the last grid node
+    shape : :class:`tuple`
+        the number of nodes in every dimension
+    h : :class:`str` or :class:`float` or :any:`numpy.ndarray`, optional
+        the bandwidth, the standard deviation of the kernel, in every
+        dimension, or the rule to select it, see :any:`bandwidth`.
+        Default: ``"scott"``
+    kernel : :class:`str`, optional
+        ``"gaussian"`` or ``"epanechnikov"``. Default: ``"gaussian"``
+    weights : :any:`numpy.ndarray`, optional
+        the weights of the walkers. Default: 1 for all walkers
+    mass : :class:`float`, optional
+        the mass of a walker with weight 1. Default: the inverse of the
+        total weight, so the density integrates to one
+
+    Returns
+    -------
+    :any:`numpy.ndarray`
+        the density at the grid nodes with the given shape
+    """
+    if kernel not in KERNELS:
+        raise ValueError("kde: kernel has to be in " + str(KERNELS))
+    _, spacing, shape = _grid(lower, upper, shape)
+    pos = np.asarray(pos, dtype=np.double).reshape(len(shape), -1)
+    if isinstance(h, str):
+        h = bandwidth(pos, h, weights)
+    h = np.broadcast_to(np.asarray(h, dtype=np.double), (len(shape),))
+    if mass is None:
+        total = pos.shape[1] if weights is None else np.sum(weights)
+        mass = 1.0 / total if total > 0 else 0.0
+    binned = linear_binning(pos, lower, upper, shape, weights)
+    kernels = [_kernel_weights(kernel, *args) for args in zip(h, spacing)]
+    # zero padding by the kernel support avoids the periodic wrap around
+    size = [n + len(w) - 1 for n, w in zip(shape, kernels)]
+    axes = list(range(len(shape)))
+    spectrum = np.fft.rfftn(binned, size, axes)
+    for d, w in enumerate(kernels):
+        k_shape = [1] * len(shape)
+        k_shape[d] = -1
+        if d == len(shape) - 1:
+            w_hat = np.fft.rfft(w, size[d])
+        else:
+            w_hat = np.fft.fft(w, size[d])
+        spectrum *= w_hat.reshape(k_shape)
+    smooth = np.fft.irfftn(spectrum, size, axes)
+    # the kernel centers are shifted by half their length
+    window = tuple(
+        slice(len(w) // 2, len(w) // 2 + n) for n, w in zip(shape, kernels)
+    )
+    return smooth[window] * mass / np.prod(spacing)
+
+
+def iterate_kde(frames, lower, upper, shape, **kwargs):
+    """Kernel density estimates of a series of snapshots.
+
+    Parameters
+    ----------
+    frames : iterable
+        the ``(time, pos)`` snapshots, like :any:`walks.output.Output.iterate`
+        or ``zip(*output.load())``
+    lower : :any:`numpy.ndarray`
+        the first grid node
+    upper : :any:`numpy.ndarray`
+        the last grid node
+    shape : :class:`tuple`
+        the number of nodes in every dimension
+    **kwargs
+        keyword arguments passed to :any:`kde`
+
+    Yields
+    ------
+    :class:`float`
+        Simulation time of the snapshot
+    :any:`numpy.ndarray`
+        the density at the grid nodes
+    """
+    for time, pos in frames:
+        yield time, kde(pos, lower, upper, shape, **kwargs)
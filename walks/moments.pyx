@@ -0,0 +1,238 @@
+#!python
+#cython: language_level=2
+# distutils: language = c++
+# -*- coding: utf-8 -*-
+"""
+Streaming central moments of the walker positions in Cython.
+
+The positions are a fused type, so the moments of single (``float32``) or
+double precision walkers are computed without a copy. The moments are
+always accumulated in double precision.
+"""
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+cimport cython
+from cython cimport floating
+from cython.parallel import prange
+cimport numpy as np
+
+
+cdef enum:
+    # maximal number of chunks, accumulated independently
+    CHUNKS = 64
+    # minimal number of walkers per chunk
+    MIN_CHUNK = 1024
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline void _accumulate(
+    floating[:,:] pos,
+    const np.int64_t[:] groups,
+    bint grouped,
+    Py_ssize_t c,
+    Py_ssize_t start,
+    Py_ssize_t end,
+    double[:,:] count,
+    double[:,:,:] mean,
+    double[:,:,:,:] central,
+    double[:,:,:,:] comoment,
+) noexcept nogil:
+    # Welford update of one chunk, walker by walker
+    cdef Py_ssize_t i, g
+    cdef int d, e, dim
+    cdef double n, n1, delta_n, term
+    cdef double delta[3]
+    dim = pos.shape[0]
+    for i in range(start, end):
+        g = groups[i] if grouped else 0
+        if g < 0:
+            continue
+        n1 = count[c,g]
+        n = n1 + 1.
+        count[c,g] = n
+        for d in range(dim):
+            delta[d] = pos[d,i] - mean[c,g,d]
+            delta_n = delta[d] / n
+            term = delta[d] * delta_n * n1
+            mean[c,g,d] = mean[c,g,d] + delta_n
+            central[c,g,2,d] = (
+                central[c,g,2,d]
+                + term * delta_n * delta_n * (n * n - 3. * n + 3.)
+                + 6. * delta_n * delta_n * central[c,g,0,d]
+                - 4. * delta_n * central[c,g,1,d]
+            )
+            central[c,g,1,d] = (
+                central[c,g,1,d]
+                + term * delta_n * (n - 2.)
+                - 3. * delta_n * central[c,g,0,d]
+            )
+            central[c,g,0,d] = central[c,g,0,d] + term
+        for d in range(dim):
+            for e in range(dim):
+                comoment[c,g,d,e] = (
+                    comoment[c,g,d,e] + delta[d] * (pos[e,i] - mean[c,g,e])
+                )
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline void _merge(
+    Py_ssize_t c,
+    Py_ssize_t g,
+    int dim,
+    double[:,:] count,
+    double[:,:,:] mean,
+    double[:,:,:,:] central,
+    double[:,:,:,:] comoment,
+) noexcept nogil:
+    # pairwise merge of chunk c into chunk 0 (Chan et al., Pebay)
+    cdef int d, e
+    cdef double na, nb, n, dl, m2a, m2b, m3a, m3b
+    cdef double delta[3]
+    na = count[0,g]
+    nb = count[c,g]
+    if nb == 0.:
+        return
+    n = na + nb
+    for d in range(dim):
+        delta[d] = mean[c,g,d] - mean[0,g,d]
+    for d in range(dim):
+        dl = delta[d]
+        m2a = central[0,g,0,d]
+        m2b = central[c,g,0,d]
+        m3a = central[0,g,1,d]
+        m3b = central[c,g,1,d]
+        central[0,g,2,d] = (
+            central[0,g,2,d] + central[c,g,2,d]
+            + dl * dl * dl * dl * na * nb * (na * na - na * nb + nb * nb)
+            / (n * n * n)
+            + 6. * dl * dl * (na * na * m2b + nb * nb * m2a) / (n * n)
+            + 4. * dl * (na * m3b - nb * m3a) / n
+        )
+        central[0,g,1,d] = (
+            m3a + m3b
+            + dl * dl * dl * na * nb * (na - nb) / (n * n)
+            + 3. * dl * (na * m2b - nb * m2a) / n
+        )
+        central[0,g,0,d] = m2a + m2b + dl * dl * na * nb / n
+    for d in range(dim):
+        for e in range(dim):
+            comoment[0,g,d,e] = (
+                comoment[0,g,d,e] + comoment[c,g,d,e]
+                + delta[d] * delta[e] * na * nb / n
+            )
+    for d in range(dim):
+        mean[0,g,d] = mean[0,g,d] + delta[d] * nb / n
+    count[0,g] = n
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def moments(
+    floating[:,:] pos,
+    groups=None,
+    Py_ssize_t ngroups=1,
+    int num_threads=1
+    ):
+    """Central moments of the walker positions up to the fourth order.
+
+    The walkers are split into at most 64 chunks, which are accumulated
+    with Welford's online update on the OpenMP threads. The chunks are
+    merged pairwise afterwards with the update formulas of Chan et al. and
+    Pebay, which are numerically stable for large numbers of walkers. The
+    chunks only depend on the number of walkers, so the result does not
+    depend on the number of threads.
+
+    Parameters
+    ----------
+    pos : :class:`np.ndarray`
+        the positions of the walkers with shape (dim, N)
+    groups : :class:`np.ndarray`, optional
+        ``int64`` group index of every walker, the moments are calculated
+        per group. Walkers with a negative index are skipped.
+        Default: all walkers in one group
+    ngroups : :class:`int`, optional
+        the number of groups. Default: 1
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
+
+    Returns
+    -------
+    count : :class:`np.ndarray`
+        the number of walkers with shape (ngroups,)
+    mean : :class:`np.ndarray`
+        the mean positions with shape (ngroups, dim)
+    central : :class:`np.ndarray`
+        the sums of the 2nd, 3rd and 4th powers of the deviations from the
+        mean in every dimension with shape (ngroups, 3, dim)
+    comoment : :class:`np.ndarray`
+        the sums of the products of the deviations with shape
+        (ngroups, dim, dim)
+    """
+    cdef Py_ssize_t c, g, N, size, chunks
+    cdef int dim
+    cdef bint grouped
+    cdef const np.int64_t[:] grp
+
+    dim = pos.shape[0]
+    N = pos.shape[1]
+
+    if not 1 <= dim <= 3:
+        raise ValueError("moments: dim has to be 1, 2 or 3")
+    if ngroups < 1:
+        raise ValueError("moments: ngroups has to be >= 1")
+    if num_threads < 1:
+        raise ValueError("moments: num_threads has to be >= 1")
+    grouped = groups is not None
+    if grouped:
+        grp = groups
+        if grp.shape[0] != N:
+            raise ValueError("moments: groups has the wrong length")
+        if N > 0 and np.max(groups) >= ngroups:
+            raise ValueError("moments: group index out of range")
+    else:
+        grp = np.zeros(1, dtype=np.int64)
+
+    size = max(<Py_ssize_t>MIN_CHUNK, (N + CHUNKS - 1) // CHUNKS)
+    chunks = max(1, (N + size - 1) // size)
+    count_arr = np.zeros((chunks, ngroups))
+    mean_arr = np.zeros((chunks, ngroups, dim))
+    central_arr = np.zeros((chunks, ngroups, 3, dim))
+    comoment_arr = np.zeros((chunks, ngroups, dim, dim))
+    cdef double[:,:] count = count_arr
+    cdef double[:,:,:] mean = mean_arr
+    cdef double[:,:,:,:] central = central_arr
+    cdef double[:,:,:,:] comoment = comoment_arr
+
+    for c in prange(
+        chunks, nogil=True, schedule='static', num_threads=num_threads
+    ):
+        _accumulate(
+            pos,
+            grp,
+            grouped,
+            c,
+            c * size,
+            min((c + 1) * size, N),
+            count,
+            mean,
+            central,
+            comoment,
+        )
+    with nogil:
+        for g in range(ngroups):
+            for c in range(1, chunks):
+                _merge(c, g, dim, count, mean, central, comoment)
+
+    return (
+        count_arr[0].astype(np.int64),
+        mean_arr[0],
+        central_arr[0],
+        comoment_arr[0],
+    )
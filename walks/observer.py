@@ -0,0 +1,607 @@
+# -*- coding: utf-8 -*-
+"""
+Observers, evaluating the walkers during the simulation.
+
+.. currentmodule:: walks.observer
+
+Observers are called by :class:`walks.Simulation` within the time loop,
+so statistics of the walkers can be accumulated without storing their
+trajectories.
+
+The following classes are provided
+
+.. autosummary::
+   Observer
+   Breakthrough
+   Moments
+   Concentration
+   Histogram
+   QuantileSketch
+"""
+# pylint: disable=C0103
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+from walks.boundary import Plane
+from walks.moments import moments
+from walks.binning import bin_walkers
+
+__all__ = [
+    "Observer",
+    "Breakthrough",
+    "Moments",
+    "Concentration",
+    "Histogram",
+    "QuantileSketch",
+]
+
+
+class Observer(object):
+    """Base class of observers.
+
+    Subclasses override the hooks they need. If ``track_start`` is set,
+    the positions at the start of every time step are available in the
+    ``"pos_start"`` array of the walker pool during :any:`Observer.step`.
+    """
+
+    track_start = False
+
+    def start(self, sim):
+        """Called at the start of a simulation run.
+
+        Parameters
+        ----------
+        sim : :class:`walks.Simulation`
+            the simulation
+        """
+
+    def step(self, sim, t):
+        """Called after every time step.
+
+        Parameters
+        ----------
+        sim : :class:`walks.Simulation`
+            the simulation
+        t : :class:`float`
+            the time at the start of the step
+        """
+
+    def save(self, sim, t):
+        """Called at every output time step.
+
+        Parameters
+        ----------
+        sim : :class:`walks.Simulation`
+            the simulation
+        t : :class:`float`
+            the simulation time
+        """
+
+    def finish(self, sim):
+        """Called at the end of a simulation run.
+
+        Parameters
+        ----------
+        sim : :class:`walks.Simulation`
+            the simulation
+        """
+
+
+class Histogram(object):
+    """Streaming histogram with fixed bins.
+
+    Parameters
+    ----------
+    edges : :any:`numpy.ndarray`
+        the increasing bin edges
+    """
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.double)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    def add(self, values):
+        """Add values to the histogram.
+
+        Parameters
+        ----------
+        values : :any:`numpy.ndarray`
+            the values
+        """
+        values = np.asarray(values, dtype=np.double).ravel()
+        idx = np.searchsorted(self.edges, values, side="right") - 1
+        # the last edge belongs to the last bin
+        idx[values == self.edges[-1]] = len(self.counts) - 1
+        self.underflow += int(np.count_nonzero(idx < 0))
+        self.overflow += int(np.count_nonzero(idx >= len(self.counts)))
+        inside = idx[(idx >= 0) & (idx < len(self.counts))]
+        self.counts += np.bincount(inside, minlength=len(self.counts))
+
+    @property
+    def count(self):
+        """:class:`int`: number of added values."""
+        return int(self.counts.sum()) + self.underflow + self.overflow
+
+    @property
+    def centers(self):
+        """:any:`numpy.ndarray`: centers of the bins."""
+        return 0.5 * (self.edges[1:] + self.edges[:-1])
+
+    def density(self, total=None):
+        """Return the histogram as probability density.
+
+        Parameters
+        ----------
+        total : :class:`int`, optional
+            the number of values to normalize with, for example the number
+            of walkers. Default: the number of added values
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the density in all bins
+        """
+        total = self.count if total is None else total
+        return self.counts / (max(total, 1) * np.diff(self.edges))
+
+    def merge(self, other):
+        """Add the counts of another histogram with the same bins.
+
+        Parameters
+        ----------
+        other : :class:`Histogram`
+            the other histogram
+        """
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Histogram: bins differ")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+
+
+class QuantileSketch(object):
+    """Streaming quantiles of positive values with relative accuracy.
+
+    The values are counted in logarithmic buckets ``(g^(k-1), g^k]`` with
+    ``g = (1 + a) / (1 - a)``, like in the DDSketch of Masson et al.
+    (2019), so every quantile is returned with a relative error of at most
+    ``a``. The memory only grows with the logarithm of the value range.
+    Values which are not positive are counted in a separate zero bucket.
+
+    Parameters
+    ----------
+    relative_accuracy : :class:`float`, optional
+        the relative accuracy ``a`` of the quantiles. Default: 0.01
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+        self.offset = 0
+        self.buckets = np.zeros(0, dtype=np.int64)
+        self.zeros = 0
+
+    def add(self, values):
+        """Add values to the sketch.
+
+        Parameters
+        ----------
+        values : :any:`numpy.ndarray`
+            the values
+        """
+        values = np.asarray(values, dtype=np.double).ravel()
+        positive = values[values > 0.0]
+        self.zeros += len(values) - len(positive)
+        if len(positive) == 0:
+            return
+        keys = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+        self._add_counts(keys.min(), np.bincount(keys - keys.min()))
+
+    def _add_counts(self, offset, counts):
+        if len(self.buckets) == 0:
+            self.offset = offset
+            self.buckets = np.zeros(len(counts), dtype=np.int64)
+        start = min(self.offset, offset)
+        end = max(self.offset + len(self.buckets), offset + len(counts))
+        if start < self.offset or end > self.offset + len(self.buckets):
+            buckets = np.zeros(end - start, dtype=np.int64)
+            old = self.offset - start
+            buckets[old : old + len(self.buckets)] = self.buckets
+            self.buckets = buckets
+            self.offset = start
+        new = offset - self.offset
+        self.buckets[new : new + len(counts)] += counts
+
+    @property
+    def count(self):
+        """:class:`int`: number of added values."""
+        return int(self.buckets.sum()) + self.zeros
+
+    def quantile(self, q):
+        """Return quantiles of the added values.
+
+        Parameters
+        ----------
+        q : :class:`float` or :any:`numpy.ndarray`
+            the probabilities in [0, 1]
+
+        Returns
+        -------
+        :class:`float` or :any:`numpy.ndarray`
+            the quantiles, NaN if the sketch is empty
+        """
+        q = np.asarray(q, dtype=np.double)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)[()]
+        rank = np.floor(q * (self.count - 1))
+        cum = self.zeros + np.cumsum(self.buckets)
+        key = np.searchsorted(cum, rank, side="right") + self.offset
+        value = 2.0 * self.gamma ** key / (self.gamma + 1.0)
+        return np.where(rank < self.zeros, 0.0, value)[()]
+
+    def merge(self, other):
+        """Add the counts of another sketch with the same accuracy.
+
+        Parameters
+        ----------
+        other : :class:`QuantileSketch`
+            the other sketch
+        """
+        if other.gamma != self.gamma:
+            raise ValueError("QuantileSketch: accuracies differ")
+        self.zeros += other.zeros
+        if len(other.buckets) > 0:
+            self._add_counts(other.offset, other.buckets)
+
+
+class Breakthrough(Observer):
+    """Breakthrough curve and travel times at a control plane.
+
+    Walkers crossing the plane in direction of its normal are detected
+    after every time step and their crossing time is linearly interpolated
+    within the step. The times are accumulated in a streaming
+    :class:`Histogram` and a :class:`QuantileSketch`, so only memory for
+    the bins is needed, independent of the number of walkers and steps.
+    The walkers are not removed, see :class:`walks.boundary.Plane` for
+    that.
+
+    Parameters
+    ----------
+    point : :any:`numpy.ndarray`
+        a point on the control plane
+    normal : :any:`numpy.ndarray`
+        the normal vector of the plane, the direction of counted crossings
+    bins : :any:`numpy.ndarray`
+        the edges of the histogram bins
+    travel_time : :class:`bool`, optional
+        record the time since the start of the walkers, instead of the
+        absolute arrival time. Default: True
+    first_passage : :class:`bool`, optional
+        count only the first crossing of every walker, otherwise every
+        crossing in direction of the normal is counted. Default: True
+    relative_accuracy : :class:`float`, optional
+        relative accuracy of the quantiles. Default: 0.01
+    name : :class:`str`, optional
+        name of the observer, used for its walker pool array.
+        Default: ``"breakthrough"``
+    """
+
+    track_start = True
+
+    def __init__(
+        self,
+        point,
+        normal,
+        bins,
+        travel_time=True,
+        first_passage=True,
+        relative_accuracy=0.01,
+        name="breakthrough",
+    ):
+        self.plane = Plane(point, normal)
+        self.bins = np.asarray(bins, dtype=np.double)
+        self.travel_time = travel_time
+        self.first_passage = first_passage
+        self.relative_accuracy = relative_accuracy
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        """Reset the histogram and the quantile sketch."""
+        self.histogram = Histogram(self.bins)
+        self.sketch = QuantileSketch(self.relative_accuracy)
+
+    @property
+    def _flag(self):
+        return self.name + "_passed"
+
+    def start(self, sim):
+        """Reset the statistics and the passage flags of the walkers."""
+        self.reset()
+        if self.first_passage:
+            if self._flag not in sim.pool:
+                sim.pool.add_array(self._flag, dtype=bool, fill=False)
+            sim.pool[self._flag][...] = False
+
+    def step(self, sim, t):
+        """Detect the crossings of the last time step."""
+        s_old = self.plane.distance(sim.pool["pos_start"])
+        s_new = self.plane.distance(sim.pos)
+        cross = (s_old < 0.0) & (s_new >= 0.0)
+        if self.first_passage:
+            passed = sim.pool[self._flag]
+            cross &= ~passed
+            passed |= cross
+        idx = np.flatnonzero(cross)
+        if len(idx) == 0:
+            return
+        frac = s_old[idx] / (s_old[idx] - s_new[idx])
+        times = t + frac * sim.dt
+        if self.travel_time:
+            times -= sim.pool["start"][idx]
+        self.histogram.add(times)
+        self.sketch.add(times)
+
+    @property
+    def count(self):
+        """:class:`int`: number of counted crossings."""
+        return self.sketch.count
+
+    def quantile(self, q):
+        """Return quantiles of the crossing times.
+
+        Parameters
+        ----------
+        q : :class:`float` or :any:`numpy.ndarray`
+            the probabilities in [0, 1]
+
+        Returns
+        -------
+        :class:`float` or :any:`numpy.ndarray`
+            the quantiles of the crossing times
+        """
+        return self.sketch.quantile(q)
+
+    def curve(self, total=None):
+        """Return the breakthrough curve.
+
+        Parameters
+        ----------
+        total : :class:`int`, optional
+            the number of walkers to normalize with.
+            Default: the number of counted crossings
+
+        Returns
+        -------
+        centers : :any:`numpy.ndarray`
+            the centers of the time bins
+        density : :any:`numpy.ndarray`
+            the density of the crossing times
+        """
+        return self.histogram.centers, self.histogram.density(total)
+
+
+class Moments(Observer):
+    """Spatial moments and dispersion coefficients of the plume.
+
+    At every output time step, the mean, the covariance and the skewness
+    and kurtosis in every dimension of all walkers are calculated by the
+    compiled parallel :any:`walks.moments.moments` kernel, so no
+    trajectories have to be stored.
+
+    The apparent dispersion coefficient is half the time derivative of the
+    covariance of the whole plume. The effective dispersion coefficient is
+    half the time derivative of the mean covariance of the plumes
+    originating from the single initial positions, which excludes the
+    spreading of their centers of mass. The derivatives are calculated by
+    finite differences between the output times.
+
+    Parameters
+    ----------
+    by_origin : :class:`bool`, optional
+        additionally calculate the covariances of the walkers grouped by
+        their initial position, needed for the effective dispersion. Walkers
+        injected by sources are excluded from the groups. Default: False
+    name : :class:`str`, optional
+        name of the observer, used for its walker pool array.
+        Default: ``"moments"``
+    """
+
+    def __init__(self, by_origin=False, name="moments"):
+        self.by_origin = by_origin
+        self.name = name
+        self.ngroups = 0
+        self.reset()
+
+    def reset(self):
+        """Remove all recorded moments."""
+        self._time = []
+        self._count = []
+        self._mean = []
+        self._central = []
+        self._covariance = []
+        self._origin_covariance = []
+
+    @property
+    def _group(self):
+        return self.name + "_origin"
+
+    def start(self, sim):
+        """Reset the moments and group the walkers by their position."""
+        self.reset()
+        if self.by_origin:
+            if self._group not in sim.pool:
+                sim.pool.add_array(self._group, dtype=np.int64, fill=-1)
+            if sim.N > 0:
+                _, groups = np.unique(sim.pos, axis=1, return_inverse=True)
+                sim.pool[self._group][...] = groups.ravel()
+                self.ngroups = int(groups.max()) + 1
+            else:
+                self.ngroups = 0
+
+    def save(self, sim, t):
+        """Calculate the moments of the current walkers."""
+        count, mean, central, comoment = moments(
+            sim.pos, num_threads=sim.nthreads
+        )
+        n = max(count[0], 1)
+        self._time.append(t)
+        self._count.append(count[0])
+        self._mean.append(mean[0])
+        self._central.append(central[0] / n)
+        self._covariance.append(comoment[0] / n)
+        if self.by_origin:
+            cov = np.zeros((sim.dim, sim.dim))
+            if self.ngroups > 0 and sim.N > 0:
+                count, _, _, comoment = moments(
+                    sim.pos,
+                    sim.pool[self._group],
+                    self.ngroups,
+                    num_threads=sim.nthreads,
+                )
+                full = count > 0
+                if np.any(full):
+                    cov = np.mean(
+                        comoment[full] / count[full, None, None], axis=0
+                    )
+            self._origin_covariance.append(cov)
+
+    @property
+    def time(self):
+        """:any:`numpy.ndarray`: the output times."""
+        return np.array(self._time)
+
+    @property
+    def count(self):
+        """:any:`numpy.ndarray`: the number of walkers."""
+        return np.array(self._count, dtype=np.int64)
+
+    @property
+    def mean(self):
+        """:any:`numpy.ndarray`: the mean position with shape (T, dim)."""
+        return np.array(self._mean)
+
+    @property
+    def covariance(self):
+        """:any:`numpy.ndarray`: the covariance with shape (T, dim, dim)."""
+        return np.array(self._covariance)
+
+    @property
+    def variance(self):
+        """:any:`numpy.ndarray`: the variance with shape (T, dim)."""
+        return np.array([c[0] for c in self._central])
+
+    @property
+    def skewness(self):
+        """:any:`numpy.ndarray`: the skewness with shape (T, dim)."""
+        central = np.array(self._central)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return central[:, 1] / central[:, 0] ** 1.5
+
+    @property
+    def kurtosis(self):
+        """:any:`numpy.ndarray`: the kurtosis with shape (T, dim)."""
+        central = np.array(self._central)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return central[:, 2] / central[:, 0] ** 2
+
+    @property
+    def apparent_dispersion(self):
+        """:any:`numpy.ndarray`: apparent dispersion, shape (T, dim, dim)."""
+        return 0.5 * np.gradient(self.covariance, self.time, axis=0)
+
+    @property
+    def effective_dispersion(self):
+        """:any:`numpy.ndarray`: effective dispersion, shape (T, dim, dim)."""
+        if not self.by_origin:
+            raise ValueError("Moments: effective dispersion needs by_origin")
+        cov = np.array(self._origin_covariance)
+        return 0.5 * np.gradient(cov, self.time, axis=0)
+
+
+class Concentration(Observer):
+    """Concentration of the walkers on a regular grid.
+
+    At every output time step, the walkers are counted in the cells of the
+    grid by the compiled parallel :any:`walks.binning.bin_walkers` kernel
+    and the concentration is written to the output of the simulation with
+    :any:`walks.output.Output.write_field`, where it can be loaded with
+    ``load_field(name)``. The grid is written to the metadata as
+    ``name + "_lower"``, ``name + "_upper"`` and ``name + "_shape"``.
+
+    Parameters
+    ----------
+    lower : :any:`numpy.ndarray`
+        the lower corner of the grid
+    upper : :any:`numpy.ndarray`
+        the upper corner of the grid
+    shape : :class:`tuple`
+        the number of cells in every dimension
+    mass : :class:`float`, optional
+        the mass of every walker, the concentration is the mass per cell
+        volume. Default: 1.0
+    name : :class:`str`, optional
+        name of the field in the output. Default: ``"concentration"``
+    """
+
+    def __init__(self, lower, upper, shape, mass=1.0, name="concentration"):
+        self.lower = np.array(lower, dtype=np.double, ndmin=1)
+        self.upper = np.array(upper, dtype=np.double, ndmin=1)
+        self.shape = tuple(np.array(shape, dtype=int, ndmin=1))
+        if not len(self.lower) == len(self.upper) == len(self.shape):
+            raise ValueError("Concentration: grid dimensions differ")
+        if np.any(self.upper <= self.lower) or min(self.shape) < 1:
+            raise ValueError("Concentration: empty grid")
+        self.spacing = (self.upper - self.lower) / self.shape
+        self.mass = mass
+        self.name = name
+
+    @property
+    def edges(self):
+        """:class:`list`: the cell edges in every dimension."""
+        return [
+            np.linspace(l, u, n + 1)
+            for l, u, n in zip(self.lower, self.upper, self.shape)
+        ]
+
+    def start(self, sim):
+        """Write the grid to the metadata of the output."""
+        if len(self.shape) != sim.dim:
+            raise ValueError("Concentration: grid has the wrong dimension")
+        sim.output.write_metadata(
+            **{
+                self.name + "_lower": self.lower,
+                self.name + "_upper": self.upper,
+                self.name + "_shape": np.array(self.shape),
+            }
+        )
+
+    def __call__(self, pos, nthreads=1):
+        """Return the concentration of walkers on the grid.
+
+        Parameters
+        ----------
+        pos : :any:`numpy.ndarray`
+            the positions of the walkers with shape (dim, N)
+        nthreads : :class:`int`, optional
+            number of OpenMP threads. Default: 1
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the concentration with the shape of the grid
+        """
+        counts = np.zeros(int(np.prod(self.shape)))
+        bin_walkers(
+            pos, self.lower, self.spacing, self.shape, counts, nthreads
+        )
+        counts *= self.mass / np.prod(self.spacing)
+        return counts.reshape(self.shape)
+
+    def save(self, sim, t):
+        """Write the concentration of the current walkers."""
+        sim.output.write_field(self.name, t, self(sim.pos, sim.nthreads))
@@ -9,15 +9,312 @@ The following classes are provided
 .. autosummary::
    Memory
    Pickle
+   Binary
+   NetCDF
+   HDF5
    Output
+   AsyncOutput
+   Trajectory
 """
 # pylint: disable=C0103
 from __future__ import division, absolute_import, print_function
 
 import pickle
+import threading
 import numpy as np
 
-__all__ = ["Memory", "Pickle"]
+try:
+    import queue
+except ImportError:  # pragma: no cover
+    import Queue as queue
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+__all__ = [
+    "Memory",
+    "Pickle",
+    "Binary",
+    "NetCDF",
+    "HDF5",
+    "AsyncOutput",
+    "Trajectory",
+]
+
+
+def _select(selection, n):
+    """Restrict a time step selection to the first n entries."""
+    if selection is None:
+        return slice(0, n)
+    if isinstance(selection, slice):
+        return slice(*selection.indices(n))
+    selection = np.atleast_1d(selection)
+    return selection[selection < n]
+
+
+def _read_frames(var, id_var, steps, N, walkers):
+    """Read the selected walkers of time steps from a (time, dim, walker)
+    variable of a NetCDF or HDF5 file and their ids."""
+    walkers = _sorted_walkers(walkers)
+    frames = []
+    ids = []
+    for i, n in zip(steps, N):
+        step_ids = _step_ids(id_var, i, n, walkers)
+        cols = _columns(walkers, step_ids)
+        ids.append(step_ids[cols])
+        frames.append(var[i, :, _as_slice(cols)])
+    return frames, ids
+
+
+def _step_ids(id_var, i, n, walkers):
+    """Read the ids of time step i with n walkers, which can be selected."""
+    n = _id_bound(walkers, n)
+    # files written without ids number the walkers by their columns
+    if id_var is None:
+        return np.arange(n)
+    return np.asarray(id_var[i, :n], dtype=np.int64)
+
+
+def _id_bound(walkers, n):
+    """Number of leading columns of a time step, which can hold the
+    selected walkers.
+
+    Walkers are only removed or appended with new ids, so the column of a
+    walker never exceeds its id.
+    """
+    if walkers is None:
+        return n
+    if isinstance(walkers, slice):
+        stop = walkers.stop
+        return n if stop is None or stop < 0 else min(stop, n)
+    return min(n, int(np.max(walkers)) + 1) if len(walkers) else 0
+
+
+def _columns(walkers, ids):
+    """Columns of the selected walker ids among the ids of a time step."""
+    if walkers is None:
+        return np.arange(len(ids))
+    if isinstance(walkers, slice):
+        size = int(np.max(ids)) + 1 if len(ids) else 0
+        start, stop, step = walkers.indices(size)
+        mask = (ids >= start) & (ids < stop) & ((ids - start) % step == 0)
+    else:
+        mask = np.isin(ids, walkers)
+    return np.nonzero(mask)[0]
+
+
+def _as_slice(cols):
+    """Convert contiguous columns to a slice, which is read as a view."""
+    if len(cols) == 0 or cols[-1] - cols[0] + 1 == len(cols):
+        start = int(cols[0]) if len(cols) else 0
+        return slice(start, start + len(cols))
+    return cols
+
+
+def _time_steps(times, t_range):
+    """Indices of the time steps within the closed time range."""
+    steps = np.arange(len(times))
+    if t_range is None:
+        return steps
+    t_start, t_end = t_range
+    mask = np.ones(len(times), dtype=bool)
+    if t_start is not None:
+        mask &= times >= t_start
+    if t_end is not None:
+        mask &= times <= t_end
+    return steps[mask]
+
+
+def _sorted_walkers(walkers):
+    if walkers is None or isinstance(walkers, slice):
+        return walkers
+    return np.unique(walkers)
+
+
+def _iter_trajectory(traj, t_range, walkers):
+    """Iterate over the views of the time steps of a trajectory."""
+    walkers = _sorted_walkers(walkers)
+    for i in _time_steps(traj.time, t_range):
+        cols = _columns(walkers, traj.walker_ids(i))
+        yield traj.time[i], traj[i][:, _as_slice(cols)]
+
+
+def _iter_dense(var, id_var, times, N, t_range, walkers, chunksize):
+    """Iterate over a (time, dim, walker) variable of a NetCDF or HDF5
+    file, reading chunksize time steps at once."""
+    walkers = _sorted_walkers(walkers)
+    steps = _time_steps(times, t_range)
+    for c in range(0, len(steps), chunksize):
+        chunk = steps[c : c + chunksize]
+        start, end = chunk[0], chunk[-1] + 1
+        if walkers is None:
+            cols = [np.arange(N[i]) for i in chunk]
+        else:
+            cols = [
+                _columns(walkers, _step_ids(id_var, i, N[i], walkers))
+                for i in chunk
+            ]
+        # read the columns of all time steps of the chunk at once
+        union = np.unique(np.concatenate(cols)).astype(np.intp)
+        block = var[start:end, :, _as_slice(union)]
+        for i, col in zip(chunk, cols):
+            col = _as_slice(np.searchsorted(union, col))
+            yield times[i], block[i - start, :, col]
+
+
+def _attribute(value):
+    """Convert a value to a type storable as NetCDF or HDF5 attribute."""
+    if value is None:
+        return "None"
+    if callable(value):
+        return getattr(value, "__name__", repr(value))
+    if isinstance(value, int) and not -(2 ** 63) <= value < 2 ** 63:
+        return str(value)
+    return value
+
+
+def _walker_ids(ids, n):
+    """Ids of n walkers, numbered from 0 by default."""
+    if ids is None:
+        return np.arange(n, dtype=np.int64)
+    return np.asarray(ids, dtype=np.int64)
+
+
+class Trajectory(object):
+    """Ragged walker positions of all saved time steps.
+
+    The positions are stored like a compressed sparse row matrix: the
+    positions of all time steps are stored in one contiguous buffer and
+    time step ``i`` occupies the walkers ``offsets[i]:offsets[i+1]``,
+    stored as a C-contiguous (dim, N) block. Indexing returns views of the
+    buffer without copying. The ids of the walkers are stored in a second
+    flat buffer, so walkers can be followed after others were removed.
+
+    Parameters
+    ----------
+        time : :any:`numpy.ndarray`
+            simulation time of the saved time steps
+        offsets : :any:`numpy.ndarray`
+            walker offsets of the time steps with length ``len(time) + 1``
+        data : :any:`numpy.ndarray`
+            flat buffer holding at least ``dim * offsets[-1]`` positions
+        dim : :class:`int`
+            spatial dimension
+        ids : :any:`numpy.ndarray`, optional
+            flat buffer holding at least ``offsets[-1]`` increasing walker
+            ids per time step. Default: the walkers of every time step are
+            numbered from 0
+    """
+
+    def __init__(self, time, offsets, data, dim, ids=None):
+        self.time = np.asarray(time)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.data = data
+        self.dim = dim
+        self.ids = ids
+
+    @classmethod
+    def from_frames(cls, time, frames, ids=None):
+        """Create a trajectory by copying a sequence of position arrays.
+
+        Parameters
+        ----------
+            time : :any:`numpy.ndarray`
+                simulation time of the saved time steps
+            frames : :class:`list`
+                positions of the time steps, each with shape (dim, N)
+            ids : :class:`list`, optional
+                walker ids of the time steps, each with shape (N,).
+                Default: the walkers of every time step are numbered from 0
+
+        Returns
+        -------
+        :class:`Trajectory`
+            the trajectory
+        """
+        frames = [np.asarray(f) for f in frames]
+        dim = frames[0].shape[0] if frames else 0
+        N = [f.shape[1] for f in frames]
+        offsets = np.concatenate(([0], np.cumsum(N, dtype=np.int64)))
+        dtype = np.result_type(*frames) if frames else np.double
+        data = np.empty(dim * offsets[-1], dtype=dtype)
+        if ids is not None:
+            ids = np.concatenate([np.empty(0, np.int64)] + list(ids))
+            ids = ids.astype(np.int64)
+        traj = cls(time, offsets, data, dim, ids)
+        for i, frame in enumerate(frames):
+            traj[i][...] = frame
+        return traj
+
+    @property
+    def N(self):
+        """:any:`numpy.ndarray`: number of walkers of each time step."""
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.time)
+
+    def _walkers(self, i):
+        """First and last walker offset of time step ``i``."""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Trajectory: time step out of range")
+        return self.offsets[i], self.offsets[i + 1]
+
+    def __getitem__(self, i):
+        """Positions of time step ``i`` as a (dim, N) view."""
+        start, end = self._walkers(i)
+        return self.data[self.dim * start : self.dim * end].reshape(
+            self.dim, end - start
+        )
+
+    def walker_ids(self, i):
+        """Ids of the walkers of time step ``i``.
+
+        Parameters
+        ----------
+            i : :class:`int`
+                index of the time step
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the increasing ids of the walkers with shape (N,)
+        """
+        start, end = self._walkers(i)
+        if self.ids is None:
+            return np.arange(end - start)
+        return self.ids[start:end]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def padded(self):
+        """Return all positions as an array padded to the maximal id.
+
+        Returns
+        -------
+        :any:`numpy.ma.MaskedArray`
+            positions with shape (timesteps, dim, id_max + 1), where the
+            last axis is the walker id and the positions of not yet or no
+            longer existing walkers are masked
+        """
+        ids = [self.walker_ids(i) for i in range(len(self))]
+        N_max = max([int(i.max()) + 1 for i in ids if len(i)], default=0)
+        pos = np.empty((len(self), self.dim, N_max), self.data.dtype)
+        pos[:] = np.nan
+        for i, frame in enumerate(self):
+            pos[i][:, ids[i]] = frame
+        return np.ma.masked_invalid(pos)
 
 
 class Output(object):
@@ -38,7 +335,23 @@ class Output(object):
     def __del__(self):
         self._file.close()
 
-    def write_timestep(self, time, pos):
+    def flush(self):
+        """Write all buffered data to file."""
+        self._file.flush()
+
+    def write_metadata(self, **metadata):
+        """Write the parameters of the simulation.
+
+        Backends which can not store metadata ignore it.
+
+        Parameters
+        ----------
+            **metadata
+                the parameters, like ``dt``, ``D``, ``nsave`` or ``seed``
+        """
+        pass
+
+    def write_timestep(self, time, pos, ids=None):
         """Write the positions of the walkers to file.
 
         Parameters
@@ -48,18 +361,86 @@ class Output(object):
             pos : :any:`numpy.ndarray`
                 Positions of the particles, given as a tuple of
                 positions
+            ids : :any:`numpy.ndarray`, optional
+                increasing ids of the walkers. Default: the walkers are
+                numbered from 0
+
+        """
+        pass
+
+    def write_field(self, name, time, values):
+        """Write a gridded field, like a concentration, to file.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+            time : :class:`float`
+                the current simulation time
+            values : :any:`numpy.ndarray`
+                the values of the field, with the same shape at all times
+        """
+        pass
+
+    def load_field(self, name):
+        """Return the saved values of a field.
 
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            Simulation time of the saved fields
+        :any:`numpy.ndarray`
+            the values with the shape (time, ...)
         """
         pass
 
-    def load(self):
+    def iterate(self, t_range=None, walkers=None, chunksize=16):
+        """Iterate lazily over the saved time steps.
+
+        In contrast to :any:`load`, only a bounded number of time steps is
+        held in memory at once, so arbitrarily large files can be streamed.
+
+        Parameters
+        ----------
+            t_range : :class:`tuple`, optional
+                closed range ``(t_start, t_end)`` of the simulation time,
+                either bound can be ``None``. Default: all time steps
+            walkers : :class:`slice` or :any:`numpy.ndarray`, optional
+                ids of the walkers. Default: all walkers
+            chunksize : :class:`int`, optional
+                number of time steps read from the file at once.
+                Default: 16
+
+        Yields
+        ------
+        :class:`float`
+            Simulation time of the time step
+        :any:`numpy.ndarray`
+            Position of walkers with shape (dim, N)
+        """
+        self.flush()
+        time, pos = self.load()
+        return _iter_trajectory(pos, t_range, walkers)
+
+    def load(self, padded=False):
         """Return the saved values.
 
+        Parameters
+        ----------
+            padded : :class:`bool`, optional
+                return the positions as masked array padded to the maximal
+                number of walkers, instead of a :class:`Trajectory`
+
         Returns
         -------
         :any:`numpy.ndarray`
             Simulation time of saved time steps
-        :any:`numpy.ndarray`
+        :class:`Trajectory` or :any:`numpy.ma.MaskedArray`
             Position of walkers
         """
         pass
@@ -68,6 +449,9 @@ class Output(object):
 class Memory(object):
     """Save the walks for the afterworld, well at least temporarily to memory.
 
+    The positions of all time steps are copied into one growing buffer,
+    see :class:`Trajectory`.
+
     Parameters
     ----------
         filename : :class:`str`
@@ -76,11 +460,16 @@ class Memory(object):
 
     def __init__(self, filename):
         self.time = []
-        self.pos = []
         self.N = []
+        self._offsets = [0]
+        self._data = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._dim = None
+        self.metadata = {}
+        self.fields = {}
 
-    def write_timestep(self, time, pos):
-        """Save the positions of the walkers to a Python list.
+    def write_timestep(self, time, pos, ids=None):
+        """Copy the positions of the walkers to the memory buffer.
 
         Parameters
         ----------
@@ -89,40 +478,129 @@ class Memory(object):
             pos : :any:`numpy.ndarray`
                 Positions of the particles, given as a tuple of
                 positions
+            ids : :any:`numpy.ndarray`, optional
+                increasing ids of the walkers. Default: the walkers are
+                numbered from 0
 
         """
+        dim, n = pos.shape
+        if self._data is None:
+            self._data = np.empty(dim * n, dtype=pos.dtype)
+            self._dim = dim
+        start = dim * self._offsets[-1]
+        end = start + dim * n
+        if end > len(self._data):
+            data = np.empty(max(end, 2 * len(self._data)), self._data.dtype)
+            data[:start] = self._data[:start]
+            self._data = data
+        self._data[start:end].reshape(dim, n)[...] = pos
+        start = self._offsets[-1]
+        if start + n > len(self._ids):
+            size = max(start + n, 2 * len(self._ids))
+            self._ids = np.resize(self._ids, size)
+        self._ids[start : start + n] = _walker_ids(ids, n)
         self.time.append(time)
-        self.pos.append(pos.copy())
-        self.N.append(pos.shape[1])
+        self.N.append(n)
+        self._offsets.append(self._offsets[-1] + n)
 
-    def load(self):
-        """Return the saved values.
+    def flush(self):
+        """Nothing to do for the memory output."""
+        pass
+
+    def write_metadata(self, **metadata):
+        """Keep the parameters of the simulation in :any:`metadata`.
+
+        Parameters
+        ----------
+            **metadata
+                the parameters, like ``dt``, ``D``, ``nsave`` or ``seed``
+        """
+        self.metadata.update(metadata)
+
+    def write_field(self, name, time, values):
+        """Copy a gridded field to :any:`fields`.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+            time : :class:`float`
+                the current simulation time
+            values : :any:`numpy.ndarray`
+                the values of the field, with the same shape at all times
+        """
+        times, frames = self.fields.setdefault(name, ([], []))
+        times.append(time)
+        frames.append(np.array(values))
+
+    def load_field(self, name):
+        """Return the saved values of a field.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
 
         Returns
         -------
         :any:`numpy.ndarray`
-            Simulation time of saved time steps
+            Simulation time of the saved fields
         :any:`numpy.ndarray`
-            Position of walkers
+            the values with the shape (time, ...)
         """
-        time = np.array(self.time)
-        timesteps = len(time)
+        times, frames = self.fields[name]
+        return np.array(times), np.array(frames)
 
-        N = np.array(self.N)
-        N_max = N.max()
+    @property
+    def pos(self):
+        """:class:`Trajectory`: views of the saved positions."""
+        return Trajectory(
+            self.time, self._offsets, self._data, self._dim, self._ids
+        )
 
-        dim = self.pos[0].shape[0]
+    def iterate(self, t_range=None, walkers=None, chunksize=16):
+        """Iterate over views of the saved time steps.
 
-        pos = np.empty((timesteps, dim, N_max))
-        pos[:] = np.nan
+        Parameters
+        ----------
+            t_range : :class:`tuple`, optional
+                closed range ``(t_start, t_end)`` of the simulation time,
+                either bound can be ``None``. Default: all time steps
+            walkers : :class:`slice` or :any:`numpy.ndarray`, optional
+                ids of the walkers. Default: all walkers
+            chunksize : :class:`int`, optional
+                number of time steps read from the file at once.
+                Default: 16
 
-        for i in range(len(self.pos)):
-            n = self.pos[i].shape[1]
-            pos[i, :, 0:n] = self.pos[i]
+        Yields
+        ------
+        :class:`float`
+            Simulation time of the time step
+        :any:`numpy.ndarray`
+            Position of walkers with shape (dim, N)
+        """
+        return _iter_trajectory(self.pos, t_range, walkers)
 
-        pos = np.ma.masked_invalid(pos)
+    def load(self, padded=False):
+        """Return the saved values.
 
-        return time, pos
+        Parameters
+        ----------
+            padded : :class:`bool`, optional
+                return the positions as masked array padded to the maximal
+                number of walkers, instead of a :class:`Trajectory`
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            Simulation time of saved time steps
+        :class:`Trajectory` or :any:`numpy.ma.MaskedArray`
+            Position of walkers
+        """
+        pos = self.pos
+        if padded:
+            return pos.time, pos.padded()
+        return pos.time, pos
 
 
 class Pickle(Output):
@@ -137,13 +615,14 @@ class Pickle(Output):
     def __init__(self, filename):
         super().__init__(filename)
 
-    def write_timestep(self, time, pos):
+    def write_timestep(self, time, pos, ids=None):
         """Write the positions of the walkers to a pickle file.
 
         The output is a dictionary with keywords
 
             * time
             * pos
+            * id
 
         Parameters
         ----------
@@ -152,53 +631,1241 @@ class Pickle(Output):
             pos : :any:`numpy.ndarray`
                 Positions of the particles, given as a tuple of
                 positions
+            ids : :any:`numpy.ndarray`, optional
+                increasing ids of the walkers. Default: the walkers are
+                numbered from 0
         """
-        d = {"time": time, "pos": pos, "N": pos.shape[1]}
+        d = {
+            "time": time,
+            "pos": pos,
+            "id": _walker_ids(ids, pos.shape[1]),
+            "N": pos.shape[1],
+        }
         pickle.dump(d, self._file)
 
-    def load(self):
+    def write_field(self, name, time, values):
+        """Write a gridded field to the pickle file.
+
+        The field is stored as a dictionary with keywords
+
+            * field
+            * time
+            * values
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+            time : :class:`float`
+                the current simulation time
+            values : :any:`numpy.ndarray`
+                the values of the field, with the same shape at all times
+        """
+        d = {"field": name, "time": time, "values": values}
+        pickle.dump(d, self._file)
+
+    def _records(self):
+        """Iterate over all pickled dictionaries."""
+        # read with a separate handle, so writing can continue afterwards
+        self.flush()
+        with open(self.filename, "rb") as pickle_file:
+            while True:
+                try:
+                    yield pickle.load(pickle_file)
+                except EOFError:
+                    break
+
+    def load_field(self, name):
+        """Load the saved values of a field from the pickle file.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            Simulation time of the saved fields
+        :any:`numpy.ndarray`
+            the values with the shape (time, ...)
+        """
+        times = []
+        frames = []
+        for d in self._records():
+            if d.get("field") == name:
+                times.append(d["time"])
+                frames.append(d["values"])
+        return np.array(times), np.array(frames)
+
+    def iterate(self, t_range=None, walkers=None, chunksize=16):
+        """Iterate over the time steps, unpickling one at a time.
+
+        Parameters
+        ----------
+            t_range : :class:`tuple`, optional
+                closed range ``(t_start, t_end)`` of the simulation time,
+                either bound can be ``None``. Default: all time steps
+            walkers : :class:`slice` or :any:`numpy.ndarray`, optional
+                ids of the walkers. Default: all walkers
+            chunksize : :class:`int`, optional
+                number of time steps read from the file at once.
+                Default: 16
+
+        Yields
+        ------
+        :class:`float`
+            Simulation time of the time step
+        :any:`numpy.ndarray`
+            Position of walkers with shape (dim, N)
+        """
+        walkers = _sorted_walkers(walkers)
+        for d in self._records():
+            if "field" in d:
+                continue
+            t, pos = d["time"], d["pos"]
+            if t_range is not None:
+                if t_range[0] is not None and t < t_range[0]:
+                    continue
+                if t_range[1] is not None and t > t_range[1]:
+                    continue
+            ids = d.get("id", np.arange(pos.shape[1]))
+            yield t, pos[:, _as_slice(_columns(walkers, ids))]
+
+    def load(self, padded=False):
         """Load the pickle file.
 
+        Parameters
+        ----------
+            padded : :class:`bool`, optional
+                return the positions as masked array padded to the maximal
+                number of walkers, instead of a :class:`Trajectory`
+
         Returns
         -------
         :any:`numpy.ndarray`
             Simulation time of saved time steps
-        :any:`numpy.ndarray`
+        :class:`Trajectory` or :any:`numpy.ma.MaskedArray`
             Position of walkers
         """
-        self._file.close()
-        self._file = open(self.filename, "rb")
         time = []
         pos = []
-        N = []
-        while True:
-            try:
-                d = pickle.load(self._file)
+        ids = []
+        for d in self._records():
+            if "field" not in d:
                 time.append(d["time"])
                 pos.append(d["pos"])
-                N.append(d["N"])
-            except EOFError:
-                break
-        time = np.array(time)
-        timesteps = len(time)
+                ids.append(d.get("id", np.arange(d["N"])))
+        pos = Trajectory.from_frames(time, pos, ids)
+        if padded:
+            return pos.time, pos.padded()
+        return pos.time, pos
 
-        N = np.array(N)
-        N_max = N.max()
 
-        dim = pos[0].shape[0]
+class Binary(Output):
+    """Save the walks for the afterworld, to an append-only binary file.
 
-        pos = np.empty((timesteps, dim, N_max))
-        pos[:] = np.nan
+    The positions of every saved time step are appended as a raw
+    C-contiguous (dim, N) block to the file ``filename``. A compact index
+    with the time, the walker offset and the number of walkers of every
+    time step is appended to ``filename + ".idx"`` and the ``int64`` ids
+    of the walkers to ``filename + ".ids"``. Loading maps the data files
+    into memory, so even huge trajectories are opened instantly and only
+    the accessed time steps are read from disk.
+
+    Parameters
+    ----------
+        filename : :class:`str`
+            the name of the output file
+        mode : :class:`str`, optional
+            ``"w"`` to create a new file, ``"r"`` to open an existing file
+            for loading only. Default: ``"w"``
+    """
+
+    MAGIC = b"WALKSBIN"
+    VERSION = 1
+    HEADER = np.dtype(
+        [("magic", "S8"), ("version", "<u4"), ("dim", "<u4"), ("dtype", "S8")]
+    )
+    RECORD = np.dtype([("time", "<f8"), ("offset", "<i8"), ("N", "<i8")])
+    FIELD_HEADER = np.dtype(
+        [
+            ("magic", "S8"),
+            ("version", "<u4"),
+            ("ndim", "<u4"),
+            ("shape", "<i8", (8,)),
+            ("dtype", "S8"),
+        ]
+    )
+
+    def __init__(self, filename, mode="w"):
+        if mode not in ("w", "r"):
+            raise ValueError("Binary: mode has to be 'w' or 'r'")
+        self.filename = filename
+        self.index_filename = filename + ".idx"
+        self.ids_filename = filename + ".ids"
+        self.mode = mode
+        self.dim = None
+        self.dtype = None
+        self._offset = 0
+        self._fields = {}
+        if mode == "w":
+            self._file = open(self.filename, "wb")
+            self._index = open(self.index_filename, "wb")
+            self._ids = open(self.ids_filename, "wb")
+        else:
+            self._file = open(self.filename, "rb")
+            self._index = open(self.index_filename, "rb")
+            self._ids = None
+
+    def __del__(self):
+        self._file.close()
+        self._index.close()
+        if self._ids is not None:
+            self._ids.close()
+        for data, index, _ in self._fields.values():
+            data.close()
+            index.close()
+
+    def flush(self):
+        """Write all buffered data to file."""
+        self._file.flush()
+        self._index.flush()
+        if self._ids is not None:
+            self._ids.flush()
+        for data, index, _ in self._fields.values():
+            data.flush()
+            index.flush()
+
+    def field_filename(self, name):
+        """Return the name of the file of a field.
+
+        The values are appended to this file and the times and the shape
+        to ``field_filename(name) + ".idx"``.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+
+        Returns
+        -------
+        :class:`str`
+            the name of the file
+        """
+        return "{}.{}".format(self.filename, name)
+
+    def write_field(self, name, time, values):
+        """Append a gridded field to its binary file.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+            time : :class:`float`
+                the current simulation time
+            values : :any:`numpy.ndarray`
+                the values of the field, with the same shape at all times
+        """
+        if self.mode != "w":
+            raise ValueError("Binary: file was opened for reading")
+        values = np.asarray(values)
+        if name not in self._fields:
+            if values.ndim > self.FIELD_HEADER["shape"].shape[0]:
+                raise ValueError("Binary: field has too many dimensions")
+            filename = self.field_filename(name)
+            dtype = values.dtype.newbyteorder("<")
+            self._fields[name] = (
+                open(filename, "wb"),
+                open(filename + ".idx", "wb"),
+                dtype,
+            )
+            header = np.zeros(1, self.FIELD_HEADER)
+            header["magic"] = self.MAGIC
+            header["version"] = self.VERSION
+            header["ndim"] = values.ndim
+            header["shape"][0, : values.ndim] = values.shape
+            header["dtype"] = dtype.str.encode("ascii")
+            self._fields[name][1].write(header.tobytes())
+        data, index, dtype = self._fields[name]
+        data.write(np.ascontiguousarray(values, dtype).tobytes())
+        index.write(np.array(time, "<f8").tobytes())
 
-        for i in range(len(self.pos)):
-            n = self.pos[i].shape[1]
-            pos[i, :, 0:n] = self.pos[i]
+    def load_field(self, name):
+        """Map the binary file of a field into memory.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            Simulation time of the saved fields
+        :any:`numpy.ndarray`
+            the values with the shape (time, ...), as :any:`numpy.memmap`
+        """
+        self.flush()
+        filename = self.field_filename(name)
+        header = np.fromfile(filename + ".idx", self.FIELD_HEADER, count=1)
+        if len(header) == 0 or header["magic"][0] != self.MAGIC:
+            raise ValueError("Binary: not a walks field index file")
+        shape = tuple(header["shape"][0, : header["ndim"][0]])
+        dtype = np.dtype(header["dtype"][0].decode("ascii"))
+        time = np.fromfile(
+            filename + ".idx", "<f8", offset=self.FIELD_HEADER.itemsize
+        )
+        if len(time) == 0 or np.prod(shape) == 0:
+            return time, np.empty((len(time),) + shape, dtype)
+        values = np.memmap(
+            filename, dtype, mode="r", shape=(len(time),) + shape
+        )
+        return time, values
 
-        pos = np.ma.masked_invalid(pos)
+    def write_timestep(self, time, pos, ids=None):
+        """Append the positions of the walkers to the binary file.
 
-        return time, pos
+        Parameters
+        ----------
+            time : :class:`float`
+                the current simulation time
+            pos : :any:`numpy.ndarray`
+                Positions of the particles, given as a tuple of
+                positions
+            ids : :any:`numpy.ndarray`, optional
+                increasing ids of the walkers. Default: the walkers are
+                numbered from 0
+        """
+        if self.mode != "w":
+            raise ValueError("Binary: file was opened for reading")
+        dim, n = pos.shape
+        if self.dim is None:
+            self.dim = dim
+            self.dtype = np.dtype(pos.dtype).newbyteorder("<")
+            header = np.zeros(1, self.HEADER)
+            header["magic"] = self.MAGIC
+            header["version"] = self.VERSION
+            header["dim"] = dim
+            header["dtype"] = self.dtype.str.encode("ascii")
+            self._index.write(header.tobytes())
+        self._file.write(np.ascontiguousarray(pos, self.dtype).tobytes())
+        self._ids.write(_walker_ids(ids, n).astype("<i8").tobytes())
+        record = np.zeros(1, self.RECORD)
+        record["time"] = time
+        record["offset"] = self._offset
+        record["N"] = n
+        self._index.write(record.tobytes())
+        self._offset += n
+
+    def load(self, padded=False):
+        """Map the binary file into memory.
+
+        Parameters
+        ----------
+            padded : :class:`bool`, optional
+                return the positions as masked array padded to the maximal
+                number of walkers, instead of a :class:`Trajectory`
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            Simulation time of saved time steps
+        :class:`Trajectory` or :any:`numpy.ma.MaskedArray`
+            Position of walkers, as views of a :any:`numpy.memmap`
+        """
+        self.flush()
+        header = np.fromfile(self.index_filename, self.HEADER, count=1)
+        if len(header) == 0:
+            return np.empty(0), Trajectory([], [0], np.empty(0), 0)
+        if header["magic"][0] != self.MAGIC:
+            raise ValueError("Binary: not a walks index file")
+        dim = int(header["dim"][0])
+        dtype = np.dtype(header["dtype"][0].decode("ascii"))
+        index = np.fromfile(
+            self.index_filename, self.RECORD, offset=self.HEADER.itemsize
+        )
+        offsets = np.concatenate(([0], index["offset"] + index["N"]))
+        if offsets[-1] > 0:
+            data = np.memmap(
+                self.filename, dtype, mode="r", shape=(dim * offsets[-1],)
+            )
+            ids = np.memmap(
+                self.ids_filename, "<i8", mode="r", shape=(offsets[-1],)
+            )
+        else:
+            data = np.empty(0, dtype)
+            ids = np.empty(0, np.int64)
+        pos = Trajectory(index["time"], offsets, data, dim, ids)
+        if padded:
+            return pos.time, pos.padded()
+        return pos.time, pos
 
 
 class NetCDF(Output):
-    def __init__(self, filename):
-        super().__init__(filename)
+    """Save the walks for the afterworld, to a NetCDF4 file.
+
+    The positions are stored in the variable ``pos`` with the dimensions
+    ``(time, dim, walker)``, where ``time`` and ``walker`` are unlimited,
+    so every saved time step is written incrementally. Positions of not
+    yet existing walkers are filled with NaN. The variable ``id`` with the
+    dimensions ``(time, walker)`` holds the ids of the walkers, filled with
+    -1, and the variables ``time`` and ``N`` hold the simulation time and
+    the number of walkers.
+
+    Parameters
+    ----------
+        filename : :class:`str`
+            the name of the output file
+        mode : :class:`str`, optional
+            ``"w"`` to create a new file, ``"r"`` to open an existing file
+            for loading only. Default: ``"w"``
+        chunk_time : :class:`int`, optional
+            number of time steps per chunk. Default: 1
+        chunk_walkers : :class:`int`, optional
+            number of walkers per chunk. Default: 65536
+        zlib : :class:`bool`, optional
+            compress the positions with zlib. Default: ``False``
+        complevel : :class:`int`, optional
+            zlib compression level between 1 and 9. Default: 4
+        shuffle : :class:`bool`, optional
+            apply the shuffle filter before compression. Default: ``True``
+    """
+
+    def __init__(
+        self,
+        filename,
+        mode="w",
+        chunk_time=1,
+        chunk_walkers=65536,
+        zlib=False,
+        complevel=4,
+        shuffle=True,
+    ):
+        if netCDF4 is None:
+            raise ImportError("NetCDF: the netCDF4 package is not installed")
+        if mode not in ("w", "r"):
+            raise ValueError("NetCDF: mode has to be 'w' or 'r'")
+        self.filename = filename
+        self.mode = mode
+        self.chunk_time = chunk_time
+        self.chunk_walkers = chunk_walkers
+        self.zlib = zlib
+        self.complevel = complevel
+        self.shuffle = shuffle
+        self._file = netCDF4.Dataset(filename, mode, format="NETCDF4")
+        if mode == "w":
+            self._file.createDimension("time", None)
+            self._file.createDimension("walker", None)
+            self._file.createVariable("time", "f8", ("time",))
+            self._file.createVariable("N", "i8", ("time",))
+
+    def flush(self):
+        """Write all buffered data to file."""
+        if self._file.isopen() and self.mode == "w":
+            self._file.sync()
+
+    def write_metadata(self, **metadata):
+        """Write the parameters of the simulation as global attributes.
+
+        Parameters
+        ----------
+            **metadata
+                the parameters, like ``dt``, ``D``, ``nsave`` or ``seed``
+        """
+        for key, value in metadata.items():
+            self._file.setncattr(key, _attribute(value))
+
+    def _create_pos(self, dim, dtype):
+        self._file.createDimension("dim", dim)
+        self._file.createVariable(
+            "pos",
+            dtype,
+            ("time", "dim", "walker"),
+            zlib=self.zlib,
+            complevel=self.complevel,
+            shuffle=self.shuffle,
+            chunksizes=(self.chunk_time, dim, self.chunk_walkers),
+            fill_value=np.nan,
+        )
+        self._file.createVariable(
+            "id",
+            "i8",
+            ("time", "walker"),
+            zlib=self.zlib,
+            complevel=self.complevel,
+            shuffle=self.shuffle,
+            chunksizes=(self.chunk_time, self.chunk_walkers),
+            fill_value=-1,
+        )
+
+    def write_timestep(self, time, pos, ids=None):
+        """Write the positions of the walkers to the NetCDF file.
+
+        Parameters
+        ----------
+            time : :class:`float`
+                the current simulation time
+            pos : :any:`numpy.ndarray`
+                Positions of the particles, given as a tuple of
+                positions
+            ids : :any:`numpy.ndarray`, optional
+                increasing ids of the walkers. Default: the walkers are
+                numbered from 0
+        """
+        if self.mode != "w":
+            raise ValueError("NetCDF: file was opened for reading")
+        dim, n = pos.shape
+        if "pos" not in self._file.variables:
+            self._create_pos(dim, pos.dtype)
+        i = len(self._file.dimensions["time"])
+        self._file["time"][i] = time
+        self._file["N"][i] = n
+        if n > 0:
+            self._file["pos"][i, :, :n] = pos
+            self._file["id"][i, :n] = _walker_ids(ids, n)
+
+    def write_field(self, name, time, values):
+        """Write a gridded field to its group in the NetCDF file.
+
+        The group ``name`` holds the variables ``time`` and ``values`` with
+        the dimensions ``(time, n0, n1, ...)``, where ``time`` is
+        unlimited.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+            time : :class:`float`
+                the current simulation time
+            values : :any:`numpy.ndarray`
+                the values of the field, with the same shape at all times
+        """
+        if self.mode != "w":
+            raise ValueError("NetCDF: file was opened for reading")
+        values = np.asarray(values)
+        if name not in self._file.groups:
+            group = self._file.createGroup(name)
+            group.createDimension("time", None)
+            dims = ["time"]
+            for i, n in enumerate(values.shape):
+                dims.append("n{}".format(i))
+                group.createDimension(dims[-1], n)
+            group.createVariable("time", "f8", ("time",))
+            group.createVariable(
+                "values",
+                values.dtype,
+                dims,
+                zlib=self.zlib,
+                complevel=self.complevel,
+                shuffle=self.shuffle,
+            )
+        group = self._file.groups[name]
+        i = len(group.dimensions["time"])
+        group["time"][i] = time
+        group["values"][i] = values
+
+    def load_field(self, name):
+        """Load the saved values of a field from the NetCDF file.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            Simulation time of the saved fields
+        :any:`numpy.ndarray`
+            the values with the shape (time, ...)
+        """
+        self.flush()
+        group = self._file.groups[name]
+        group["values"].set_auto_mask(False)
+        return group["time"][:], group["values"][:]
+
+    def load(self, padded=False, time=None, walkers=None):
+        """Load the NetCDF file.
+
+        Only the selected time steps and walkers are read from the file.
+
+        Parameters
+        ----------
+            padded : :class:`bool`, optional
+                return the positions as masked array padded to the maximal
+                number of walkers, instead of a :class:`Trajectory`
+            time : :class:`slice` or :any:`numpy.ndarray`, optional
+                indices of the time steps to load. Default: all
+            walkers : :class:`slice` or :any:`numpy.ndarray`, optional
+                ids of the walkers to load. Default: all
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            Simulation time of saved time steps
+        :class:`Trajectory` or :any:`numpy.ma.MaskedArray`
+            Position of walkers
+        """
+        self.flush()
+        steps = np.arange(len(self._file.dimensions["time"]))
+        steps = steps[_select(time, len(steps))]
+        times = self._file["time"][:][steps]
+        N = self._file["N"][:][steps]
+        if "pos" not in self._file.variables:
+            pos = Trajectory(times, np.zeros(len(steps) + 1), np.empty(0), 0)
+        else:
+            var = self._file["pos"]
+            var.set_auto_mask(False)
+            frames, ids = _read_frames(
+                var, self._id_var(), steps, N, walkers
+            )
+            pos = Trajectory.from_frames(times, frames, ids)
+        if padded:
+            return pos.time, pos.padded()
+        return pos.time, pos
+
+    def iterate(self, t_range=None, walkers=None, chunksize=16):
+        """Iterate over the time steps, reading chunks of time steps.
+
+        Parameters
+        ----------
+            t_range : :class:`tuple`, optional
+                closed range ``(t_start, t_end)`` of the simulation time,
+                either bound can be ``None``. Default: all time steps
+            walkers : :class:`slice` or :any:`numpy.ndarray`, optional
+                ids of the walkers. Default: all walkers
+            chunksize : :class:`int`, optional
+                number of time steps read from the file at once.
+                Default: 16
+
+        Yields
+        ------
+        :class:`float`
+            Simulation time of the time step
+        :any:`numpy.ndarray`
+            Position of walkers with shape (dim, N)
+        """
+        self.flush()
+        times = self._file["time"][:]
+        N = self._file["N"][:]
+        if "pos" not in self._file.variables:
+            return iter(())
+        var = self._file["pos"]
+        var.set_auto_mask(False)
+        return _iter_dense(
+            var, self._id_var(), times, N, t_range, walkers, chunksize
+        )
+
+    def _id_var(self):
+        if "id" not in self._file.variables:
+            return None
+        var = self._file["id"]
+        var.set_auto_mask(False)
+        return var
+
+    def __del__(self):
+        if self._file.isopen():
+            self._file.close()
+
+
+class HDF5(Output):
+    """Save the walks for the afterworld, to a HDF5 file.
+
+    The positions are stored in the chunked, compressed and extendable
+    dataset ``pos`` with the shape ``(time, dim, walker)``, positions of
+    not yet existing walkers are NaN. The dataset ``id`` with the shape
+    ``(time, walker)`` holds the ids of the walkers, filled with -1. The
+    datasets ``time`` and ``N`` hold the simulation time and the number of
+    walkers and the simulation parameters are stored as attributes of the
+    file.
+
+    Optionally, the positions are also stored walker-major in the dataset
+    ``pos_walker`` with the shape ``(id, dim, time)``, whose chunks
+    hold ``walker_chunk_time`` time steps of a few walkers. Following
+    single walkers with :any:`load_walkers` then only reads a small part
+    of the file. The time steps are buffered in memory until a full chunk
+    in time can be written or the buffer exceeds ``walker_buffer_size``
+    bytes, then the chunks are written in several parts.
+
+    Parameters
+    ----------
+        filename : :class:`str`
+            the name of the output file
+        mode : :class:`str`, optional
+            ``"w"`` to create a new file, ``"r"`` to open an existing file
+            for loading only. Default: ``"w"``
+        chunk_time : :class:`int`, optional
+            number of time steps per chunk of ``pos``. Default: 1
+        chunk_walkers : :class:`int`, optional
+            number of walkers per chunk of ``pos``. Default: 65536
+        walker_major : :class:`bool`, optional
+            additionally store the positions walker-major.
+            Default: ``False``
+        walker_chunk_time : :class:`int`, optional
+            number of time steps per chunk of ``pos_walker``. Default: 256
+        walker_chunk_walkers : :class:`int`, optional
+            number of walkers per chunk of ``pos_walker``. Default: 64
+        walker_buffer_size : :class:`int`, optional
+            maximal size of the buffered time steps of ``pos_walker`` and
+            of the blocks written from them in bytes. Default: 2**28
+        compression : :class:`str` or :any:`None`, optional
+            the HDF5 compression filter. Default: ``"gzip"``
+        compression_opts : :class:`int`, optional
+            the compression level. Default: 4
+        shuffle : :class:`bool`, optional
+            apply the shuffle filter before compression. Default: ``True``
+    """
+
+    def __init__(
+        self,
+        filename,
+        mode="w",
+        chunk_time=1,
+        chunk_walkers=65536,
+        walker_major=False,
+        walker_chunk_time=256,
+        walker_chunk_walkers=64,
+        walker_buffer_size=2 ** 28,
+        compression="gzip",
+        compression_opts=4,
+        shuffle=True,
+    ):
+        if h5py is None:
+            raise ImportError("HDF5: the h5py package is not installed")
+        if mode not in ("w", "r"):
+            raise ValueError("HDF5: mode has to be 'w' or 'r'")
+        self.filename = filename
+        self.mode = mode
+        self.chunk_time = chunk_time
+        self.chunk_walkers = chunk_walkers
+        self.walker_major = walker_major
+        self.walker_chunk_time = walker_chunk_time
+        self.walker_chunk_walkers = walker_chunk_walkers
+        self.walker_buffer_size = walker_buffer_size
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.shuffle = shuffle
+        self._buffer = []
+        self._buffer_start = 0
+        self._buffer_bytes = 0
+        self._file = h5py.File(filename, mode)
+        if mode == "w":
+            self._file.create_dataset(
+                "time", (0,), "f8", maxshape=(None,), chunks=(4096,)
+            )
+            self._file.create_dataset(
+                "N", (0,), "i8", maxshape=(None,), chunks=(4096,)
+            )
+
+    def _create_dataset(self, name, shape, chunks, dtype):
+        if self.compression is None:
+            compression_opts = None
+        else:
+            compression_opts = self.compression_opts
+        self._file.create_dataset(
+            name,
+            shape,
+            dtype,
+            maxshape=(None, shape[1], None),
+            chunks=chunks,
+            compression=self.compression,
+            compression_opts=compression_opts,
+            shuffle=self.shuffle,
+            fillvalue=np.nan,
+        )
+
+    def _create_ids(self):
+        if self.compression is None:
+            compression_opts = None
+        else:
+            compression_opts = self.compression_opts
+        self._file.create_dataset(
+            "id",
+            (0, 0),
+            "i8",
+            maxshape=(None, None),
+            chunks=(self.chunk_time, self.chunk_walkers),
+            compression=self.compression,
+            compression_opts=compression_opts,
+            shuffle=self.shuffle,
+            fillvalue=-1,
+        )
+
+    def write_metadata(self, **metadata):
+        """Write the parameters of the simulation as file attributes.
+
+        Parameters
+        ----------
+            **metadata
+                the parameters, like ``dt``, ``D``, ``nsave`` or ``seed``
+        """
+        for key, value in metadata.items():
+            self._file.attrs[key] = _attribute(value)
+
+    def write_timestep(self, time, pos, ids=None):
+        """Write the positions of the walkers to the HDF5 file.
+
+        Parameters
+        ----------
+            time : :class:`float`
+                the current simulation time
+            pos : :any:`numpy.ndarray`
+                Positions of the particles, given as a tuple of
+                positions
+            ids : :any:`numpy.ndarray`, optional
+                increasing ids of the walkers. Default: the walkers are
+                numbered from 0
+        """
+        if self.mode != "w":
+            raise ValueError("HDF5: file was opened for reading")
+        dim, n = pos.shape
+        if "pos" not in self._file:
+            chunks = (self.chunk_time, dim, self.chunk_walkers)
+            self._create_dataset("pos", (0, dim, 0), chunks, pos.dtype)
+            self._create_ids()
+            if self.walker_major:
+                chunks = (
+                    self.walker_chunk_walkers,
+                    dim,
+                    self.walker_chunk_time,
+                )
+                self._create_dataset(
+                    "pos_walker", (0, dim, 0), chunks, pos.dtype
+                )
+        i = self._file["time"].shape[0]
+        for name, value in (("time", time), ("N", n)):
+            self._file[name].resize((i + 1,))
+            self._file[name][i] = value
+        dset = self._file["pos"]
+        dset.resize((i + 1, dim, max(n, dset.shape[2])))
+        ids = _walker_ids(ids, n)
+        id_dset = self._file["id"]
+        id_dset.resize((i + 1, max(n, id_dset.shape[1])))
+        if n > 0:
+            dset[i, :, :n] = pos
+            id_dset[i, :n] = ids
+        if self.walker_major:
+            self._buffer.append((np.array(pos), np.array(ids)))
+            self._buffer_bytes += pos.nbytes + ids.nbytes
+            steps = self._buffer_start + len(self._buffer)
+            if (
+                steps % self.walker_chunk_time == 0
+                or self._buffer_bytes >= self.walker_buffer_size
+            ):
+                self._write_walker_major()
+
+    def _write_walker_major(self):
+        if not self._buffer:
+            return
+        dset = self._file["pos_walker"]
+        dim = dset.shape[1]
+        steps = len(self._buffer)
+        start = self._buffer_start
+        # the walker-major positions are indexed by the walker ids
+        ids = np.unique(np.concatenate([i for _, i in self._buffer]))
+        n_max = int(ids[-1]) + 1 if len(ids) else 0
+        dset.resize((max(n_max, dset.shape[0]), dim, start + steps))
+        # only runs of buffered ids are written, split into blocks of rows
+        # within the buffer size, removed walkers are left out
+        rows = self.walker_buffer_size // (dim * steps * dset.dtype.itemsize)
+        chunk = self.walker_chunk_walkers
+        rows = max(chunk, rows - rows % chunk)
+        for run in np.split(ids, np.nonzero(np.diff(ids) > 1)[0] + 1):
+            for r in range(0, len(run), rows):
+                first, last = run[r], run[min(r + rows, len(run)) - 1] + 1
+                block = np.full((last - first, dim, steps), np.nan, dset.dtype)
+                for j, (frame, frame_ids) in enumerate(self._buffer):
+                    lo, hi = np.searchsorted(frame_ids, (first, last))
+                    block[frame_ids[lo:hi] - first, :, j] = frame[:, lo:hi].T
+                dset[first:last, :, start : start + steps] = block
+        self._buffer = []
+        self._buffer_start = start + steps
+        self._buffer_bytes = 0
+
+    def flush(self):
+        """Write all buffered data to file."""
+        if self.mode == "w" and self._file:
+            if self.walker_major:
+                self._write_walker_major()
+            self._file.flush()
+
+    def write_field(self, name, time, values):
+        """Write a gridded field to its group in the HDF5 file.
+
+        The group ``fields/name`` holds the extendable datasets ``time``
+        and ``values`` with the shape ``(time, n0, n1, ...)``, chunked by
+        time step.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+            time : :class:`float`
+                the current simulation time
+            values : :any:`numpy.ndarray`
+                the values of the field, with the same shape at all times
+        """
+        if self.mode != "w":
+            raise ValueError("HDF5: file was opened for reading")
+        values = np.asarray(values)
+        key = "fields/" + name
+        if key not in self._file:
+            group = self._file.create_group(key)
+            group.create_dataset(
+                "time", (0,), "f8", maxshape=(None,), chunks=(4096,)
+            )
+            if self.compression is None:
+                compression_opts = None
+            else:
+                compression_opts = self.compression_opts
+            group.create_dataset(
+                "values",
+                (0,) + values.shape,
+                values.dtype,
+                maxshape=(None,) + values.shape,
+                chunks=(1,) + values.shape if values.size > 0 else None,
+                compression=self.compression,
+                compression_opts=compression_opts,
+                shuffle=self.shuffle,
+            )
+        group = self._file[key]
+        i = group["time"].shape[0]
+        group["time"].resize((i + 1,))
+        group["time"][i] = time
+        group["values"].resize((i + 1,) + values.shape)
+        group["values"][i] = values
+
+    def load_field(self, name):
+        """Load the saved values of a field from the HDF5 file.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            Simulation time of the saved fields
+        :any:`numpy.ndarray`
+            the values with the shape (time, ...)
+        """
+        self.flush()
+        group = self._file["fields/" + name]
+        return group["time"][:], group["values"][:]
+
+    def load(self, padded=False, time=None, walkers=None):
+        """Load the time-major positions from the HDF5 file.
+
+        Only the selected time steps and walkers are read from the file.
+
+        Parameters
+        ----------
+            padded : :class:`bool`, optional
+                return the positions as masked array padded to the maximal
+                number of walkers, instead of a :class:`Trajectory`
+            time : :class:`slice` or :any:`numpy.ndarray`, optional
+                indices of the time steps to load. Default: all
+            walkers : :class:`slice` or :any:`numpy.ndarray`, optional
+                increasing ids of the walkers to load. Default: all
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            Simulation time of saved time steps
+        :class:`Trajectory` or :any:`numpy.ma.MaskedArray`
+            Position of walkers
+        """
+        self.flush()
+        steps = np.arange(self._file["time"].shape[0])
+        steps = steps[_select(time, len(steps))]
+        times = self._file["time"][:][steps]
+        N = self._file["N"][:][steps]
+        if "pos" not in self._file:
+            pos = Trajectory(times, np.zeros(len(steps) + 1), np.empty(0), 0)
+        else:
+            frames, ids = _read_frames(
+                self._file["pos"], self._file.get("id"), steps, N, walkers
+            )
+            pos = Trajectory.from_frames(times, frames, ids)
+        if padded:
+            return pos.time, pos.padded()
+        return pos.time, pos
+
+    def iterate(self, t_range=None, walkers=None, chunksize=16):
+        """Iterate over the time steps, reading chunks of time steps.
+
+        Parameters
+        ----------
+            t_range : :class:`tuple`, optional
+                closed range ``(t_start, t_end)`` of the simulation time,
+                either bound can be ``None``. Default: all time steps
+            walkers : :class:`slice` or :any:`numpy.ndarray`, optional
+                ids of the walkers. Default: all walkers
+            chunksize : :class:`int`, optional
+                number of time steps read from the file at once.
+                Default: 16
+
+        Yields
+        ------
+        :class:`float`
+            Simulation time of the time step
+        :any:`numpy.ndarray`
+            Position of walkers with shape (dim, N)
+        """
+        self.flush()
+        times = self._file["time"][:]
+        N = self._file["N"][:]
+        if "pos" not in self._file:
+            return iter(())
+        var = self._file["pos"]
+        id_var = self._file.get("id")
+        return _iter_dense(var, id_var, times, N, t_range, walkers, chunksize)
+
+    def load_walkers(self, walkers, time=None):
+        """Load the whole paths of single walkers.
+
+        If the file contains the walker-major dataset, only the chunks of
+        the selected walkers are read.
+
+        Parameters
+        ----------
+            walkers : :class:`slice` or :any:`numpy.ndarray`
+                increasing ids of the walkers to load
+            time : :class:`slice`, optional
+                the time steps to load. Default: all
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            Simulation time of saved time steps
+        :any:`numpy.ndarray`
+            Position of walkers with shape (walkers, dim, time), NaN
+            while a walker does not exist
+        """
+        self.flush()
+        if time is None:
+            time = slice(None)
+        times = self._file["time"][time]
+        if isinstance(walkers, slice):
+            sel = walkers
+        else:
+            sel = np.atleast_1d(walkers)
+        if "pos_walker" in self._file:
+            return times, self._file["pos_walker"][sel, :, time]
+        _, traj = self.load(time=time, walkers=sel)
+        pos = np.transpose(traj.padded().filled(np.nan), (2, 1, 0))
+        if isinstance(sel, slice):
+            return times, pos[sel]
+        # walkers, which were never saved, are NaN
+        out = np.full((len(sel),) + pos.shape[1:], np.nan, pos.dtype)
+        known = sel < pos.shape[0]
+        out[known] = pos[sel[known]]
+        return times, out
+
+    def __del__(self):
+        if self._file:
+            self.flush()
+            self._file.close()
+
+
+class AsyncOutput(object):
+    """Write the walks for the afterworld in a background thread.
+
+    The positions passed to :any:`write_timestep` are copied into one of
+    ``buffers`` reusable snapshot buffers and a writer thread drains them
+    to the wrapped output, so the simulation continues while the data is
+    written. If all buffers are in use, because the writer falls behind,
+    :any:`write_timestep` blocks until a buffer is free again. Fields
+    passed to :any:`write_field` are copied and written in order with the
+    time steps. Errors of the writer thread are raised in the calling
+    thread by the next call of :any:`write_timestep`, :any:`flush` or
+    :any:`load`.
+
+    All other attributes are looked up in the wrapped output.
+
+    Parameters
+    ----------
+        output : :class:`Output`
+            the wrapped output
+        buffers : :class:`int`, optional
+            number of snapshot buffers. Default: 2
+    """
+
+    def __init__(self, output, buffers=2):
+        if buffers < 1:
+            raise ValueError("AsyncOutput: at least one buffer is needed")
+        self.output = output
+        self.buffers = buffers
+        self._free = queue.Queue()
+        self._queue = queue.Queue()
+        for _ in range(buffers):
+            self._free.put(None)
+        self._error = None
+        self._closed = False
+        self._thread = None
+        self._start()
+
+    def _start(self):
+        """Start the writer thread, if it is not running."""
+        if self._closed:
+            raise ValueError("AsyncOutput: output was closed")
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __getattr__(self, name):
+        if name == "output":
+            raise AttributeError(name)
+        return getattr(self.output, name)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            write, args, buf = item
+            try:
+                if self._error is None:
+                    write(*args)
+            except Exception as err:  # pylint: disable=broad-except
+                self._error = err
+            finally:
+                if buf is not None:
+                    self._free.put(buf)
+                self._queue.task_done()
+
+    def _raise(self):
+        if self._error is not None:
+            raise self._error
+
+    def write_timestep(self, time, pos, ids=None):
+        """Queue the positions of the walkers for writing.
+
+        Parameters
+        ----------
+            time : :class:`float`
+                the current simulation time
+            pos : :any:`numpy.ndarray`
+                Positions of the particles, given as a tuple of
+                positions
+            ids : :any:`numpy.ndarray`, optional
+                increasing ids of the walkers. Default: the walkers are
+                numbered from 0
+        """
+        self._raise()
+        self._start()
+        buf = self._free.get()
+        dim, n = pos.shape
+        if (
+            buf is None
+            or buf.shape[0] != dim
+            or buf.shape[1] < n
+            or buf.dtype != pos.dtype
+        ):
+            capacity = n if buf is None else max(n, 2 * buf.shape[1])
+            buf = np.empty((dim, capacity), dtype=pos.dtype)
+        buf[:, :n] = pos
+        if ids is not None:
+            ids = np.array(ids)
+        args = (time, buf[:, :n], ids)
+        self._queue.put((self.output.write_timestep, args, buf))
+
+    def write_field(self, name, time, values):
+        """Queue a copy of a gridded field for writing.
+
+        Fields are small compared to the positions, so they are copied
+        without using the snapshot buffers.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+            time : :class:`float`
+                the current simulation time
+            values : :any:`numpy.ndarray`
+                the values of the field, with the same shape at all times
+        """
+        self._raise()
+        self._start()
+        args = (name, time, np.array(values))
+        self._queue.put((self.output.write_field, args, None))
+
+    def write_metadata(self, **metadata):
+        """Write the parameters of the simulation to the wrapped output.
+
+        Parameters
+        ----------
+            **metadata
+                the parameters, like ``dt``, ``D``, ``nsave`` or ``seed``
+        """
+        self.flush()
+        self.output.write_metadata(**metadata)
+
+    def flush(self):
+        """Wait for all queued time steps to be written."""
+        self._queue.join()
+        self._raise()
+        self.output.flush()
+
+    def join(self):
+        """Write all queued time steps and stop the writer thread.
+
+        In contrast to :any:`close`, the output stays usable and the writer
+        thread is started again by the next write.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise()
+        self.output.flush()
+
+    def close(self):
+        """Write all queued time steps and stop the writer thread."""
+        self.join()
+        self._closed = True
+
+    def iterate(self, *args, **kwargs):
+        """Wait for all queued time steps and iterate the wrapped output.
+
+        Returns
+        -------
+        iterator
+            Iterator over (time, pos) of the saved time steps
+        """
+        self.flush()
+        return self.output.iterate(*args, **kwargs)
+
+    def load_field(self, name):
+        """Wait for all queued time steps and load a field.
+
+        Parameters
+        ----------
+            name : :class:`str`
+                the name of the field
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            Simulation time of the saved fields
+        :any:`numpy.ndarray`
+            the values with the shape (time, ...)
+        """
+        self.flush()
+        return self.output.load_field(name)
+
+    def load(self, *args, **kwargs):
+        """Wait for all queued time steps and load the wrapped output.
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            Simulation time of saved time steps
+        :class:`Trajectory` or :any:`numpy.ma.MaskedArray`
+            Position of walkers
+        """
+        self.flush()
+        return self.output.load(*args, **kwargs)
@@ -19,6 +19,8 @@ import matplotlib.pyplot as pt
 import matplotlib.animation as animation
 import seaborn as sns
 
+from walks.output import Trajectory
+
 __all__ = ["walks_1d", "walks_2d", "video"]
 
 
@@ -32,8 +34,9 @@ def walks_1d(t, pos, fig=None, ax=None):
         the x grid
     t : :any:`numpy.ndarray`
         the simulation time
-    pos : :any:`numpy.ndarray`
-        the walker positions in time
+    pos : :class:`walks.output.Trajectory` or :any:`numpy.ndarray`
+        the walker positions in time, as returned by ``load``, or padded
+        with the shape (time, dim, walker)
     field : :any:`numpy.ndarray`, optional
         the velocity field
     fig : :class:`Figure` or :any:`None`, optional
@@ -46,6 +49,7 @@ def walks_1d(t, pos, fig=None, ax=None):
     print("Plotting walkers.")
     fig, ax = _get_fig_ax(fig, ax)
     c = sns.color_palette()
+    pos = _padded(pos)
     ax.plot(t, pos[:, 0, :])
     ax.set_xlabel(r"$t$")
     ax.set_ylabel(r"$x$")
@@ -62,8 +66,9 @@ def walks_2d(x, y, pos, field=None, fig=None, ax=None):
         the x grid
     y : :any:`numpy.ndarray`
         the y grid
-    pos : :any:`numpy.ndarray`
-        the walker positions in time
+    pos : :class:`walks.output.Trajectory` or :any:`numpy.ndarray`
+        the walker positions in time, as returned by ``load``, or padded
+        with the shape (time, dim, walker)
     field : :any:`numpy.ndarray`, optional
         the velocity field
     fig : :class:`Figure` or :any:`None`, optional
@@ -87,6 +92,7 @@ def walks_2d(x, y, pos, field=None, fig=None, ax=None):
     ax.set_xlim(x[0], x[-1])
     ax.set_ylim(y[0], y[-1])
 
+    pos = _padded(pos)
     timesteps = pos.shape[0]
 
     transp = tuple(np.linspace(0.0, 1.0, timesteps))
@@ -122,8 +128,9 @@ def video(
         the x grid
     y : :any:`numpy.ndarray`
         the y grid
-    pos : :any:`numpy.ndarray`
-        the walker positions in time
+    pos : :class:`walks.output.Trajectory` or :any:`numpy.ndarray`
+        the walker positions in time, as returned by ``load``, or padded
+        with the shape (time, dim, walker)
     field : :any:`numpy.ndarray`, optional
         the velocity field
     fps : :class:`int`, optional
@@ -152,6 +159,7 @@ def video(
     ax.set_xlim(x[0], x[-1])
     ax.set_ylim(y[0], y[-1])
 
+    pos = _padded(pos)
     with writer.saving(fig, filename, dpi=150):
         frames = pos.shape[0]
         for t in range(frames):
@@ -174,6 +182,13 @@ def video(
         print("\tframe {0:3d} / {0}".format(frames), end="", flush=True)
 
 
+def _padded(pos):
+    """Return the positions as (time, dim, walker) array."""
+    if isinstance(pos, Trajectory):
+        return pos.padded()
+    return pos
+
+
 def _get_fig_ax(fig, ax, ax_name="rectilinear"):  # pragma: no cover
     if fig is None and ax is None:
         fig = pt.figure()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Storage of the walkers.
+
+.. currentmodule:: walks.pool
+
+The following classes are provided
+
+.. autosummary::
+   WalkerPool
+"""
+# pylint: disable=C0103
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+from walks.compaction import compact
+
+__all__ = ["WalkerPool"]
+
+
+class WalkerPool(object):
+    """Preallocated storage of walker arrays with amortized growth.
+
+    All per-walker arrays are stored in buffers with the walker index as
+    last axis. Only the first ``N`` entries are active and the arrays are
+    accessed by views over this live slice. If the capacity is exceeded,
+    it is (at least) doubled, so adding walkers costs amortized only the
+    number of new walkers.
+
+    Parameters
+    ----------
+    dim : :class:`int`
+        spatial dimension
+    capacity : :class:`int`, optional
+        number of walkers to preallocate. Default: 0
+    dtype : :class:`numpy.dtype`, optional
+        data type of the positions. Default: :any:`numpy.double`
+    """
+
+    def __init__(self, dim, capacity=0, dtype=np.double):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._N = 0
+        self._capacity = int(capacity)
+        self._buffers = {}
+        self._shapes = {}
+        self._fills = {}
+        self._scratch = set()
+        self.add_array("pos", (dim,), self.dtype)
+
+    def add_array(
+        self, name, shape=(), dtype=np.double, fill=None, scratch=False
+    ):
+        """Add a per-walker array to the pool.
+
+        Parameters
+        ----------
+        name : :class:`str`
+            the name of the array
+        shape : :class:`tuple`, optional
+            the shape of the array for a single walker. Default: ``()``
+        dtype : :class:`numpy.dtype`, optional
+            the data type of the array. Default: :any:`numpy.double`
+        fill : scalar, optional
+            value of new walkers in this array, if ``None`` the entries of
+            new walkers are uninitialized. Default: ``None``
+        scratch : :class:`bool`, optional
+            whether the array only holds temporary values within a time
+            step, which are not kept when walkers are removed.
+            Default: False
+        """
+        shape = tuple(shape)
+        self._shapes[name] = (shape, np.dtype(dtype))
+        self._fills[name] = fill
+        if scratch:
+            self._scratch.add(name)
+        self._buffers[name] = np.empty(shape + (self._capacity,), dtype)
+
+    def __getitem__(self, name):
+        """View of the named array over the active walkers."""
+        return self._buffers[name][..., : self._N]
+
+    def __contains__(self, name):
+        return name in self._buffers
+
+    @property
+    def pos(self):
+        """:any:`numpy.ndarray`: view of the positions of active walkers."""
+        return self["pos"]
+
+    @property
+    def N(self):
+        """:class:`int`: number of active walkers."""
+        return self._N
+
+    @property
+    def capacity(self):
+        """:class:`int`: number of walkers fitting in the buffers."""
+        return self._capacity
+
+    def reserve(self, capacity):
+        """Make sure that the given number of walkers fits in the buffers.
+
+        Parameters
+        ----------
+        capacity : :class:`int`
+            the minimal capacity
+        """
+        capacity = int(capacity)
+        if capacity <= self._capacity:
+            return
+        for name, (shape, dtype) in self._shapes.items():
+            buf = np.empty(shape + (capacity,), dtype)
+            buf[..., : self._N] = self._buffers[name][..., : self._N]
+            self._buffers[name] = buf
+        self._capacity = capacity
+
+    def extend(self, n):
+        """Activate ``n`` new walkers.
+
+        Parameters
+        ----------
+        n : :class:`int`
+            number of new walkers
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            uninitialized view of the positions of the new walkers
+        """
+        n = int(n)
+        if self._N + n > self._capacity:
+            self.reserve(max(self._N + n, 2 * self._capacity))
+        self._N += n
+        for name, fill in self._fills.items():
+            if fill is not None:
+                self._buffers[name][..., self._N - n : self._N] = fill
+        return self._buffers["pos"][:, self._N - n : self._N]
+
+    def append(self, pos):
+        """Append walkers at the given positions.
+
+        Parameters
+        ----------
+        pos : :any:`numpy.ndarray`
+            positions of the new walkers with shape (dim, n)
+        """
+        pos = np.asarray(pos)
+        self.extend(pos.shape[1])[...] = pos
+
+    def compact(self, keep):
+        """Remove walkers, keeping the order of the remaining ones.
+
+        All arrays, except scratch arrays, are compacted in place by a
+        stable partition, so no memory is allocated.
+
+        Parameters
+        ----------
+        keep : :any:`numpy.ndarray`
+            boolean mask of the active walkers to keep
+        """
+        keep = np.ascontiguousarray(keep, dtype=bool)
+        if len(keep) != self._N:
+            raise ValueError("WalkerPool: keep needs one entry per walker")
+        mask = keep.view(np.uint8)
+        N = int(np.count_nonzero(keep))
+        for name, buf in self._buffers.items():
+            if name in self._scratch:
+                continue
+            rows = int(np.prod(self._shapes[name][0]))
+            flat = buf.reshape(rows, self._capacity)
+            if flat.dtype == bool:
+                flat = flat.view(np.uint8)
+            try:
+                compact(flat, mask)
+            except (TypeError, ValueError):
+                # dtypes without compiled kernel
+                flat[:, :N] = flat[:, : self._N][:, keep]
+        self._N = N
+
+    def clear(self):
+        """Remove all walkers, keeping the buffers."""
+        self._N = 0
@@ -4,20 +4,38 @@ Tools for random number generation.
 
 .. currentmodule:: walks.random
 
+All random numbers of a simulation are derived from a single
+:any:`numpy.random.SeedSequence`. Independent streams are created by
+spawn keys, so a stream only depends on the master seed and its key,
+not on the order in which streams are requested.
+
 The following classes are provided
 
 .. autosummary::
    MasterRNG
+   WalkerStreams
 """
 from __future__ import division, absolute_import, print_function
 
-import numpy.random as rand
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+__all__ = ["MasterRNG", "WalkerStreams", "BLOCK_SIZE"]
 
-__all__ = ["MasterRNG"]
+BLOCK_SIZE = 8192
+"""int: Default number of walkers sharing one random number stream."""
+
+# spawn keys of the different stream families
+_JUMPS = 0
+_PHILOX = 1
+_SOURCES = 2
+_USER = 3
+_SUBSTEPS = 4
 
 
 class MasterRNG(object):
-    """Master random number generator for generating seeds.
+    """Master random number generator for generating seeds and streams.
 
     Parameters
     ----------
@@ -27,23 +45,116 @@ class MasterRNG(object):
 
     """
 
-    def __init__(self, seed):
+    def __init__(self, seed=None):
         self._seed = seed
-        self._master_rng_fct = rand.RandomState(seed)
-        self._master_rng = lambda: self._master_rng_fct.randint(1, 2 ** 16)
+        self._seed_seq = np.random.SeedSequence(seed)
+        self._calls = 0
 
     def __call__(self):
-        """Return a random seed."""
-        return self._master_rng()
+        """Return a random seed.
+
+        Every call uses the next child of its own stream family, so the
+        returned seeds neither collide with each other nor with the streams
+        of the simulation.
+        """
+        child = self.seed_sequence(_USER, self._calls)
+        self._calls += 1
+        return int(child.generate_state(1, np.uint32)[0])
+
+    def seed_sequence(self, *key):
+        """Return the seed sequence of the stream with the given key.
+
+        Parameters
+        ----------
+        *key : :class:`int`
+            the spawn key of the stream
+
+        Returns
+        -------
+        :any:`numpy.random.SeedSequence`
+            the seed sequence, identical to the one reached by
+            repeatedly calling ``spawn`` on the master seed sequence
+        """
+        return np.random.SeedSequence(
+            self._seed_seq.entropy, spawn_key=tuple(int(k) for k in key)
+        )
+
+    def generator(self, *key):
+        """Return a PCG64 generator of the stream with the given key.
+
+        Parameters
+        ----------
+        *key : :class:`int`
+            the spawn key of the stream
+
+        Returns
+        -------
+        :any:`numpy.random.Generator`
+            the random number generator
+        """
+        return np.random.Generator(np.random.PCG64(self.seed_sequence(*key)))
+
+    def philox_key(self):
+        """Return the key of the fused Philox RNG of the integrators.
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            two unsigned 32 bit integers
+        """
+        return self.seed_sequence(_PHILOX).generate_state(2, np.uint32)
+
+    def source_generator(self):
+        """Return the generator used for the source geometries.
+
+        Returns
+        -------
+        :any:`numpy.random.Generator`
+            the random number generator
+        """
+        return self.generator(_SOURCES)
+
+    def substep_generator(self):
+        """Return the generator used for the jumps of adaptive substeps.
+
+        Returns
+        -------
+        :any:`numpy.random.Generator`
+            the random number generator
+        """
+        return self.generator(_SUBSTEPS)
+
+    def walker_streams(self, dim, block_size=BLOCK_SIZE, first_block=0):
+        """Return the random jump streams of the walkers.
+
+        Parameters
+        ----------
+        dim : :class:`int`
+            spatial dimension
+        block_size : :class:`int`, optional
+            number of walkers sharing one stream. Default: :any:`BLOCK_SIZE`
+        first_block : :class:`int`, optional
+            index of the first walker block. Default: 0
+
+        Returns
+        -------
+        :class:`WalkerStreams`
+            the walker streams
+        """
+        return WalkerStreams(self, dim, block_size, first_block)
 
     @property
     def seed(self):
-        """:class:`int`: Seed of the master RNG.
+        """:class:`int`: Seed of the master RNG."""
+        return self._seed
+
+    @property
+    def entropy(self):
+        """:class:`int`: Entropy of the master seed sequence.
 
-        The setter property not only saves the new seed, but also creates
-        a new master RNG function with the new seed.
+        If no seed was given, this can be used as seed to reproduce a run.
         """
-        return self._seed
+        return self._seed_seq.entropy
 
     def __str__(self):
         """Return String representation."""
@@ -52,3 +163,102 @@ class MasterRNG(object):
     def __repr__(self):
         """Return String representation."""
         return "RNG(seed={})".format(self.seed)
+
+
+class WalkerStreams(object):
+    """Random jump streams of blocks of walkers.
+
+    The walkers are split into consecutive blocks of ``block_size`` walkers
+    and every block draws its jumps from its own PCG64 stream. Every block
+    always draws a full block of random numbers per time step, so the jumps
+    of a walker only depend on the master seed, its index and the number of
+    draws, not on the total number of walkers, the number of threads or on
+    how the blocks are distributed over several processes.
+
+    Parameters
+    ----------
+    master : :class:`MasterRNG`
+        the master RNG
+    dim : :class:`int`
+        spatial dimension
+    block_size : :class:`int`, optional
+        number of walkers sharing one stream. Default: :any:`BLOCK_SIZE`
+    first_block : :class:`int`, optional
+        global index of the first block handled by this instance, for
+        splitting the walkers over several processes. Default: 0
+    """
+
+    def __init__(self, master, dim, block_size=BLOCK_SIZE, first_block=0):
+        self.master = master
+        self.dim = dim
+        self.block_size = int(block_size)
+        self.first_block = int(first_block)
+        self._generators = []
+        self._executor = None
+        self._nthreads = 1
+
+    def _generator(self, block):
+        while len(self._generators) <= block:
+            idx = self.first_block + len(self._generators)
+            self._generators.append(self.master.generator(_JUMPS, idx))
+        return self._generators[block]
+
+    def _fill_block(self, out, block):
+        gen = self._generator(block)
+        start = block * self.block_size
+        n = min(self.block_size, out.shape[1] - start)
+        if n == self.block_size:
+            for d in range(self.dim):
+                gen.standard_normal(
+                    dtype=out.dtype, out=out[d, start : start + n]
+                )
+        else:
+            # the last block draws a full block to stay in sync
+            buf = np.empty((self.dim, self.block_size), dtype=out.dtype)
+            for d in range(self.dim):
+                gen.standard_normal(dtype=out.dtype, out=buf[d])
+            out[:, start : start + n] = buf[:, :n]
+
+    def standard_normal(self, out, nthreads=1):
+        """Fill an array with the standard normal jumps of one time step.
+
+        Parameters
+        ----------
+        out : :any:`numpy.ndarray`
+            the jumps array with shape (dim, N) and contiguous rows
+        nthreads : :class:`int`, optional
+            number of threads drawing the blocks in parallel. Default: 1
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            the filled array ``out``
+        """
+        blocks = -(-out.shape[1] // self.block_size)
+        # create missing generators in block order before threading
+        if blocks > 0:
+            self._generator(blocks - 1)
+        if nthreads > 1 and blocks > 1:
+            if self._executor is None or self._nthreads != nthreads:
+                self.close()
+                self._executor = ThreadPoolExecutor(nthreads)
+                self._nthreads = nthreads
+            futures = [
+                self._executor.submit(self._fill_block, out, b)
+                for b in range(blocks)
+            ]
+            for future in futures:
+                future.result()
+        else:
+            for b in range(blocks):
+                self._fill_block(out, b)
+        return out
+
+    def close(self):
+        """Shut down the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __del__(self):
+        self.close()
@@ -15,21 +15,142 @@ from __future__ import division, absolute_import, print_function
 import numpy as np
 
 from walks.random import MasterRNG
-from walks.integrator import euler_maruyama
-from walks.output import Memory, Pickle
+from walks.integrator import (
+    euler_maruyama,
+    euler_maruyama_philox,
+    philox_normal,
+    heun_predictor,
+    heun_corrector,
+    milstein,
+    scheidegger,
+)
+from walks.dispersion import jacobian
+from walks.boundary import Exits
+from walks.output import Memory, Pickle, Binary, NetCDF, HDF5, AsyncOutput
+from walks.pool import WalkerPool
+from walks.field import Field
 
 __all__ = ["Simulation"]
 
-OUTPUT = {"memory": Memory, "pickle": Pickle, "NetCDF": Pickle, "VTK": Pickle}
+OUTPUT = {
+    "memory": Memory,
+    "pickle": Pickle,
+    "binary": Binary,
+    "NetCDF": NetCDF,
+    "HDF5": HDF5,
+    "VTK": Pickle,
+}
+
+INTEGRATORS = ("euler", "heun", "milstein")
 
 
 class Sources(object):
-    def __init__(self):
-        self.t = []
-        self.pos = []
-        # TODO use getters to automatically increase idx
+    """Sorted schedule of source events.
+
+    Parameters
+    ----------
+    dim : :class:`int`
+        spatial dimension
+    """
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.t = np.empty(0)
+        self.pos = np.empty((dim, 0))
+        self.distribution = np.empty(0, dtype=np.int64)
+        self.span = np.empty((0, 0, dim))
         self.idx = 0
 
+    def add(self, times, pos, distribution=1, span=None):
+        """Add source events to the schedule.
+
+        Parameters
+        ----------
+        times : :class:`float` or :any:`numpy.ndarray`
+            times of the source events
+        pos : :any:`numpy.ndarray`
+            positions of the sources with shape (dim,) or (dim, n)
+        distribution : :class:`int` or :any:`numpy.ndarray`, optional
+            number of walkers per source event
+        span : :any:`numpy.ndarray`, optional
+            spanning vectors of the source geometries with shape (k, dim)
+            or (n, k, dim). The walkers are uniformly distributed over
+            ``pos + u_1 span_1 + ... + u_k span_k`` with ``u_j`` in [0, 1),
+            giving line (k=1), area (k=2) or volume (k=3) sources.
+            Default: point sources
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=np.double))
+        n = len(times)
+        pos = np.asarray(pos, dtype=np.double).reshape(self.dim, -1)
+        pos = np.broadcast_to(pos, (self.dim, n))
+        distribution = np.broadcast_to(
+            np.asarray(distribution, dtype=np.int64), (n,)
+        )
+        if span is None:
+            span = np.empty((0, self.dim))
+        span = np.asarray(span, dtype=np.double)
+        span = np.broadcast_to(span, (n,) + span.shape[-2:])
+        # pad the geometries to a common number of spanning vectors
+        k = max(span.shape[1], self.span.shape[1])
+        spans = []
+        for old in (self.span, span):
+            pad = np.zeros((old.shape[0], k, self.dim))
+            pad[:, : old.shape[1]] = old
+            spans.append(pad)
+        # stable sort keeps the order of simultaneous events
+        order = np.argsort(np.concatenate((self.t, times)), kind="mergesort")
+        self.t = np.concatenate((self.t, times))[order]
+        self.pos = np.concatenate((self.pos, pos), axis=1)[:, order]
+        self.distribution = np.concatenate(
+            (self.distribution, distribution)
+        )[order]
+        self.span = np.concatenate(spans)[order]
+
+    def due(self, t):
+        """Return the not yet applied source events before the given time.
+
+        Parameters
+        ----------
+        t : :class:`float`
+            the time
+
+        Returns
+        -------
+        :class:`slice`
+            the due events, which are marked as applied
+        """
+        end = max(np.searchsorted(self.t, t, side="left"), self.idx)
+        due = slice(self.idx, end)
+        self.idx = end
+        return due
+
+    def positions(self, events, rng):
+        """Return the initial positions of the walkers of source events.
+
+        Parameters
+        ----------
+        events : :class:`slice`
+            the source events
+        rng : :any:`numpy.random.Generator`
+            random number generator for the source geometries
+
+        Returns
+        -------
+        :any:`numpy.ndarray`
+            positions of the new walkers with shape (dim, N)
+        """
+        distribution = self.distribution[events]
+        source = np.repeat(np.arange(len(distribution)), distribution)
+        pos = self.pos[:, events][:, source]
+        span = self.span[events]
+        for j in range(span.shape[1]):
+            u = rng.random(len(source))
+            pos += span[source, j, :].T * u
+        return pos
+
+    def __len__(self):
+        return len(self.t)
+
 
 class Simulation(object):
     """Perform particle experiments.
@@ -37,15 +158,77 @@ class Simulation(object):
     Parameters
     ----------
     field :
-        A callable object, which takes a position tuple and returns a tuple
-    D : :class:`np.ndarray`
-        the diffusion tensor
+        A callable object, which takes a position tuple and returns a tuple.
+        The time of instances of :class:`walks.Field` is set at the start
+        of every time step, see :any:`walks.Field.set_time`.
+    D : :class:`np.ndarray` or callable
+        the diffusion coefficients in all dimensions. For the Milstein
+        integrator, this can also be a callable taking the positions and
+        returning the diffusion coefficients and their derivatives along
+        the respective dimension, both with shape (dim, N)
     T : :class:`float`
         Simulation time
     dt : :class:`float`
         Time step
     nsave : :class:`int`, optional
-        write output every nsave'th step
+        write output every nsave'th step, labelled with the time at the end
+        of the step
+    output : :class:`str`, optional
+        the output backend, one of the keys of ``OUTPUT``
+    filename : :class:`str`, optional
+        the name of the output file
+    nthreads : :class:`int`, optional
+        number of threads used by the integrator. Without OpenMP support,
+        the integrator falls back to a serial loop. Default: 1
+    fused_rng : :class:`bool`, optional
+        draw the random jumps inside the integrator from a counter based
+        Philox stream, instead of drawing them with NumPy into a separate
+        jumps array every time step. Default: False
+    max_walkers : :class:`int`, optional
+        expected maximal number of walkers, used to preallocate the walker
+        pool. The pool grows beyond this if needed. Default: ``None``
+    output_buffers : :class:`int`, optional
+        number of snapshot buffers for writing the output in a background
+        thread, see :class:`AsyncOutput`. If 0, the output is written
+        synchronously in the time loop. Default: 0
+    integrator : :class:`str`, optional
+        the integration scheme, one of ``"euler"`` (Euler Maruyama),
+        ``"heun"`` (stochastic Heun predictor corrector, two field
+        evaluations per step) or ``"milstein"`` (Milstein for spatially
+        varying diffusion). Default: ``"euler"``
+    adaptive : :class:`bool`, optional
+        adapt the time step of every walker. Walkers are sorted into step
+        classes ``dt / 2**k`` by a Courant criterion on their velocity, a
+        dispersion criterion on ``D`` and a criterion on their velocity
+        gradient, estimated from the velocity change over the previous
+        step. Every class is integrated as a batch with ``2**k`` substeps,
+        so all walkers are synchronized after every step ``dt``. The
+        substep increments are drawn as a Brownian bridge summing up to the
+        jump of the whole step, so the random walk does not depend on the
+        refinement. Only available with the Euler Maruyama integrator.
+        Default: False
+    courant : :class:`float`, optional
+        the Courant number of the adaptive time step, also bounding the
+        relative velocity change per substep. Default: 0.5
+    length_scale : :class:`float`, optional
+        the length scale of the velocity field used by the Courant and
+        dispersion criteria. Default: the smallest grid spacing of the
+        field, if it has one
+    max_level : :class:`int`, optional
+        the maximal refinement ``k`` of the adaptive time step. Default: 4
+    dtype : :class:`numpy.dtype`, optional
+        the precision of the walker positions, drift and jumps, either
+        ``numpy.double`` or ``numpy.float32``. The compiled kernels and the
+        output backends work in this precision. Default: ``numpy.double``
+    dispersivity : :class:`tuple`, optional
+        the longitudinal and transverse dispersivity ``(alpha_L, alpha_T)``.
+        If given, the walkers disperse with the velocity dependent
+        Scheidegger dispersion tensor, see
+        :any:`walks.integrator.scheidegger`, and ``D`` is the isotropic
+        molecular diffusion coefficient. The velocity Jacobian is taken
+        from the field if it provides one, like :class:`walks.GridField`,
+        otherwise it is approximated by finite differences.
+        Default: ``None``
     """
 
     def __init__(
@@ -58,24 +241,101 @@ class Simulation(object):
         nsave=1,
         output="memory",
         filename="walks.p",
+        nthreads=1,
+        fused_rng=False,
+        max_walkers=None,
+        output_buffers=0,
+        integrator="euler",
+        adaptive=False,
+        courant=0.5,
+        length_scale=None,
+        max_level=4,
+        dispersivity=None,
+        dtype=np.double,
         **field_kwargs
     ):
+        if integrator not in INTEGRATORS:
+            raise ValueError(
+                "Simulation: unknown integrator '{}'".format(integrator)
+            )
+        if callable(D) and integrator != "milstein":
+            raise ValueError(
+                "Simulation: varying diffusion needs the Milstein integrator"
+            )
+        if adaptive and integrator != "euler":
+            raise ValueError(
+                "Simulation: adaptive time steps need the Euler integrator"
+            )
+        dtype = np.dtype(dtype)
+        if dtype not in (np.dtype(np.double), np.dtype(np.float32)):
+            raise ValueError("Simulation: dtype has to be float32 or double")
+        if dispersivity is not None:
+            if integrator != "euler" or adaptive:
+                raise ValueError(
+                    "Simulation: dispersivities need the Euler integrator"
+                )
+            if np.ptp(np.atleast_1d(D)) > 0.0:
+                raise ValueError(
+                    "Simulation: molecular diffusion has to be isotropic"
+                )
+        if adaptive and length_scale is None:
+            if not hasattr(field, "spacing"):
+                raise ValueError(
+                    "Simulation: adaptive time steps need a length scale"
+                )
+            length_scale = np.min(field.spacing)
         self.dim = dim
         self.field = field
         self.D = D
         self.T = T
         self.dt = dt
         self.nsave = nsave
-        self.pos = np.asarray(([None] * self.dim))[:, np.newaxis]
-        self.N = 0
-        self.sources = Sources()
-        # add one timepoint after max. simulation time for the pops to not through
-        # an exception when all sources have been added
-        self.sources.t = [self.T + self.dt]
+        self.nthreads = nthreads
+        self.fused_rng = fused_rng
+        self.integrator = integrator
+        self.adaptive = adaptive
+        self.courant = courant
+        self.length_scale = length_scale
+        self.max_level = max_level
+        self.dispersivity = dispersivity
+        self.dtype = dtype
+        self.step_classes = np.zeros(max_level + 1, dtype=np.int64)
+        self.pool = WalkerPool(self.dim, max_walkers or 0, self.dtype)
+        self.pool.add_array("id", dtype=np.int64)
+        self.pool.add_array("start")
+        self._next_id = 0
+        self.boundaries = []
+        self.observers = []
+        self.exits = Exits(self.dim)
+        if (
+            not self.fused_rng
+            or self.integrator != "euler"
+            or adaptive
+            or dispersivity is not None
+        ):
+            self.pool.add_array(
+                "jumps", (self.dim,), self.dtype, scratch=True
+            )
+        if self.adaptive:
+            # state of the previous step for the velocity gradient
+            self.pool.add_array("vel", (self.dim,), self.dtype, fill=0.0)
+            self.pool.add_array(
+                "pos_prev", (self.dim,), self.dtype, fill=np.nan
+            )
+        if self.integrator == "heun":
+            self.pool.add_array(
+                "drift", (self.dim,), self.dtype, scratch=True
+            )
+            self.pool.add_array(
+                "pred", (self.dim,), self.dtype, scratch=True
+            )
+        self.sources = Sources(self.dim)
 
         if output in OUTPUT:
             out = OUTPUT[output]
             self.output = out(filename)
+            if output_buffers > 0:
+                self.output = AsyncOutput(self.output, output_buffers)
 
         self.field_kwargs = field_kwargs
 
@@ -94,23 +354,63 @@ class Simulation(object):
         # np.repeat needs this for axis=1
         if len(pos.shape) == 1:
             pos = pos[:, np.newaxis]
-        self.pos = np.repeat(pos, distribution, axis=1)
-        self.N = self.pos.shape[1]
-
-    def add_sources(self, times, pos, distribution=1):
-        if not isinstance(times, list):
-            times = [times]
-        if not isinstance(pos, list):
-            pos = [pos]
-        self.sources.t = list(times)
-        # add one timepoint after max. simulation time for the pops to not through
-        # an exception when all sources have been added
-        self.sources.t.append([self.T + self.dt])
-        self.sources.pos = np.atleast_1d(pos)
-        distribution = np.atleast_1d(distribution)
-        if len(distribution) == 1:
-            distribution = np.repeat(distribution, len(times))
-        self.sources.distribution = list(distribution)
+        self.pool.clear()
+        self._next_id = 0
+        self._add_walkers(np.repeat(pos, distribution, axis=1), 0.0)
+
+    def add_sources(self, times, pos, distribution=1, span=None):
+        """Add source events, injecting walkers during the simulation.
+
+        All sources due within a time step are injected at the end of that
+        step in one batch.
+
+        Parameters
+        ----------
+            times : :class:`float` or :any:`numpy.ndarray`
+                times of the source events
+            pos : :any:`numpy.ndarray`
+                positions of the sources, given as a tuple of positions
+            distribution : :any:`numpy.ndarray` or :class:`int`, optional
+                number of walkers per source event
+            span : :any:`numpy.ndarray`, optional
+                spanning vectors of line, area or volume sources with shape
+                (k, dim) or (n, k, dim), see :any:`Sources.add`.
+                Default: point sources
+        """
+        self.sources.add(times, pos, distribution, span)
+
+    def add_boundary(self, boundary):
+        """Add a boundary, removing the walkers crossing it.
+
+        Removed walkers are compacted out of the walker pool, so the
+        remaining walkers change their index, but keep their id. Their
+        first passage is recorded in :any:`Simulation.exits`.
+
+        Parameters
+        ----------
+            boundary : :class:`walks.boundary.Boundary`
+                the boundary, like a :class:`walks.boundary.Plane` or a
+                :class:`walks.boundary.Box`
+        """
+        self.boundaries.append(boundary)
+        if "pos_start" not in self.pool:
+            self.pool.add_array(
+                "pos_start", (self.dim,), self.dtype, scratch=True
+            )
+
+    def add_observer(self, observer):
+        """Add an observer, evaluating the walkers during the simulation.
+
+        Parameters
+        ----------
+            observer : :class:`walks.observer.Observer`
+                the observer, like a :class:`walks.observer.Breakthrough`
+        """
+        self.observers.append(observer)
+        if observer.track_start and "pos_start" not in self.pool:
+            self.pool.add_array(
+                "pos_start", (self.dim,), self.dtype, scratch=True
+            )
 
     def __call__(self, seed=None):
         """Simulate the random walk.
@@ -121,50 +421,293 @@ class Simulation(object):
             RNG seed
         """
 
-        rngs = self._create_rng_streams(self.dim, seed)
-        self.jumps = np.empty_like(self.pos)
+        self.master_rng = MasterRNG(seed)
+        self._source_rng = self.master_rng.source_generator()
+        self._substep_rng = self.master_rng.substep_generator()
+        self.exits = Exits(self.dim)
+        if self.fused_rng:
+            self._key = self.master_rng.philox_key()
+        else:
+            self._streams = self.master_rng.walker_streams(self.dim)
 
         print("Starting simulation with {} walkers.".format(self.N))
 
+        self.output.write_metadata(
+            dim=self.dim,
+            D=self.D,
+            T=self.T,
+            dt=self.dt,
+            nsave=self.nsave,
+            seed=self.master_rng.entropy,
+            integrator=self.integrator,
+            dispersivity=self.dispersivity,
+            dtype=self.dtype.name,
+        )
+
+        try:
+            self._time_loop()
+        finally:
+            if not self.fused_rng:
+                self._streams.close()
+            # stop the writer thread of an asynchronous output
+            if isinstance(self.output, AsyncOutput):
+                self.output.join()
+            else:
+                self.output.flush()
+        print("Simulation ended with {} walkers.".format(self.N))
+
+    def _time_loop(self):
+        """Run all time steps of the simulation."""
+        for observer in self.observers:
+            observer.start(self)
+        track_start = "pos_start" in self.pool
         # write initial conditions to file
-        self.output.write_timestep(0.0, self.pos)
+        self.output.write_timestep(0.0, self.pos, self.ids)
+        for observer in self.observers:
+            observer.save(self, 0.0)
         for timestep, t in enumerate(np.arange(0.0, self.T, self.dt)):
+            if isinstance(self.field, Field):
+                self.field.set_time(t)
+            if self.N > 0 and track_start:
+                self.pool["pos_start"][...] = self.pos
             if self.N > 0:
-                self.jumps[:, :] = [
-                    rngs[d].standard_normal(self.N) for d in range(self.dim)
-                ]
-                drift = self.field(self.pos, **self.field_kwargs)
-                euler_maruyama(self.pos, drift, self.jumps, self.D, self.dt)
-            if t <= self.sources.t[self.sources.idx] < t + self.dt:
-                self._apply_sources()
-            if timestep % self.nsave == 0:
-                self.output.write_timestep(t, self.pos)
-        print("Simulation ended with {} walkers.".format(self.N))
+                self._integrate(timestep, t)
+                for observer in self.observers:
+                    observer.step(self, t)
+            if self.N > 0 and self.boundaries:
+                self._apply_boundaries(t)
+            self._apply_sources(t + self.dt)
+            # label the output with the time at the end of the step
+            if (timestep + 1) % self.nsave == 0:
+                self.output.write_timestep(t + self.dt, self.pos, self.ids)
+                for observer in self.observers:
+                    observer.save(self, t + self.dt)
+        for observer in self.observers:
+            observer.finish(self)
 
-    def _apply_sources(self):
-        source_pos = self.sources.pos[:, self.sources.idx]
-        if len(source_pos.shape) == 1:
-            source_pos = source_pos[:, np.newaxis]
-        distribution = self.sources.distribution[self.sources.idx]
-        source_pos = np.repeat(source_pos, distribution, axis=1)
-        self.pos = np.hstack((self.pos, source_pos))
-        self.N = self.pos.shape[1]
-        self.jumps = np.empty_like(self.pos)
-        self.sources.idx += 1
-
-    def _create_rng_streams(self, dim, seed):
-        """Create a RNG stream for each spatial dimension.
-        
-        Parameters
-        ----------
-        dim : :class:`int`
-            spatial dimension
-        seed : :class`int`
-            master seed
-        """
-        master_rng = MasterRNG(seed)
-        streams = [np.random.RandomState(master_rng()) for d in range(dim)]
-        return streams
+    def _integrate(self, timestep, t):
+        """Advance all walkers by one time step."""
+        if self.adaptive:
+            self._integrate_adaptive(timestep, t)
+            return
+        if self.dispersivity is not None:
+            self._draw_jumps(timestep)
+            vel, jac = jacobian(self.field, self.pos, **self.field_kwargs)
+            scheidegger(
+                self.pos,
+                vel,
+                jac,
+                self.jumps,
+                self.dispersivity[0],
+                self.dispersivity[1],
+                np.max(self.D),
+                self.dt,
+                self.nthreads,
+            )
+            return
+        if self.fused_rng and self.integrator == "euler":
+            drift = self._velocity(self.pos)
+            euler_maruyama_philox(
+                self.pos,
+                drift,
+                self.ids,
+                self.D,
+                self.dt,
+                self._key[0],
+                self._key[1],
+                timestep,
+                self.nthreads,
+            )
+            return
+        self._draw_jumps(timestep)
+        drift = self._velocity(self.pos)
+        if self.integrator == "heun":
+            # fields may reuse their drift buffer in the next call
+            self.pool["drift"][...] = drift
+            drift = self.pool["drift"]
+            heun_predictor(
+                self.pos,
+                drift,
+                self.jumps,
+                self.D,
+                self.dt,
+                self.pool["pred"],
+                self.nthreads,
+            )
+            if isinstance(self.field, Field):
+                self.field.set_time(t + self.dt)
+            drift_pred = self._velocity(self.pool["pred"])
+            heun_corrector(
+                self.pos,
+                drift,
+                drift_pred,
+                self.jumps,
+                self.D,
+                self.dt,
+                self.nthreads,
+            )
+        elif self.integrator == "milstein" and callable(self.D):
+            D, dD = self.D(self.pos)
+            milstein(
+                self.pos,
+                drift,
+                self.jumps,
+                np.asarray(D, dtype=self.dtype),
+                np.asarray(dD, dtype=self.dtype),
+                self.dt,
+                self.nthreads,
+            )
+        else:
+            # Milstein with constant diffusion is Euler Maruyama
+            euler_maruyama(
+                self.pos,
+                drift,
+                self.jumps,
+                self.D,
+                self.dt,
+                self.nthreads,
+            )
+
+    def _velocity(self, pos):
+        """Evaluate the field in the precision of the walkers."""
+        vel = self.field(pos, **self.field_kwargs)
+        return np.asarray(vel, dtype=self.dtype)
+
+    def _draw_jumps(self, timestep):
+        """Draw the jumps of all walkers for one time step."""
+        if self.fused_rng:
+            # same random numbers as drawn inside the fused integrator
+            philox_normal(
+                self.jumps,
+                self.ids,
+                self._key[0],
+                self._key[1],
+                timestep,
+                self.nthreads,
+            )
+        else:
+            self._streams.standard_normal(self.jumps, self.nthreads)
+
+    def _step_levels(self, vel):
+        """Return the refinement level of the time step of all walkers."""
+        speed = np.sqrt(np.sum(vel ** 2, axis=0))
+        dist = np.sqrt(np.sum((self.pos - self.pool["pos_prev"]) ** 2, axis=0))
+        change = np.sqrt(np.sum((vel - self.pool["vel"]) ** 2, axis=0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            grad = np.where(dist > 0.0, change / dist, 0.0)
+        # walkers without history have NaN as previous position
+        grad[~np.isfinite(grad)] = 0.0
+        cfl = self.courant * self.length_scale
+        ratio = np.maximum(
+            speed * self.dt / cfl, grad * self.dt / self.courant
+        )
+        # dispersion criterion: sqrt(2 D dt) below the Courant length
+        ratio = np.maximum(ratio, 2.0 * np.max(self.D) * self.dt / cfl ** 2)
+        with np.errstate(divide="ignore"):
+            levels = np.ceil(np.log2(np.maximum(ratio, 1.0)))
+        return np.minimum(levels, self.max_level).astype(np.int64)
+
+    def _integrate_adaptive(self, timestep, t):
+        """Advance all walkers by one time step with adaptive substeps."""
+        self._draw_jumps(timestep)
+        vel = self._velocity(self.pos)
+        levels = self._step_levels(vel)
+        self.pool["vel"][...] = vel
+        self.pool["pos_prev"][...] = self.pos
+        vel = self.pool["vel"]
+        self.step_classes = np.bincount(levels, minlength=self.max_level + 1)
+        if self.step_classes[0] == self.N:
+            euler_maruyama(
+                self.pos, vel, self.jumps, self.D, self.dt, self.nthreads
+            )
+            return
+        for level in np.nonzero(self.step_classes)[0]:
+            idx = np.nonzero(levels == level)[0]
+            pos = self.pos[:, idx]
+            if level == 0:
+                jumps = self.jumps[:, idx]
+                euler_maruyama(
+                    pos, vel[:, idx], jumps, self.D, self.dt, self.nthreads
+                )
+                self.pos[:, idx] = pos
+                continue
+            substeps = 2 ** level
+            dt = self.dt / substeps
+            drift = vel[:, idx]
+            # Brownian bridge: independent standard normal increments,
+            # which sum up to the jump drawn for the whole step
+            noise = self._substep_rng.standard_normal(
+                (substeps,) + pos.shape, dtype=self.dtype
+            )
+            noise -= noise.mean(axis=0)
+            noise += self.jumps[:, idx] / substeps ** 0.5
+            for sub in range(substeps):
+                if sub > 0:
+                    if isinstance(self.field, Field):
+                        self.field.set_time(t + sub * dt)
+                    drift = self._velocity(pos)
+                euler_maruyama(
+                    pos, drift, noise[sub], self.D, dt, self.nthreads
+                )
+            self.pos[:, idx] = pos
+
+    def _add_walkers(self, pos, start):
+        n = pos.shape[1]
+        self.pool.extend(n)[...] = pos
+        new = slice(self.N - n, self.N)
+        self.pool["id"][new] = np.arange(self._next_id, self._next_id + n)
+        self.pool["start"][new] = start
+        self._next_id += n
+
+    def _apply_sources(self, t):
+        events = self.sources.due(t)
+        if events.stop > events.start:
+            pos = self.sources.positions(events, self._source_rng)
+            self._add_walkers(pos, t)
+
+    def _apply_boundaries(self, t):
+        """Remove the walkers, which crossed a boundary in the last step."""
+        old = self.pool["pos_start"]
+        frac = np.full(self.N, np.inf)
+        crossed = np.full(self.N, -1, dtype=np.int64)
+        for b, boundary in enumerate(self.boundaries):
+            f = boundary.crossing(old, self.pos)
+            first = f < frac
+            frac[first] = f[first]
+            crossed[first] = b
+        out = np.flatnonzero(crossed >= 0)
+        if len(out) == 0:
+            return
+        f = np.clip(frac[out], 0.0, 1.0)
+        pos = old[:, out] + f * (self.pos[:, out] - old[:, out])
+        self.exits.append(
+            self.pool["id"][out],
+            self.pool["start"][out],
+            t + f * self.dt,
+            pos,
+            crossed[out],
+        )
+        self.pool.compact(crossed < 0)
+
+    @property
+    def pos(self):
+        """:any:`numpy.ndarray`: positions of all active walkers."""
+        return self.pool.pos
+
+    @property
+    def N(self):
+        """:class:`int`: number of active walkers."""
+        return self.pool.N
+
+    @property
+    def ids(self):
+        """:any:`numpy.ndarray`: ids of all active walkers."""
+        return self.pool["id"]
+
+    @property
+    def jumps(self):
+        """:any:`numpy.ndarray`: random jumps of all active walkers."""
+        return self.pool["jumps"]
 
     @property
     def mean_pos(self):
@@ -0,0 +1,127 @@
+#!python
+#cython: language_level=2
+# distutils: language = c++
+# -*- coding: utf-8 -*-
+"""
+Summation of the Fourier modes of randomization method fields in Cython.
+
+The walker arrays (positions, drift, jumps and results) are fused types,
+so all kernels run in single (``float32``) or double precision. All walker
+arrays of one call need the same precision.
+"""
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+cimport cython
+from cython cimport floating
+from cython.parallel import prange
+from libc.math cimport cos, sin
+cimport numpy as np
+
+
+DTYPE = np.double
+ctypedef np.double_t DTYPE_t
+
+cdef enum:
+    # number of walkers per cache block
+    BLOCK = 64
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline void _summate_block(
+    floating[:,:] pos,
+    Py_ssize_t start,
+    Py_ssize_t end,
+    double[:,:] k,
+    double[:,:] proj,
+    double[:] z_1,
+    double[:] z_2,
+    floating[:,:] out,
+) noexcept nogil:
+    # sum all modes for one block of walkers, which stay in the L1 cache
+    cdef Py_ssize_t i, j
+    cdef int d, dim
+    cdef double phase, amp
+    cdef double summed[3][BLOCK]
+    dim = pos.shape[0]
+    for d in range(dim):
+        for i in range(end - start):
+            summed[d][i] = 0.
+    for j in range(k.shape[1]):
+        for i in range(start, end):
+            phase = 0.
+            for d in range(dim):
+                phase = phase + k[d,j] * pos[d,i]
+            amp = z_1[j] * cos(phase) + z_2[j] * sin(phase)
+            for d in range(dim):
+                summed[d][i-start] = summed[d][i-start] + proj[d,j] * amp
+    for d in range(dim):
+        for i in range(start, end):
+            out[d,i] = summed[d][i-start]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def summate_incompr(
+    floating[:,:] pos,
+    double[:,:] k,
+    double[:,:] proj,
+    double[:] z_1,
+    double[:] z_2,
+    floating[:,:] out,
+    int num_threads=1
+    ):
+    """Sum the projected Fourier modes of an incompressible vector field.
+
+    This calculates
+
+    .. math::
+       s_d(x) = \\sum_{j} p_{d,j}\\left(
+       Z_{1,j}\\cos\\left(\\langle k_j, x\\rangle\\right) +
+       Z_{2,j}\\sin\\left(\\langle k_j, x\\rangle\\right)\\right)
+
+    The walkers are processed in cache sized blocks, which are distributed
+    over the OpenMP threads. For every walker, the modes are summed in
+    order, so the result does not depend on the number of threads.
+
+    Parameters
+    ----------
+    pos : :class:`np.ndarray`
+        the positions of the walkers with shape (dim, N)
+    k : :class:`np.ndarray`
+        the wave vectors of the modes with shape (dim, modes)
+    proj : :class:`np.ndarray`
+        the projected directions of the modes with shape (dim, modes)
+    z_1 : :class:`np.ndarray`
+        the cosine amplitudes of the modes
+    z_2 : :class:`np.ndarray`
+        the sine amplitudes of the modes
+    out : :class:`np.ndarray`
+        the summed modes with shape (dim, N)
+    num_threads : :class:`int`, optional
+        number of OpenMP threads, ignored without OpenMP. Default: 1
+    """
+    cdef Py_ssize_t b, N, blocks
+
+    N = pos.shape[1]
+
+    if not 1 <= pos.shape[0] <= 3:
+        raise ValueError("summate_incompr: dim has to be 1, 2 or 3")
+    if k.shape[0] != pos.shape[0] or proj.shape[0] != pos.shape[0]:
+        raise ValueError("summate_incompr: modes have the wrong dimension")
+    if out.shape[0] != pos.shape[0] or out.shape[1] < N:
+        raise ValueError("summate_incompr: out has the wrong shape")
+    if num_threads < 1:
+        raise ValueError("summate_incompr: num_threads has to be >= 1")
+
+    blocks = (N + BLOCK - 1) // BLOCK
+    for b in prange(
+        blocks, nogil=True, schedule='static', num_threads=num_threads
+    ):
+        _summate_block(
+            pos, b * BLOCK, min((b + 1) * BLOCK, N), k, proj, z_1, z_2, out
+        )